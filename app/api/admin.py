@@ -5,18 +5,30 @@ This module provides:
 - A lightweight admin UI for triggering library scans
 - An install page for generating Stremio addon install links
 
+Scans and maintenance run in the scanner process (see scanner.process);
+the handlers await its result without blocking the event loop.
+
 Note: The HTML pages themselves are intentionally unauthenticated.
 All destructive or privileged actions require a valid admin token.
 """
 
-from fastapi import APIRouter, Request
+import os
+
+from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-import sqlite3
 
-from scanner import scan_movies, scan_series
-from core.config import DB_PATH
+from scanner import (
+    run_scanner,
+    request_cancel,
+    cancel_requested,
+    scan_running,
+)
 from core.auth import require_admin_token
+from core.ratelimit import usage
+from db.connection import connect
+from db.metadata_queue_repo import count_deferred, get_deferred_entries, next_retry_at, retry_now
+from db.scan_repo import get_scan_cursors
 
 router = APIRouter()
 
@@ -33,36 +45,166 @@ def admin_page(request: Request):
     )
 
 
+def _scan_args(scope: str, path: str | None) -> list[str]:
+    return ["scan", "--scope", scope] + (["--path", path] if path else [])
+
+
 @router.post("/admin/scan")
-def admin_scan(request: Request):
+async def admin_scan(request: Request, scope: str = "all", path: str | None = None):
     require_admin_token(request)
 
-    scan_movies()
-    scan_series()
+    try:
+        result = await run_scanner(*_scan_args(scope, path))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not result:
+        raise HTTPException(status_code=409, detail="Scan already running")
 
     return {
         "status": "ok",
-        "mode": "incremental"
+        "mode": "incremental",
+        "scope": scope,
+        "path": path,
+        "result": result["result"],
     }
 
 
 @router.post("/admin/scan/rebuild")
-def admin_scan_rebuild(request: Request):
+async def admin_scan_rebuild(request: Request):
+    require_admin_token(request)
+
+    result = await run_scanner("scan", "--rebuild")
+    if not result:
+        raise HTTPException(status_code=409, detail="Scan already running")
+
+    return {
+        "status": "ok",
+        "mode": "rebuild",
+        "result": result["result"],
+    }
+
+
+@router.post("/admin/scan/cancel")
+def admin_scan_cancel(request: Request):
     require_admin_token(request)
 
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("DELETE FROM files")
-        conn.execute("DELETE FROM episodes")
-        conn.execute("DELETE FROM series")
-        conn.execute("DELETE FROM movies")
-        conn.commit()
+    if not scan_running():
+        raise HTTPException(status_code=409, detail="No scan running")
+
+    # The scan stops after its current movie file or series folder
+    request_cancel()
+
+    return {"status": "ok", "cancelling": True}
+
 
-    scan_movies()
-    scan_series()
+@router.post("/admin/scan/resume")
+async def admin_scan_resume(request: Request, scope: str = "all"):
+    require_admin_token(request)
+
+    with connect() as conn:
+        cursors = get_scan_cursors(conn)
+
+    if not cursors:
+        raise HTTPException(status_code=409, detail="No interrupted scan to resume")
+
+    # Full scans pick up unfinished walks from their cursor
+    try:
+        result = await run_scanner(*_scan_args(scope, None))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not result:
+        raise HTTPException(status_code=409, detail="Scan already running")
+
+    return {
+        "status": "ok",
+        "mode": "resume",
+        "scope": scope,
+        "resumed": cursors,
+        "result": result["result"],
+    }
+
+
+@router.get("/admin/scan/status")
+def admin_scan_status(request: Request):
+    require_admin_token(request)
+
+    with connect() as conn:
+        cursors = get_scan_cursors(conn)
+        deferred = count_deferred(conn)
+
+    return {
+        "status": "ok",
+        "running": scan_running(),
+        "cancel_requested": cancel_requested(),
+        # Unfinished walks, resumed by the next full scan
+        "cursors": cursors,
+        # Titles waiting for a metadata retry, per library
+        "deferred": deferred,
+    }
+
+
+@router.post("/admin/maintenance")
+async def admin_maintenance(request: Request):
+    require_admin_token(request)
+
+    report = await run_scanner("maintenance")
+    if report is None:
+        raise HTTPException(status_code=409, detail="Scan already running")
+
+    return {
+        "status": "ok",
+        **report,
+    }
+
+
+@router.get("/admin/metadata/queue")
+def admin_metadata_queue(request: Request, limit: int = 100):
+    require_admin_token(request)
+
+    with connect() as conn:
+        counts = count_deferred(conn)
+        entries = get_deferred_entries(conn, max(1, min(limit, 1000)))
+        next_retry = next_retry_at(conn)
+
+    return {
+        "status": "ok",
+        "deferred": counts,
+        "next_retry_at": next_retry,
+        "entries": entries,
+    }
+
+
+@router.post("/admin/metadata/retry")
+async def admin_metadata_retry(request: Request):
+    require_admin_token(request)
+
+    # E.g. after a TMDB outage: retry everything now instead of waiting
+    # for each entry's backoff
+    with connect() as conn:
+        queued = retry_now(conn)
+
+    result = await run_scanner("resolve")
+    if result is None:
+        raise HTTPException(status_code=409, detail="Metadata retries already running")
+
+    return {
+        "status": "ok",
+        "queued": queued,
+        "counts": result["counts"],
+    }
+
+
+@router.get("/admin/tokens/usage")
+def admin_token_usage(request: Request):
+    require_admin_token(request)
 
+    # Counters are kept per API worker
     return {
         "status": "ok",
-        "mode": "rebuild"
+        "pid": os.getpid(),
+        "tokens": usage(),
     }
 
 
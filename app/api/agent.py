@@ -0,0 +1,55 @@
+"""
+Scan agent endpoint.
+
+Receives manifests from the storage-side scan agent (scanner.agent):
+gzip-compressed JSON listing parsed media files, so the API doesn't have
+to walk /media over the network mount.
+
+Requires the admin token. Manifests are applied by the scanner process
+(see scanner.process).
+"""
+
+import gzip
+import json
+
+from fastapi import APIRouter, Request, HTTPException
+
+from core.auth import require_admin_token
+from scanner import run_scanner
+from scanner.process import ScannerConflict
+
+router = APIRouter()
+
+
+@router.post("/admin/agent/manifest")
+async def admin_agent_manifest(request: Request):
+    require_admin_token(request)
+
+    body = await request.body()
+
+    try:
+        if request.headers.get("content-encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        manifest = json.loads(body)
+    except (OSError, EOFError, ValueError):
+        raise HTTPException(status_code=400, detail="Expected gzip or plain JSON manifest")
+
+    if not isinstance(manifest, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+
+    try:
+        result = await run_scanner("manifest", input=body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ScannerConflict as e:
+        # Structured detail tells the agent to resend a full manifest
+        raise HTTPException(status_code=409, detail=e.detail)
+
+    if result is None:
+        raise HTTPException(status_code=409, detail="Scan already running")
+
+    return {
+        "status": "ok",
+        "mode": "agent",
+        **result,
+    }
@@ -1,23 +1,36 @@
 from fastapi import APIRouter, Request, Response, status
 
-from core.auth import valid_stream_token
+from core.auth import stream_token
+from core.ratelimit import allow_request, allow_stream
 
 router = APIRouter()
 
 
 @router.get("/auth")
-def auth(request: Request):
+async def auth(request: Request):
     """
     Authorization endpoint used by Caddy forward_auth.
 
+    Token and limit checks are in memory, so the handler runs on the
+    event loop without a thread pool hop.
+
     Returns:
     - 204 No Content if token is valid
     - 401 Unauthorized if token is missing or invalid
+    - 429 Too Many Requests if the token exceeded its request rate or
+      its concurrent stream cap
     """
 
-    result = valid_stream_token(request)
+    token = stream_token(request)
+
+    if not token:
+        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
 
-    if result:
-        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    # X-Forwarded-Uri is the media path requested from the proxy
+    if not allow_request(token) or not allow_stream(token, request.headers.get("x-forwarded-uri")):
+        return Response(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": "1"},
+        )
 
-    return Response(status_code=status.HTTP_401_UNAUTHORIZED)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
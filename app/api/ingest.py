@@ -0,0 +1,143 @@
+"""
+Per-item ingestion endpoint.
+
+Lets downloaders index exactly the files that changed instead of
+triggering a full library scan. Accepts either a plain list of paths or
+Sonarr/Radarr webhook payloads (Download, Rename, delete events).
+
+Requires the admin token. Sonarr v4 / Radarr v5 webhooks can send it
+via a custom `Authorization: Bearer <token>` header.
+
+The paths are indexed by the scanner process (see scanner.process). It
+needs the scan lock: while a scan runs, requests get 503 with
+Retry-After (the running or the next scan may pick up the paths). Posters
+and the static export are refreshed in the background after the
+response, so a single-file webhook does not wait for a full export.
+"""
+
+import json
+
+from fastapi import APIRouter, Body, Request, HTTPException
+
+from core.auth import require_admin_token
+from core.config import INGEST_PATH_MAP
+from scanner import run_scanner, start_scanner
+from scanner.process import ScannerFailed
+
+router = APIRouter()
+
+# Seconds a busy caller should wait before retrying
+BUSY_RETRY_SECONDS = 60
+
+# Actions that change the catalogs
+CHANGED_ACTIONS = ("indexed", "removed")
+
+
+def map_path(path: str) -> str:
+    """
+    Rewrite a downloader path into this container's /media namespace.
+    """
+    for src, dst in INGEST_PATH_MAP:
+        if path == src or path.startswith(src + "/"):
+            return dst + path[len(src):]
+
+    return path
+
+
+def _file_path(media_file: dict | None, folder: str | None):
+    """
+    Return the absolute path of a Sonarr/Radarr file object.
+    """
+    if not media_file:
+        return None
+
+    if media_file.get("path"):
+        return media_file["path"]
+
+    if folder and media_file.get("relativePath"):
+        return f"{folder.rstrip('/')}/{media_file['relativePath']}"
+
+    return None
+
+
+def webhook_paths(payload: dict) -> list[str]:
+    """
+    Extract the affected library paths from a Sonarr/Radarr webhook.
+
+    Renames report both the previous and the new path; the previous one no
+    longer exists on disk and is therefore removed during ingestion.
+    """
+    series = payload.get("series") or {}
+    movie = payload.get("movie") or {}
+    folder = series.get("path") or movie.get("folderPath")
+
+    paths = []
+
+    # Download / Upgrade / EpisodeFileDelete / MovieFileDelete
+    paths.append(_file_path(payload.get("episodeFile"), folder))
+    paths.append(_file_path(payload.get("movieFile"), folder))
+
+    for media_file in payload.get("episodeFiles") or []:
+        paths.append(_file_path(media_file, folder))
+
+    # Files replaced by an upgrade
+    for media_file in payload.get("deletedFiles") or []:
+        paths.append(_file_path(media_file, folder))
+
+    # Rename
+    for media_file in (
+        (payload.get("renamedEpisodeFiles") or [])
+        + (payload.get("renamedMovieFiles") or [])
+    ):
+        paths.append(media_file.get("previousPath"))
+        paths.append(_file_path(media_file, folder))
+
+    # SeriesAdd / SeriesDelete / MovieDelete: the whole folder
+    if not any(paths) and payload.get("eventType") in (
+        "SeriesAdd",
+        "SeriesDelete",
+        "MovieAdded",
+        "MovieDelete",
+    ):
+        paths.append(folder)
+
+    # Keep order, drop duplicates and empty values
+    return list(dict.fromkeys(p for p in paths if p))
+
+
+@router.post("/admin/ingest")
+async def admin_ingest(request: Request, payload: dict = Body(...)):
+    require_admin_token(request)
+
+    if "eventType" in payload:
+        # Sonarr/Radarr "Test" events carry no files
+        paths = webhook_paths(payload)
+    else:
+        paths = payload.get("paths")
+        if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+            raise HTTPException(status_code=400, detail="Expected {\"paths\": [...]}")
+
+    paths = [map_path(p) for p in paths]
+
+    try:
+        result = await run_scanner("ingest", "--no-refresh", input=json.dumps(paths).encode())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ScannerFailed as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if result is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Scan already running",
+            headers={"Retry-After": str(BUSY_RETRY_SECONDS)},
+        )
+
+    if any(item["action"] in CHANGED_ACTIONS for item in result["results"]):
+        start_scanner("refresh")
+
+    return {
+        "status": "ok",
+        "mode": "ingest",
+        "results": result["results"],
+    }
@@ -0,0 +1,34 @@
+"""
+Cached poster endpoint.
+
+Serves posters from the local poster cache (see metadata.posters).
+Posters are public artwork, so no token is required. Responses carry
+long-lived cache headers: a poster URL only ever points at the same
+image.
+"""
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from metadata.posters import IMDB_ID_PATTERN, ORIGINAL, VARIANTS, poster_file
+
+router = APIRouter()
+
+# 30 days
+CACHE_CONTROL = "public, max-age=2592000"
+
+
+@router.get("/posters/{imdb_id}/{variant}.jpg")
+def poster(imdb_id: str, variant: str):
+    if not IMDB_ID_PATTERN.fullmatch(imdb_id) or (variant not in VARIANTS and variant != ORIGINAL):
+        raise HTTPException(status_code=404, detail="Not found")
+
+    path = poster_file(imdb_id, variant)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    return FileResponse(
+        path,
+        media_type="image/jpeg",
+        headers={"Cache-Control": CACHE_CONTROL},
+    )
@@ -0,0 +1,104 @@
+"""
+On-demand profiling endpoints (admin token required).
+
+    GET /admin/profile/cpu?seconds=10&target=api|scan&format=text|collapsed
+    GET /admin/profile/memory?seconds=10&target=api|scan
+
+Each request captures a profile over a window of `seconds` (see
+core.profiling) and returns it as a plain text download:
+
+- target=api profiles the worker that received the request
+- target=scan profiles the running scanner process; 409 if no scan is
+  running or it finishes before the window ends
+"""
+
+import asyncio
+import os
+import time
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from core.auth import require_admin_token
+from core.profiling import (
+    WATCH_INTERVAL,
+    ProfileBusy,
+    capture,
+    check_request,
+    request_profile,
+    take_report,
+    withdraw_request,
+)
+from scanner import scan_leader_pid
+
+router = APIRouter()
+
+TARGETS = ("api", "scan")
+
+# Time allowed beyond the window for the scanner to write its report
+REPORT_GRACE_SECONDS = 10
+
+
+async def _scan_profile(kind: str, seconds: float, fmt: str) -> tuple[int, str]:
+    pid = scan_leader_pid()
+    if pid is None:
+        raise HTTPException(status_code=409, detail="No scan running")
+
+    request_profile(pid, kind, seconds, fmt)
+    deadline = time.monotonic() + seconds + WATCH_INTERVAL + REPORT_GRACE_SECONDS
+
+    while True:
+        await asyncio.sleep(WATCH_INTERVAL)
+
+        report = take_report(pid)
+        if report is not None:
+            return pid, report
+
+        if scan_leader_pid() != pid or time.monotonic() > deadline:
+            withdraw_request(pid)
+            raise HTTPException(
+                status_code=409,
+                detail="Scan finished before the profile was captured",
+            )
+
+
+async def _profile(request: Request, kind: str, seconds: float, target: str, fmt: str):
+    require_admin_token(request)
+
+    try:
+        check_request(kind, seconds, fmt)
+        if target not in TARGETS:
+            raise ValueError(f"Unknown target {target!r}, expected one of {', '.join(TARGETS)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if target == "scan":
+        pid, report = await _scan_profile(kind, seconds, fmt)
+    else:
+        # Sampling runs in a worker thread; the event loop keeps serving
+        # (and shows up in the profile)
+        try:
+            pid, report = os.getpid(), await asyncio.to_thread(capture, kind, seconds, fmt)
+        except ProfileBusy:
+            raise HTTPException(status_code=409, detail="Profile already running")
+
+    filename = f"{kind}-{target}-{pid}-{time.strftime('%Y%m%dT%H%M%S')}.txt"
+    return PlainTextResponse(
+        report,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/admin/profile/cpu")
+async def admin_profile_cpu(
+    request: Request,
+    seconds: float = 10,
+    target: str = "api",
+    format: str = "text",
+):
+    return await _profile(request, "cpu", seconds, target, format)
+
+
+@router.get("/admin/profile/memory")
+async def admin_profile_memory(request: Request, seconds: float = 10, target: str = "api"):
+    return await _profile(request, "memory", seconds, target, "text")
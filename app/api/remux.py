@@ -0,0 +1,178 @@
+"""
+HLS remux endpoints.
+
+Serve playlists and fMP4 segments produced by core.remux for library
+files that are not web-ready. Files are addressed by their URL path,
+like media URLs on the proxy (see core.media):
+
+    /internal/remux/movies/Movie (2020).mkv/index.m3u8
+    /internal/remux/movies/Movie (2020).mkv/seg_00000.m4s
+
+External requests need a valid stream token (401 otherwise) and count
+against the token's request rate and concurrent stream cap (429 with
+Retry-After, like /auth). The playlist and segments of one file count as
+one stream.
+Tokens passed as `?token=` are carried over to the segment URLs in the
+playlist.
+"""
+
+import asyncio
+from urllib.parse import quote
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+
+from core.auth import is_external, stream_token
+from core.media import media_file
+from core.ratelimit import allow_request, allow_stream
+from core.remux import (
+    ENABLED,
+    INIT_SEGMENT,
+    PLAYLIST,
+    SEGMENT_PATTERN,
+    RemuxBusy,
+    RemuxFailed,
+    is_complete,
+    is_running,
+    job_dir,
+    start_job,
+    touch,
+)
+from db.connection import connect
+from db.streams import get_file_size
+
+router = APIRouter()
+
+# Longest a playlist request waits for ffmpeg's first segments
+PLAYLIST_WAIT_SECONDS = 15
+PLAYLIST_POLL_SECONDS = 0.25
+
+PLAYLIST_TYPE = "application/vnd.apple.mpegurl"
+
+# Segments never change once written
+SEGMENT_CACHE_CONTROL = "public, max-age=86400"
+
+
+def _media_file(media_path: str):
+    """
+    Return (path, size) of an indexed library file, or raise 404.
+    """
+    path = media_file(media_path)
+
+    if not ENABLED or path is None or ".." in media_path.split("/"):
+        raise HTTPException(status_code=404, detail="Not found")
+
+    with connect() as conn:
+        size = get_file_size(conn, path)
+
+    if size is None:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    return path, size
+
+
+def _check_access(request: Request, media_path: str):
+    if not is_external(request):
+        return
+
+    token = stream_token(request)
+    if token is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    # Keyed by file, not by segment URL
+    if not allow_request(token) or not allow_stream(token, f"/remux/{media_path}"):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": "1"},
+        )
+
+
+def _with_token(playlist: str, token: str) -> str:
+    # Relative segment URLs don't inherit the playlist's query string
+    suffix = f"?token={quote(token)}"
+    lines = []
+
+    for line in playlist.splitlines():
+        if line and not line.startswith("#"):
+            line += suffix
+        elif line.startswith("#EXT-X-MAP:"):
+            line = line.replace(f'URI="{INIT_SEGMENT}"', f'URI="{INIT_SEGMENT}{suffix}"')
+        lines.append(line)
+
+    return "\n".join(lines) + "\n"
+
+
+@router.get("/internal/remux/{media_path:path}/index.m3u8")
+@router.get("/external/remux/{media_path:path}/index.m3u8")
+async def remux_playlist(media_path: str, request: Request):
+    _check_access(request, media_path)
+    path, size = await run_in_threadpool(_media_file, media_path)
+
+    try:
+        out = await run_in_threadpool(start_job, path, size)
+    except RemuxBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="All remux slots are busy",
+            headers={"Retry-After": "10"},
+        )
+    except RemuxFailed:
+        raise HTTPException(status_code=502, detail="Remux failed")
+
+    # Wait for ffmpeg's first segments
+    playlist = out / PLAYLIST
+    waited = 0.0
+    while not playlist.exists() and waited < PLAYLIST_WAIT_SECONDS:
+        if not is_running(out):
+            break
+        await asyncio.sleep(PLAYLIST_POLL_SECONDS)
+        waited += PLAYLIST_POLL_SECONDS
+
+    if not playlist.exists():
+        raise HTTPException(
+            status_code=503,
+            detail="Remux is starting",
+            headers={"Retry-After": "2"},
+        )
+
+    content = playlist.read_text()
+
+    token = request.query_params.get("token")
+    if token:
+        content = _with_token(content, token)
+
+    # An EVENT playlist grows until the job completes
+    cache_control = "public, max-age=86400" if is_complete(out) else "no-cache"
+
+    return Response(
+        content=content,
+        media_type=PLAYLIST_TYPE,
+        headers={"Cache-Control": cache_control},
+    )
+
+
+@router.get("/internal/remux/{media_path:path}/{segment}")
+@router.get("/external/remux/{media_path:path}/{segment}")
+def remux_segment(media_path: str, segment: str, request: Request):
+    _check_access(request, media_path)
+
+    if not SEGMENT_PATTERN.fullmatch(segment):
+        raise HTTPException(status_code=404, detail="Not found")
+
+    path, size = _media_file(media_path)
+    out = job_dir(path, size)
+    file = out / segment
+
+    if not file.is_file():
+        raise HTTPException(status_code=404, detail="Not found")
+
+    # Players fetch the playlist once and then only segments
+    touch(out)
+
+    return FileResponse(
+        file,
+        media_type="video/mp4",
+        headers={"Cache-Control": SEGMENT_CACHE_CONTROL},
+    )
@@ -2,39 +2,50 @@
 Public Stremio addon endpoints.
 
 This module exposes:
-- catalogs (movies, series)
+- catalogs (movies, series; alphabetical and paginated sorted catalogs)
 - stream resolvers for movies and episodes
 - addon manifests (internal and external)
 
+Handlers are async and answer from the in-memory library snapshot of
+this worker (see db.snapshot), so they never block the event loop on
+SQLite or queue for the thread pool.
+
 Security model:
 - Internal endpoints are trusted (LAN / VPN).
 - External endpoints require a valid token and silently return empty results
-  when access is unauthorized, per Stremio addon expectations.
+  when access is unauthorized or the token is rate limited, per Stremio
+  addon expectations.
 """
 
-from fastapi import APIRouter, Request
-from urllib.parse import quote
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from urllib.parse import parse_qs
 from pathlib import Path
-import sqlite3
 
-from db.catalog import get_movie_catalog, get_series_catalog
+from db.catalog import SORTED_CATALOGS
+from db.snapshot import current
 from core.config import (
-    DB_PATH,
     MEDIA_BASE_URL_INTERNAL,
     MEDIA_BASE_URL_EXTERNAL,
     STREAM_PROVIDER_NAME_INTERNAL,
     STREAM_PROVIDER_NAME_EXTERNAL,
+    PREFETCH_NEXT_EPISODES,
+    PREFETCH_BYTES,
 )
-from core.auth import is_external, valid_stream_token
+from core.auth import is_external, allow_external_request
+from core.media import url_path
+from core.readahead import warm_files
+from core.remux import ENABLED as REMUX_ENABLED, needs_remux
+from core.tracing import traced
 
 router = APIRouter()
 
-
 # ------------------------------------------------------------
 # Helper: build a Stremio stream entry
 # Shared by movie + episode streams
 # ------------------------------------------------------------
 
+@traced("build_stream")
 def build_stream(
     *,
     path: str,
@@ -44,9 +55,8 @@ def build_stream(
     provider_name: str,
     behavior_hints: dict,
 ):
-    # Percent-encode each path segment
-    safe_path = "/".join(quote(p) for p in path.split("/"))
-    url = f"{base_url}{safe_path.replace('/media', '')}"
+    # Served by the proxy under the URL prefix of the file's media root
+    url = f"{base_url}{url_path(path)}"
 
     filename = Path(path).name
     res = resolution or ""
@@ -68,35 +78,183 @@ def build_stream(
     }
 
 
+# ------------------------------------------------------------
+# Helper: build the HLS remux entry for a file that is not web-ready
+# (see core.remux); offered next to the direct file
+# ------------------------------------------------------------
+
+def build_remux_stream(
+    *,
+    path: str,
+    resolution: str | None,
+    remux_url: str,
+    provider_name: str,
+    behavior_hints: dict,
+):
+    return {
+        "name": " ".join(filter(None, (provider_name, resolution, "HLS"))),
+        "title": f"{Path(path).name}\n🔁 Remuxed for web players",
+        "url": f"{remux_url}{url_path(path)}/index.m3u8",
+        "availability": "local",
+        "behaviorHints": behavior_hints,
+    }
+
+
+def remux_base_url(base_url: str, external: bool) -> str | None:
+    """
+    Return the base URL of the remux endpoints, or None if remux is off.
+    """
+    if not REMUX_ENABLED:
+        return None
+    return f"{base_url}/{'external' if external else 'internal'}/remux"
+
+
+# ------------------------------------------------------------
+# Helpers: stream lists for movies and episodes
+# Shared by the stream routes and the static export
+# ------------------------------------------------------------
+
+def _file_streams(rows, *, base_url, provider_name, behavior_hints, remux_url):
+    streams = []
+
+    for path, resolution, size in rows:
+        streams.append(
+            build_stream(
+                path=path,
+                resolution=resolution,
+                size=size,
+                base_url=base_url,
+                provider_name=provider_name,
+                behavior_hints=behavior_hints,
+            )
+        )
+
+        if remux_url and needs_remux(path):
+            streams.append(
+                build_remux_stream(
+                    path=path,
+                    resolution=resolution,
+                    remux_url=remux_url,
+                    provider_name=provider_name,
+                    behavior_hints=behavior_hints,
+                )
+            )
+
+    return streams
+
+
+def movie_streams(rows, *, base_url: str, provider_name: str, remux_url: str | None = None):
+    return _file_streams(
+        rows,
+        base_url=base_url,
+        provider_name=provider_name,
+        behavior_hints={
+            "notWebReady": False,
+            "confidence": 1,
+        },
+        remux_url=remux_url,
+    )
+
+
+def episode_streams(
+    rows,
+    *,
+    series_imdb_id: str,
+    base_url: str,
+    provider_name: str,
+    remux_url: str | None = None,
+):
+    return _file_streams(
+        rows,
+        base_url=base_url,
+        provider_name=provider_name,
+        behavior_hints={
+            "notWebReady": False,
+            "confidence": 1,
+            "bingeGroup": series_imdb_id,
+        },
+        remux_url=remux_url,
+    )
+
+
+# ------------------------------------------------------------
+# Helper: next-episode prefetch
+# ------------------------------------------------------------
+
+def prefetch_next_episodes(series_imdb_id: str, season: int, episode: int):
+    """
+    Warm the page cache for the files of the next PREFETCH_NEXT_EPISODES
+    episodes, so auto-advance (bingeGroup) starts quickly.
+
+    Runs as a background task after the stream response was sent.
+    """
+    rows = current().next_episode_files(series_imdb_id, season, episode, PREFETCH_NEXT_EPISODES)
+    warm_files([row[2] for row in rows], PREFETCH_BYTES)
+
+
 # ------------------------------------------------------------
 # CATALOGS
 # ------------------------------------------------------------
 
-@router.get("/internal/catalog/movie/remote-files.json")
-@router.get("/external/catalog/movie/remote-files.json")
-def catalog_movies(request: Request):
+EMPTY_CATALOG = b'{"metas":[]}'
+
+
+def _catalog(catalog_type: str, request: Request):
     external = is_external(request)
 
     # External requests fail closed with empty catalog
-    if external and not valid_stream_token(request):
-        return {"metas": []}
+    if external and not allow_external_request(request):
+        content = EMPTY_CATALOG
+    else:
+        # Serialized once per library generation
+        content = current().catalog_json[(catalog_type, external)]
+
+    return Response(content=content, media_type="application/json")
+
 
-    with sqlite3.connect(DB_PATH) as conn:
-        return {"metas": get_movie_catalog(conn)}
+@router.get("/internal/catalog/movie/remote-files.json")
+@router.get("/external/catalog/movie/remote-files.json")
+@traced()
+async def catalog_movies(request: Request):
+    return _catalog("movie", request)
 
 
 @router.get("/internal/catalog/series/remote-files.json")
 @router.get("/external/catalog/series/remote-files.json")
-def catalog_series(request: Request):
+@traced()
+async def catalog_series(request: Request):
+    return _catalog("series", request)
+
+
+def _skip(extra: str | None) -> int:
+    # Stremio passes extra properties as a path segment, e.g. "skip=100"
+    values = parse_qs(extra or "").get("skip")
+    try:
+        return max(int(values[0]), 0) if values else 0
+    except ValueError:
+        return 0
+
+
+# Registered after the alphabetical catalogs, which match first
+@router.get("/internal/catalog/{catalog_type}/{catalog_id}.json")
+@router.get("/external/catalog/{catalog_type}/{catalog_id}.json")
+@router.get("/internal/catalog/{catalog_type}/{catalog_id}/{extra}.json")
+@router.get("/external/catalog/{catalog_type}/{catalog_id}/{extra}.json")
+@traced()
+async def catalog_sorted(
+    catalog_type: str, catalog_id: str, request: Request, extra: str | None = None
+):
     external = is_external(request)
 
     # External requests fail closed with empty catalog
-    if external and not valid_stream_token(request):
-        return {"metas": []}
+    if external and not allow_external_request(request):
+        return JSONResponse({"metas": []})
 
-    with sqlite3.connect(DB_PATH) as conn:
-        return {"metas": get_series_catalog(conn)}
+    metas = current().catalog_page(catalog_type, catalog_id, _skip(extra), external)
+    if metas is None:
+        raise HTTPException(status_code=404, detail="Catalog not found")
 
+    return JSONResponse({"metas": metas})
 
 
 # ------------------------------------------------------------
@@ -105,44 +263,25 @@ def catalog_series(request: Request):
 
 @router.get("/internal/stream/movie/{imdb_id}.json")
 @router.get("/external/stream/movie/{imdb_id}.json")
-def stream_movie(imdb_id: str, request: Request):
+@traced()
+async def stream_movie(imdb_id: str, request: Request):
     external = is_external(request)
 
     # External requests fail closed with an empty stream list
-    if external and not valid_stream_token(request):
-        return {"streams": []}
+    if external and not allow_external_request(request):
+        return JSONResponse({"streams": []})
 
     base_url = MEDIA_BASE_URL_EXTERNAL if external else MEDIA_BASE_URL_INTERNAL
     provider_name = STREAM_PROVIDER_NAME_EXTERNAL if external else STREAM_PROVIDER_NAME_INTERNAL
 
-    with sqlite3.connect(DB_PATH) as conn:
-        rows = conn.execute(
-            """
-            SELECT path, resolution, size
-            FROM files
-            WHERE movie_imdb_id = ?
-            """,
-            (imdb_id,),
-        ).fetchall()
+    streams = movie_streams(
+        current().movie_files.get(imdb_id, []),
+        base_url=base_url,
+        provider_name=provider_name,
+        remux_url=remux_base_url(base_url, external),
+    )
 
-    streams = []
-
-    for path, resolution, size in rows:
-        streams.append(
-            build_stream(
-                path=path,
-                resolution=resolution,
-                size=size,
-                base_url=base_url,
-                provider_name=provider_name,
-                behavior_hints={
-                    "notWebReady": False,
-                    "confidence": 1,
-                },
-            )
-        )
-
-    return {"streams": streams}
+    return JSONResponse({"streams": streams})
 
 
 # ------------------------------------------------------------
@@ -152,63 +291,50 @@ def stream_movie(imdb_id: str, request: Request):
 
 @router.get("/internal/stream/series/{episode_id}.json")
 @router.get("/external/stream/series/{episode_id}.json")
-def stream_episode(episode_id: str, request: Request):
+@traced()
+async def stream_episode(episode_id: str, request: Request, background_tasks: BackgroundTasks):
     external = is_external(request)
 
     # External requests fail closed with an empty stream list
-    if external and not valid_stream_token(request):
-        return {"streams": []}
+    if external and not allow_external_request(request):
+        return JSONResponse({"streams": []})
 
     try:
         series_imdb_id, season, episode = episode_id.split(":")
         season = int(season)
         episode = int(episode)
     except ValueError:
-        return {"streams": []}
+        return JSONResponse({"streams": []})
 
     base_url = MEDIA_BASE_URL_EXTERNAL if external else MEDIA_BASE_URL_INTERNAL
     provider_name = STREAM_PROVIDER_NAME_EXTERNAL if external else STREAM_PROVIDER_NAME_INTERNAL
 
-    with sqlite3.connect(DB_PATH) as conn:
-        rows = conn.execute(
-            """
-            SELECT f.path, f.resolution, f.size
-            FROM episodes e
-            JOIN files f ON f.episode_id = e.id
-            WHERE e.series_imdb_id = ?
-              AND e.season = ?
-              AND e.episode = ?
-            """,
-            (series_imdb_id, season, episode),
-        ).fetchall()
+    rows = current().episode_files.get((series_imdb_id, season, episode), [])
 
-    streams = []
+    streams = episode_streams(
+        rows,
+        series_imdb_id=series_imdb_id,
+        base_url=base_url,
+        provider_name=provider_name,
+        remux_url=remux_base_url(base_url, external),
+    )
 
-    for path, resolution, size in rows:
-        streams.append(
-            build_stream(
-                path=path,
-                resolution=resolution,
-                size=size,
-                base_url=base_url,
-                provider_name=provider_name,
-                behavior_hints={
-                    "notWebReady": False,
-                    "confidence": 1,
-                    "bingeGroup": series_imdb_id,
-                },
-            )
-        )
+    # Warm the next episodes for auto-advance (after the response is sent,
+    # in the thread pool: reading files blocks)
+    if rows and PREFETCH_NEXT_EPISODES > 0:
+        background_tasks.add_task(prefetch_next_episodes, series_imdb_id, season, episode)
 
-    return {"streams": streams}
+    return JSONResponse({"streams": streams})
 
 
 # ------------------------------------------------------------
 # MANIFESTS
 # ------------------------------------------------------------
 
-@router.get("/internal/manifest.json")
-def manifest_internal():
+def internal_manifest():
+    """
+    Return the internal addon manifest (shared with the static export).
+    """
     return {
         "id": "org.remote-files.internal",
         "name": "Remote Files (Internal)",
@@ -238,13 +364,21 @@ def manifest_internal():
                 "id": "remote-files",
                 "name": "Remote Files",
             },
+            *(
+                {
+                    "type": catalog_type,
+                    "id": catalog_id,
+                    "name": name,
+                    "extra": [{"name": "skip", "isRequired": False}],
+                }
+                for (catalog_type, catalog_id), (name, _) in SORTED_CATALOGS.items()
+            ),
         ],
     }
 
 
 
-@router.get("/external/manifest.json")
-def manifest_external():
+def external_manifest():
     return {
         "id": "org.remote-files.external",
         "name": "Remote Files (External)",
@@ -265,3 +399,13 @@ def manifest_external():
         "types": ["movie", "series"],
         "catalogs": [],
     }
+
+
+@router.get("/internal/manifest.json")
+async def manifest_internal():
+    return JSONResponse(internal_manifest())
+
+
+@router.get("/external/manifest.json")
+async def manifest_external():
+    return JSONResponse(external_manifest())
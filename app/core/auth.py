@@ -7,11 +7,14 @@ Stremio Remote Files addon.
 Security model:
 - Internal endpoints are trusted based on network placement.
 - External stream resolvers require a stream token and fail closed (empty results).
+- Stream tokens are rate limited per token (see core.ratelimit).
 - Admin actions require a dedicated Bearer token and fail explicitly.
 """
 
 from fastapi import Request, HTTPException
 from core.config import ADMIN_SCAN_TOKEN, STREAM_TOKENS
+from core.ratelimit import allow_request
+from core.tracing import traced
 
 
 def is_external(request: Request) -> bool:
@@ -23,25 +26,38 @@ def is_external(request: Request) -> bool:
     return request.url.path.startswith("/external")
 
 
-def valid_stream_token(request: Request) -> bool:
+@traced("auth.token")
+def stream_token(request: Request) -> str | None:
     """
-    Validate the token passed to external Stremio stream resolver endpoints.
+    Return the valid stream token passed with a request, or None.
 
-    External stream endpoints do not raise errors on auth failure; they return
-    empty results instead to satisfy Stremio addon expectations.
+    Accepts `Authorization: Bearer <token>` or `?token=<token>` (used by
+    stream resolvers).
     """
     # 1. Authorization: Bearer <token>
     auth = request.headers.get("authorization")
     if auth and auth.lower().startswith("bearer "):
         token = auth[7:].strip()
-        return token in STREAM_TOKENS
+        return token if token in STREAM_TOKENS else None
 
     # 2. ?token=<token> (used by stream resolvers)
     token = request.query_params.get("token")
     if token:
-        return token in STREAM_TOKENS
+        return token if token in STREAM_TOKENS else None
+
+    return None
+
+
+def allow_external_request(request: Request) -> bool:
+    """
+    Validate the stream token and charge the request to its rate limit.
+
+    Used by external catalog and stream endpoints, which fail closed
+    (empty results) when this returns False.
+    """
+    token = stream_token(request)
+    return token is not None and allow_request(token)
 
-    return False
 
 def require_admin_token(request: Request):
     """
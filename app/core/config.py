@@ -7,9 +7,64 @@ and access tokens.
 """
 
 import os
+from pathlib import Path
 
 # SQLite database location (mounted volume)
-DB_PATH = "/data/library.db"
+DB_PATH = os.getenv("DB_PATH", "/data/library.db")
+
+# Lock file used to elect a single scanning process when running
+# several uvicorn workers (lives next to the database)
+SCAN_LOCK_PATH = os.path.join(os.path.dirname(DB_PATH), "scan.lock")
+
+# Flag file asking the running scan to stop at its next folder entry
+# (see scanner.checkpoint)
+SCAN_CANCEL_PATH = os.path.join(os.path.dirname(DB_PATH), "scan.cancel")
+
+# Profile requests for the scanner process and their reports are
+# exchanged through files in this folder (see core.profiling)
+PROFILE_DIR = os.path.dirname(DB_PATH)
+
+# Full library scans commit their progress at least this often (seconds),
+# together with a cursor to resume from after a restart or a cancel
+SCAN_CHECKPOINT_SECONDS = float(os.getenv("SCAN_CHECKPOINT_SECONDS", "30"))
+
+# Scans run in a separate process (`python -m scanner`, see
+# scanner.process) with this nice increment, so playback requests keep
+# priority over scanning on the CPU (0 keeps the API's priority)
+SCANNER_NICE = int(os.getenv("SCANNER_NICE", "10"))
+
+# Deferred metadata lookups (see scanner.resolve): titles TMDB could not
+# answer during a scan are retried after METADATA_RETRY_SECONDS, doubling
+# with every failed attempt up to METADATA_RETRY_MAX_SECONDS. After a
+# failure, TMDB is not asked again for METADATA_RETRY_SECONDS.
+METADATA_RETRY_SECONDS = int(os.getenv("METADATA_RETRY_SECONDS", "60"))
+METADATA_RETRY_MAX_SECONDS = int(os.getenv("METADATA_RETRY_MAX_SECONDS", "86400"))
+
+# TMDB requests per second made by the retry worker
+TMDB_RATE = float(os.getenv("TMDB_RATE", "4"))
+
+# Lock file held by the retry worker (lives next to the database)
+RESOLVE_LOCK_PATH = os.path.join(os.path.dirname(DB_PATH), "resolve.lock")
+
+# Logging (see core.log)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text | json
+
+# Repeats of the same message allowed per interval before they are dropped
+# (0 disables rate limiting)
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "10"))
+LOG_RATE_INTERVAL = float(os.getenv("LOG_RATE_INTERVAL", "60"))
+
+# Tracing (see core.tracing); TRACE_EXPORT selects the exporter and
+# tracing is off when it is empty:
+# - a file path: finished spans are appended as JSON lines
+# - an http(s) URL: spans are sent to an OTLP/HTTP collector, e.g.
+#   http://otel-collector:4318/v1/traces
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "")
+
+# Share of HTTP requests traced (0.0 - 1.0); scans, ingestion and agent
+# manifests are always traced while tracing is on
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
 
 # Base URLs for serving media
 MEDIA_BASE_URL_INTERNAL = os.getenv("MEDIA_BASE_URL_INTERNAL")
@@ -36,9 +91,131 @@ STREAM_PROVIDER_NAME_EXTERNAL = os.getenv(
 RAW_STREAM_TOKENS = os.getenv("STREAM_TOKENS", "")
 STREAM_TOKENS = {t.strip() for t in RAW_STREAM_TOKENS.split(",") if t.strip()}
 
+# Per-token limits for external access, enforced in memory by each API
+# worker (see core.ratelimit); 0 disables a limit:
+# - TOKEN_RATE: sustained requests per second (/auth and external endpoints)
+# - TOKEN_BURST: requests allowed at once before TOKEN_RATE applies
+# - TOKEN_MAX_STREAMS: media files played concurrently; a file counts as
+#   playing until no range request arrived for TOKEN_STREAM_IDLE seconds
+TOKEN_RATE = float(os.getenv("TOKEN_RATE", "0"))
+TOKEN_BURST = int(os.getenv("TOKEN_BURST", "60"))
+TOKEN_MAX_STREAMS = int(os.getenv("TOKEN_MAX_STREAMS", "0"))
+TOKEN_STREAM_IDLE = float(os.getenv("TOKEN_STREAM_IDLE", "60"))
+
+def _token_limits(raw: str) -> dict:
+    limits = {}
+
+    for number, entry in enumerate(raw.split(","), start=1):
+        # Tokens may contain "=" (base64 padding); limits never do
+        token, _, spec = entry.strip().rpartition("=")
+        if not token or not spec:
+            continue
+
+        try:
+            rate, burst, streams = (spec.split(":") + ["", "", ""])[:3]
+            limits[token] = (
+                float(rate) if rate else TOKEN_RATE,
+                int(burst) if burst else TOKEN_BURST,
+                int(streams) if streams else TOKEN_MAX_STREAMS,
+            )
+        except ValueError:
+            # Name the entry by position: the token itself is a secret
+            raise RuntimeError(
+                f"TOKEN_LIMITS entry {number}: invalid limits {spec!r}, expected rate:burst:streams"
+            ) from None
+
+    return limits
+
+
+# Per-token overrides of the limits above, e.g. for a shared family token:
+#   TOKEN_LIMITS=token1=10:100:4,token2=::1   (rate:burst:streams, empty keeps the default)
+RAW_TOKEN_LIMITS = os.getenv("TOKEN_LIMITS", "")
+TOKEN_LIMITS = _token_limits(RAW_TOKEN_LIMITS)
+
 # Admin scan token (admin actions only)
 ADMIN_SCAN_TOKEN = os.getenv("ADMIN_SCAN_TOKEN")
 
 # Media subfolder names under /media
 MOVIES_DIR_NAME = os.getenv("MOVIES_DIR_NAME", "movies")
 SERIES_DIR_NAME = os.getenv("SERIES_DIR_NAME", "series")
+
+
+def _media_roots(raw: str, default: str) -> dict:
+    roots = {}
+
+    for entry in (raw or default).split(","):
+        folder, _, prefix = entry.partition("=")
+        folder = folder.strip().rstrip("/")
+        if folder:
+            # Default URL prefix: the folder below /media
+            prefix = prefix.strip().strip("/") or folder.removeprefix("/media").strip("/")
+            roots[Path(folder)] = "/" + prefix
+
+    return roots or _media_roots("", default)
+
+
+# Library folders, e.g. on several disks or NAS shares: comma-separated
+# folders, each optionally with the URL path the proxy serves it under
+# (stream URLs are <MEDIA_BASE_URL><prefix>/<path below the folder>):
+#   MOVIES_ROOTS=/media/movies,/media/nas2/movies=/movies2
+# The default prefix is the folder path below /media. Without these,
+# the single folder /media/<MOVIES_DIR_NAME> (<SERIES_DIR_NAME>) is used.
+MOVIES_ROOT_PREFIXES = _media_roots(os.getenv("MOVIES_ROOTS", ""), f"/media/{MOVIES_DIR_NAME}")
+SERIES_ROOT_PREFIXES = _media_roots(os.getenv("SERIES_ROOTS", ""), f"/media/{SERIES_DIR_NAME}")
+MOVIES_ROOTS = list(MOVIES_ROOT_PREFIXES)
+SERIES_ROOTS = list(SERIES_ROOT_PREFIXES)
+
+# Addon requests are served from an in-memory library snapshot per API
+# worker (see db.snapshot); it is reloaded when the library generation
+# changes, checked every SNAPSHOT_POLL_SECONDS
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "1"))
+
+# Next-episode prefetch: a stream request for S/E pre-resolves the next
+# N episodes and warms the OS page cache for the head of their files
+# (0 disables)
+PREFETCH_NEXT_EPISODES = int(os.getenv("PREFETCH_NEXT_EPISODES", "0"))
+PREFETCH_BYTES = int(os.getenv("PREFETCH_BYTES", str(16 * 1024 ** 2)))
+
+# On-demand remux of files that are not web-ready (MKV, AVI, ...) to
+# HLS with fragmented MP4 segments (see core.remux); empty disables it.
+# The cache is bounded by REMUX_CACHE_BYTES (least recently played
+# files are evicted); REMUX_MAX_JOBS limits concurrent ffmpeg processes
+# per API worker (0 disables remux like an empty REMUX_CACHE_DIR)
+REMUX_CACHE_DIR = os.getenv("REMUX_CACHE_DIR", "")
+REMUX_CACHE_BYTES = int(os.getenv("REMUX_CACHE_BYTES", str(20 * 1024 ** 3)))
+REMUX_MAX_JOBS = int(os.getenv("REMUX_MAX_JOBS", "1"))
+REMUX_SEGMENT_SECONDS = int(os.getenv("REMUX_SEGMENT_SECONDS", "6"))
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+FFPROBE_PATH = os.getenv("FFPROBE_PATH", "ffprobe")
+
+# Local poster cache (see metadata.posters); empty disables it.
+# Posters are fetched once after each scan and served from
+# /posters/<imdb_id>/<variant>.jpg; POSTER_ORIGIN overrides the poster
+# source URL (template with {imdb_id}), e.g. for a mirror
+POSTER_CACHE_DIR = os.getenv("POSTER_CACHE_DIR", "")
+POSTER_ORIGIN = os.getenv("POSTER_ORIGIN", "")
+# Variant used in catalogs: small (185 px wide) or medium (342 px)
+POSTER_VARIANT = os.getenv("POSTER_VARIANT", "medium")
+
+# Static export of the internal addon (manifests, catalogs, streams)
+# rendered after each scan for Caddy to serve directly; empty disables it
+STATIC_EXPORT_DIR = os.getenv("STATIC_EXPORT_DIR", "")
+
+# Lock file serializing static exports between processes (lives next to
+# the database)
+EXPORT_LOCK_PATH = os.path.join(os.path.dirname(DB_PATH), "export.lock")
+
+# Path prefix rewrites for ingestion requests, e.g. when Sonarr/Radarr see
+# the library under different mount points than this container:
+#   INGEST_PATH_MAP=/tv=/media/series,/movies=/media/movies
+RAW_INGEST_PATH_MAP = os.getenv("INGEST_PATH_MAP", "")
+INGEST_PATH_MAP = sorted(
+    (
+        tuple(part.strip().rstrip("/") for part in entry.split("=", 1))
+        for entry in RAW_INGEST_PATH_MAP.split(",")
+        if "=" in entry
+    ),
+    # Longest source prefix wins
+    key=lambda pair: len(pair[0]),
+    reverse=True,
+)
@@ -0,0 +1,153 @@
+"""
+Logging setup.
+
+All modules log through the standard logging module
+(`logging.getLogger(__name__)`). Records are put on an in-memory queue and
+written to stdout (stderr in the scanner process, whose stdout carries
+its result) by a background thread, so scans and request handlers
+never block on Docker's log pipe.
+
+Structured data is attached with `extra={"fields": {...}}`. The text
+format appends it as key=value pairs; the JSON format emits it as
+top-level keys (one JSON object per line).
+
+Repeated messages (same logger and message template, below ERROR) are
+rate limited: after LOG_RATE_LIMIT records per LOG_RATE_INTERVAL seconds
+further repeats are dropped, and the next record that gets through
+reports how many were suppressed.
+"""
+
+import atexit
+from datetime import datetime, timezone
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+from core.config import LOG_FORMAT, LOG_LEVEL, LOG_RATE_INTERVAL, LOG_RATE_LIMIT
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+_listener = None
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Rate-limit repeats of the same message template.
+
+    Records at ERROR and above always pass.
+    """
+
+    def __init__(self, limit: int, interval: float):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno >= logging.ERROR:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+
+        with self._lock:
+            started, count, suppressed = self._windows.get(key, (now, 0, 0))
+
+            if now - started >= self.interval:
+                started, count = now, 0
+
+            if count >= self.limit:
+                self._windows[key] = (started, count, suppressed + 1)
+                return False
+
+            self._windows[key] = (started, count + 1, 0)
+
+        if suppressed:
+            fields = dict(getattr(record, "fields", None) or {})
+            fields["suppressed"] = suppressed
+            record.fields = fields
+
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Human-readable lines with structured fields appended as key=value.
+    """
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, with structured fields as top-level keys.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(stream=None):
+    """
+    Route the root logger through a queue to a writer thread for `stream`
+    (stdout by default).
+
+    Safe to call more than once (e.g. from several entry points).
+    """
+    global _listener
+
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Drop repeats before they are queued
+    queue_handler.addFilter(RepeatFilter(LOG_RATE_LIMIT, LOG_RATE_INTERVAL))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+
+    # Flush queued records on shutdown
+    atexit.register(_listener.stop)
+
+
+def log_summary(logger, message: str, counts, started: float, **fields):
+    """
+    Log an end-of-run summary record with counters and elapsed time.
+
+    counts is a mapping of counter name to value (e.g. a Counter);
+    started is a time.monotonic() timestamp.
+    """
+    summary = dict(fields)
+    summary.update(sorted(counts.items()))
+    summary["duration_s"] = round(time.monotonic() - started, 2)
+
+    logger.info(message, extra={"fields": summary})
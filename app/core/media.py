@@ -0,0 +1,68 @@
+"""
+Media roots and their public URL paths.
+
+Movies and series can live in several folders (MOVIES_ROOTS,
+SERIES_ROOTS), e.g. one per disk or NAS share. The proxy serves each
+folder under its own URL prefix, so a library file maps to the URL path
+
+    <prefix>/<path below its root>
+
+which stream URLs append to MEDIA_BASE_URL_INTERNAL / _EXTERNAL and the
+remux endpoints use to address files.
+"""
+
+from pathlib import Path
+from urllib.parse import quote
+
+from core.config import MOVIES_ROOT_PREFIXES, SERIES_ROOT_PREFIXES
+
+ROOT_PREFIXES = {**MOVIES_ROOT_PREFIXES, **SERIES_ROOT_PREFIXES}
+
+# Longest folders / prefixes first, so nested roots resolve to the inner one
+_BY_FOLDER = sorted(ROOT_PREFIXES.items(), key=lambda item: len(item[0].parts), reverse=True)
+_BY_PREFIX = sorted(ROOT_PREFIXES.items(), key=lambda item: len(item[1]), reverse=True)
+
+
+def find_root(path, roots=ROOT_PREFIXES) -> Path | None:
+    """
+    Return the media root containing path (or equal to it), or None.
+    """
+    path = Path(path)
+
+    for folder, _ in _BY_FOLDER:
+        if folder in roots and path.is_relative_to(folder):
+            return folder
+
+    return None
+
+
+def url_path(path: str) -> str:
+    """
+    Return the percent-encoded URL path of a library file.
+
+    Files outside every root (e.g. indexed before a root was removed)
+    keep their path below /media.
+    """
+    root = find_root(path)
+    if root is None:
+        prefix, relative = "", path.removeprefix("/media")
+    else:
+        prefix, relative = ROOT_PREFIXES[root].rstrip("/"), path[len(str(root)):]
+
+    return prefix + "/".join(quote(part) for part in relative.split("/"))
+
+
+def media_file(media_path: str) -> str | None:
+    """
+    Return the library path of a decoded URL path without its leading
+    slash (e.g. "movies/Movie (2020).mkv"), or None if it is outside
+    every root.
+    """
+    media_path = "/" + media_path
+
+    for folder, prefix in _BY_PREFIX:
+        prefix = prefix.rstrip("/") + "/"
+        if media_path.startswith(prefix):
+            return f"{folder}/{media_path[len(prefix):]}"
+
+    return None
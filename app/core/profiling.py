@@ -0,0 +1,415 @@
+"""
+On-demand CPU and memory profiles (see api.profile).
+
+CPU profiles sample the stacks of all threads (sys._current_frames())
+every SAMPLE_INTERVAL for a fixed window, so they cover the event loop,
+the thread pool and background threads alike, and cost nothing outside
+the window. Samples are wall-clock: a thread waiting on I/O or a lock is
+counted at the call that waits. The per-thread CPU seconds read from
+/proc tell busy threads from waiting ones.
+
+Memory profiles diff two tracemalloc snapshots taken at the start and
+the end of the window, grouped by module. tracemalloc only sees memory
+allocated while it traces: started on demand, a report shows what the
+window allocated and kept. Set PYTHONTRACEMALLOC=1 on the process to
+trace from startup, so reports also include long-lived data such as the
+library snapshot (db.catalog, db.snapshot).
+
+The scanner process (see scanner.process) is profiled through files in
+PROFILE_DIR: the API writes profile-<pid>.request for the scan leader,
+whose watcher thread (watch_requests) captures the profile and writes
+profile-<pid>.report.
+"""
+
+from collections import Counter
+import json
+import linecache
+import logging
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+import tracemalloc
+
+from core.config import PROFILE_DIR
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("cpu", "memory")
+FORMATS = ("text", "collapsed")  # collapsed: flame graph input, CPU profiles only
+
+SAMPLE_INTERVAL = 0.01
+MAX_SECONDS = 120
+
+# Rows per report section
+TOP = 30
+
+# How often the scanner process looks for a profile request
+WATCH_INTERVAL = 0.5
+
+# One profile at a time per process (tracemalloc is process-wide)
+_lock = threading.Lock()
+
+
+class ProfileBusy(Exception):
+    """
+    A profile is already being captured in this process.
+    """
+
+
+def check_request(kind: str, seconds: float, fmt: str):
+    """
+    Raise ValueError for an invalid profile request.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown profile {kind!r}, expected one of {', '.join(KINDS)}")
+
+    if not 0 < seconds <= MAX_SECONDS:
+        raise ValueError(f"seconds must be between 0 and {MAX_SECONDS}")
+
+    if fmt not in FORMATS or (kind == "memory" and fmt != "text"):
+        raise ValueError(f"Unsupported format {fmt!r} for a {kind} profile")
+
+
+def capture(kind: str, seconds: float, fmt: str = "text", label: str = "api") -> str:
+    """
+    Profile this process for `seconds` and return the report.
+
+    Blocks for the whole window; raises ProfileBusy if another profile
+    is running.
+    """
+    if not _lock.acquire(blocking=False):
+        raise ProfileBusy()
+
+    try:
+        if kind == "cpu":
+            return cpu_profile(seconds, fmt, label)
+        return memory_profile(seconds, label)
+    finally:
+        _lock.release()
+
+
+# ------------------------------------------------------------
+# CPU
+# ------------------------------------------------------------
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+
+def _thread_cpu() -> dict[int, float]:
+    """
+    Return CPU seconds (user + system) per native thread ID, or an empty
+    dict where /proc is not available.
+    """
+    ticks = os.sysconf("SC_CLK_TCK")
+    times = {}
+
+    try:
+        tids = os.listdir("/proc/self/task")
+    except OSError:
+        return times
+
+    for tid in tids:
+        try:
+            with open(f"/proc/self/task/{tid}/stat") as f:
+                stat = f.read()
+        except OSError:  # thread exited
+            continue
+
+        # utime and stime are fields 14 and 15; the command name before
+        # them may contain spaces
+        fields = stat.rsplit(")", 1)[1].split()
+        times[int(tid)] = (int(fields[11]) + int(fields[12])) / ticks
+
+    return times
+
+
+def _sample(seconds: float) -> tuple[Counter, int]:
+    """
+    Sample the stacks of all other threads until the window ends.
+
+    Returns counts per (thread ident, stack from outermost frame) and
+    the number of sampling rounds.
+    """
+    own = threading.get_ident()
+    stacks = Counter()
+    rounds = 0
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+
+            stacks[ident, tuple(reversed(stack))] += 1
+
+        rounds += 1
+        time.sleep(SAMPLE_INTERVAL)
+
+    return stacks, rounds
+
+
+def cpu_profile(seconds: float, fmt: str = "text", label: str = "api") -> str:
+    threads = {thread.ident: thread for thread in threading.enumerate()}
+    cpu_before = _thread_cpu()
+    started = time.monotonic()
+
+    stacks, rounds = _sample(seconds)
+
+    elapsed = time.monotonic() - started
+    cpu_after = _thread_cpu()
+    threads.update({thread.ident: thread for thread in threading.enumerate()})
+
+    def thread_name(ident):
+        thread = threads.get(ident)
+        return thread.name if thread else str(ident)
+
+    if fmt == "collapsed":
+        # One line per stack: thread;outer;...;inner <samples>
+        return "".join(
+            ";".join((thread_name(ident).replace(";", "_"), *stack)) + f" {count}\n"
+            for (ident, stack), count in stacks.most_common()
+        )
+
+    lines = [
+        f"CPU profile of {label} (pid {os.getpid()})",
+        f"Window: {elapsed:.1f} s, {rounds} samples every {SAMPLE_INTERVAL * 1000:.0f} ms",
+        "Samples are wall-clock: waiting threads are counted at the call that waits.",
+    ]
+
+    # CPU seconds per thread over the window
+    if cpu_after:
+        used = {
+            tid: cpu_after[tid] - cpu_before.get(tid, 0.0)
+            for tid in cpu_after
+        }
+        names = {thread.native_id: thread.name for thread in threads.values()}
+
+        lines += [
+            "",
+            f"CPU time by thread ({sum(used.values()):.2f} s in total)",
+            f"{'cpu s':>8} {'cpu %':>7}  thread",
+        ]
+        for tid, cpu in sorted(used.items(), key=lambda item: -item[1])[:TOP]:
+            lines.append(
+                f"{cpu:8.2f} {cpu / elapsed * 100:7.1f}  {names.get(tid, f'native {tid}')}"
+            )
+
+    # Self: innermost frame; total: anywhere on the stack
+    own_samples = Counter()
+    total_samples = Counter()
+    for (_, stack), count in stacks.items():
+        own_samples[stack[-1]] += count
+        for name in set(stack):
+            total_samples[name] += count
+
+    lines += [
+        "",
+        "Top functions (% of samples, summed over threads)",
+        f"{'self %':>7} {'total %':>8}  function",
+    ]
+    for name, count in own_samples.most_common(TOP):
+        lines.append(
+            f"{count / rounds * 100:7.1f} {total_samples[name] / rounds * 100:8.1f}  {name}"
+        )
+
+    lines += [
+        "",
+        "Top functions by total",
+        f"{'self %':>7} {'total %':>8}  function",
+    ]
+    for name, count in total_samples.most_common(TOP):
+        lines.append(
+            f"{own_samples[name] / rounds * 100:7.1f} {count / rounds * 100:8.1f}  {name}"
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------
+# Memory
+# ------------------------------------------------------------
+
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _module_names() -> dict[str, str]:
+    return {
+        os.path.abspath(module.__file__): name
+        for name, module in list(sys.modules.items())
+        if getattr(module, "__file__", None)
+    }
+
+
+def _kib(size: int, sign: bool = False) -> str:
+    return f"{size / 1024:+12.1f}" if sign else f"{size / 1024:12.1f}"
+
+
+def memory_profile(seconds: float, label: str = "api") -> str:
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        started = time.monotonic()
+
+        time.sleep(seconds)
+
+        elapsed = time.monotonic() - started
+        after = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    modules = _module_names()
+
+    def module(filename):
+        return modules.get(os.path.abspath(filename), filename)
+
+    lines = [
+        f"Memory profile of {label} (pid {os.getpid()})",
+        f"Window: {elapsed:.1f} s, tracing since "
+        + ("before the window (PYTHONTRACEMALLOC)" if tracing else "the start of the window"),
+        f"Traced memory: {current / 2**20:.1f} MiB at the end, {peak / 2**20:.1f} MiB peak",
+    ]
+
+    # Several files may map to one name (e.g. frozen modules)
+    live = Counter()
+    blocks = Counter()
+    for stat in after.statistics("filename"):
+        name = module(stat.traceback[0].filename)
+        live[name] += stat.size
+        blocks[name] += stat.count
+
+    lines += [
+        "",
+        "Live allocations by module",
+        f"{'KiB':>12} {'blocks':>10}  module",
+    ]
+    for name, size in live.most_common(TOP):
+        lines.append(f"{_kib(size)} {blocks[name]:10d}  {name}")
+
+    growth = Counter()
+    block_growth = Counter()
+    for stat in after.compare_to(before, "filename"):
+        name = module(stat.traceback[0].filename)
+        growth[name] += stat.size_diff
+        block_growth[name] += stat.count_diff
+
+    lines += [
+        "",
+        "Growth by module during the window",
+        f"{'KiB':>12} {'blocks':>10}  module",
+    ]
+    for name, size in sorted(growth.items(), key=lambda item: -abs(item[1]))[:TOP]:
+        if size or block_growth[name]:
+            lines.append(f"{_kib(size, sign=True)} {block_growth[name]:+10d}  {name}")
+
+    lines += [
+        "",
+        "Top allocation sites by growth",
+        f"{'KiB':>12} {'blocks':>10}  site",
+    ]
+    for stat in after.compare_to(before, "lineno")[:TOP]:
+        if not stat.size_diff and not stat.count_diff:
+            continue
+
+        frame = stat.traceback[0]
+        source = linecache.getline(frame.filename, frame.lineno).strip()
+        lines.append(
+            f"{_kib(stat.size_diff, sign=True)} {stat.count_diff:+10d}  "
+            f"{module(frame.filename)}:{frame.lineno}  {source[:80]}"
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------
+# Scanner process
+# ------------------------------------------------------------
+
+def _request_path(pid: int) -> Path:
+    return Path(PROFILE_DIR) / f"profile-{pid}.request"
+
+
+def _report_path(pid: int) -> Path:
+    return Path(PROFILE_DIR) / f"profile-{pid}.report"
+
+
+def _write(path: Path, text: str):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def request_profile(pid: int, kind: str, seconds: float, fmt: str = "text"):
+    """
+    Ask the scanner process `pid` to capture a profile; poll
+    take_report() for the result.
+    """
+    _report_path(pid).unlink(missing_ok=True)
+    _write(_request_path(pid), json.dumps({"kind": kind, "seconds": seconds, "format": fmt}))
+
+
+def take_report(pid: int) -> str | None:
+    """
+    Return and remove the report of scanner process `pid`, or None if it
+    is not written yet.
+    """
+    path = _report_path(pid)
+    try:
+        report = path.read_text()
+    except FileNotFoundError:
+        return None
+
+    path.unlink(missing_ok=True)
+    return report
+
+
+def withdraw_request(pid: int):
+    _request_path(pid).unlink(missing_ok=True)
+
+
+def watch_requests(label: str):
+    """
+    Start a daemon thread that captures the profiles requested for this
+    process (scanner process only).
+    """
+    pid = os.getpid()
+    request_path = _request_path(pid)
+
+    def watch():
+        while True:
+            time.sleep(WATCH_INTERVAL)
+
+            try:
+                request = json.loads(request_path.read_text())
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                request = None
+            request_path.unlink(missing_ok=True)
+
+            try:
+                check_request(request["kind"], request["seconds"], request["format"])
+                report = capture(request["kind"], request["seconds"], request["format"], label)
+            except Exception as e:
+                logger.exception("Profile request failed")
+                report = f"Profile failed: {e!r}\n"
+
+            _write(_report_path(pid), report)
+
+    threading.Thread(target=watch, name="profile-watch", daemon=True).start()
@@ -0,0 +1,189 @@
+"""
+Per-token request and stream limits for external access.
+
+Each stream token gets:
+- A token bucket (TOKEN_RATE requests/second, TOKEN_BURST capacity)
+  charged by every /auth call and external catalog/stream request
+- A cap on concurrently played media files (TOKEN_MAX_STREAMS). Caddy's
+  forward_auth sends the requested media path in X-Forwarded-Uri; a path
+  is an active stream until no request for it arrived for
+  TOKEN_STREAM_IDLE seconds.
+
+TOKEN_LIMITS overrides the limits for individual tokens.
+
+State lives in memory in each API worker, so with WEB_CONCURRENCY=N a
+token can use up to N times the configured rates. All checks are O(1)
+(the stream check is bounded by the token's stream cap).
+"""
+
+from datetime import datetime, timezone
+import hashlib
+import threading
+import time
+
+from core.config import (
+    TOKEN_BURST,
+    TOKEN_LIMITS,
+    TOKEN_MAX_STREAMS,
+    TOKEN_RATE,
+    TOKEN_STREAM_IDLE,
+)
+from core.tracing import traced
+
+
+class TokenState:
+    """
+    Bucket, active streams and usage counters of one token.
+    """
+
+    __slots__ = (
+        "rate",
+        "burst",
+        "max_streams",
+        "tokens",
+        "refilled",
+        "streams",
+        "requests",
+        "rate_limited",
+        "stream_limited",
+        "streams_started",
+        "last_seen",
+    )
+
+    def __init__(self, rate: float, burst: int, max_streams: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_streams = max_streams
+
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+
+        # {media path: monotonic time of the last request}
+        self.streams = {}
+
+        self.requests = 0
+        self.rate_limited = 0
+        self.stream_limited = 0
+        self.streams_started = 0
+        self.last_seen = None
+
+
+_states = {}
+_lock = threading.Lock()
+
+
+def _state(token: str) -> TokenState:
+    state = _states.get(token)
+    if state is None:
+        rate, burst, max_streams = TOKEN_LIMITS.get(
+            token, (TOKEN_RATE, TOKEN_BURST, TOKEN_MAX_STREAMS)
+        )
+        state = _states[token] = TokenState(rate, burst, max_streams)
+    return state
+
+
+def _expire_streams(state: TokenState, now: float):
+    for path, seen in list(state.streams.items()):
+        if now - seen >= TOKEN_STREAM_IDLE:
+            del state.streams[path]
+
+
+@traced("ratelimit.request")
+def allow_request(token: str) -> bool:
+    """
+    Charge one request to the token's bucket.
+
+    Returns False if the token exceeded its request rate.
+    """
+    now = time.monotonic()
+
+    with _lock:
+        state = _state(token)
+        state.requests += 1
+        state.last_seen = datetime.now(timezone.utc)
+
+        if state.rate <= 0:
+            return True
+
+        # now may predate refilled: a new state, or a request that waited
+        # for the lock behind a later one
+        elapsed = max(0.0, now - state.refilled)
+        state.tokens = min(state.burst, state.tokens + elapsed * state.rate)
+        state.refilled = now
+
+        if state.tokens < 1:
+            state.rate_limited += 1
+            return False
+
+        state.tokens -= 1
+        return True
+
+
+@traced("ratelimit.stream")
+def allow_stream(token: str, path: str | None) -> bool:
+    """
+    Register a media request for path.
+
+    Returns False if path would be a new stream beyond the token's cap.
+    Requests without a path (not coming from the media proxy) pass.
+    """
+    if not path:
+        return True
+
+    # Range requests of one file may differ in their query string
+    path = path.split("?", 1)[0]
+    now = time.monotonic()
+
+    with _lock:
+        state = _state(token)
+
+        if path not in state.streams:
+            # Expire on insert, so paths do not pile up when the cap is
+            # disabled (active streams are still reported)
+            _expire_streams(state, now)
+
+            if 0 < state.max_streams <= len(state.streams):
+                state.stream_limited += 1
+                return False
+
+            state.streams_started += 1
+
+        state.streams[path] = now
+        return True
+
+
+def token_id(token: str) -> str:
+    """
+    Short, non-reversible identifier for a token (for reports and logs).
+    """
+    return hashlib.sha256(token.encode()).hexdigest()[:12]
+
+
+def usage() -> list[dict]:
+    """
+    Return usage counters for every token seen by this worker.
+    """
+    now = time.monotonic()
+
+    with _lock:
+        report = []
+        for token, state in _states.items():
+            _expire_streams(state, now)
+            report.append(
+                {
+                    "token_id": token_id(token),
+                    "requests": state.requests,
+                    "rate_limited": state.rate_limited,
+                    "stream_limited": state.stream_limited,
+                    "streams_started": state.streams_started,
+                    "active_streams": len(state.streams),
+                    "last_seen": state.last_seen.isoformat() if state.last_seen else None,
+                    "limits": {
+                        "rate": state.rate,
+                        "burst": state.burst,
+                        "max_streams": state.max_streams,
+                    },
+                }
+            )
+
+    return sorted(report, key=lambda r: r["requests"], reverse=True)
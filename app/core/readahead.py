@@ -0,0 +1,96 @@
+"""
+Storage read-ahead for media files.
+
+Warms the OS page cache for the start of media files that are likely to
+be played soon (see PREFETCH_NEXT_EPISODES), so players don't wait on a
+spinning disk or NFS round trips when they open them.
+
+Where available, `posix_fadvise(POSIX_FADV_WILLNEED)` asks the kernel to
+read the range asynchronously; elsewhere the range is read and
+discarded. A small block at the end of the file is warmed as well:
+players read the MKV cues / MP4 index there before starting playback.
+
+Work runs on a small dedicated thread pool, never on request threads.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Tail of the file holding the seek index of most containers
+TAIL_BYTES = 1024 ** 2
+
+# Files warmed within this many seconds are skipped
+RECENT_SECONDS = 600
+
+READ_CHUNK = 1024 ** 2
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="readahead")
+
+# {path: monotonic time of the last warm-up}
+_recent = {}
+_recent_lock = threading.Lock()
+
+
+def _read_range(fd, offset: int, length: int):
+    end = offset + length
+    while offset < end:
+        chunk = os.pread(fd, min(READ_CHUNK, end - offset), offset)
+        if not chunk:
+            break
+        offset += len(chunk)
+
+
+def warm_file(path: str, nbytes: int):
+    """
+    Bring the first nbytes (and the last TAIL_BYTES) of a file into the
+    page cache. Errors are logged and ignored.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError as e:
+        logger.debug("Read-ahead skipped: %s (%s)", path, e)
+        return
+
+    try:
+        size = os.fstat(fd).st_size
+        ranges = [(0, min(nbytes, size))]
+        if size > nbytes:
+            tail = max(nbytes, size - TAIL_BYTES)
+            ranges.append((tail, size - tail))
+
+        for offset, length in ranges:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+            else:
+                _read_range(fd, offset, length)
+
+        logger.debug("Read-ahead: %s", path)
+    except OSError as e:
+        logger.debug("Read-ahead failed: %s (%s)", path, e)
+    finally:
+        os.close(fd)
+
+
+def warm_files(paths, nbytes: int):
+    """
+    Schedule read-ahead for files not warmed recently. Returns immediately.
+    """
+    now = time.monotonic()
+
+    with _recent_lock:
+        # Forget old entries so the map stays small
+        for path, warmed in list(_recent.items()):
+            if now - warmed >= RECENT_SECONDS:
+                del _recent[path]
+
+        pending = [p for p in paths if p not in _recent]
+        for path in pending:
+            _recent[path] = now
+
+    for path in pending:
+        _executor.submit(warm_file, path, nbytes)
@@ -0,0 +1,334 @@
+"""
+On-demand remux to HLS (fragmented MP4).
+
+MKV, AVI and similar containers stutter or fail on web and some TV
+clients. For such files the stream lists advertise an extra HLS entry
+(see api.stremio); the first request starts an ffmpeg job that remuxes
+the file into fMP4 segments:
+
+- Video is copied; audio is copied when browsers can decode it (AAC,
+  MP3, Opus) and transcoded to AAC otherwise (DTS, AC-3, TrueHD, ...)
+- The playlist is an HLS EVENT playlist: playback starts as soon as the
+  first segments exist, while ffmpeg keeps writing
+- Finished jobs stay in REMUX_CACHE_DIR, so repeat plays and seeks are
+  served from disk
+
+    <REMUX_CACHE_DIR>/<key>/index.m3u8
+    <REMUX_CACHE_DIR>/<key>/init.mp4
+    <REMUX_CACHE_DIR>/<key>/seg_00000.m4s ...
+    <REMUX_CACHE_DIR>/<key>/.complete
+
+The cache is bounded by REMUX_CACHE_BYTES: after each job the least
+recently played entries are evicted. REMUX_MAX_JOBS limits concurrent
+ffmpeg processes per worker. A job holds an flock() on its directory,
+so other workers serve its output instead of starting a second job.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+from core.config import (
+    FFMPEG_PATH,
+    FFPROBE_PATH,
+    REMUX_CACHE_BYTES,
+    REMUX_CACHE_DIR,
+    REMUX_MAX_JOBS,
+    REMUX_SEGMENT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+ENABLED = bool(REMUX_CACHE_DIR) and REMUX_MAX_JOBS > 0
+
+# Containers played directly by web clients
+WEB_READY_EXTENSIONS = {".mp4", ".m4v", ".webm"}
+
+# Audio codecs copied as-is; others are transcoded to AAC
+WEB_AUDIO_CODECS = {"aac", "mp3", "opus"}
+AUDIO_BITRATE = "192k"
+
+PLAYLIST = "index.m3u8"
+INIT_SEGMENT = "init.mp4"
+SEGMENT_PATTERN = re.compile(r"init\.mp4|seg_\d{5}\.m4s")
+
+COMPLETE_MARKER = ".complete"
+FAILED_MARKER = ".failed"
+LOCK_FILE = ".lock"
+
+# Failed files are retried after this many seconds (e.g. once ffmpeg is
+# installed)
+RETRY_SECONDS = 3600
+
+# Segment requests refresh an entry's access time at most this often
+TOUCH_SECONDS = 60
+
+_slots = threading.BoundedSemaphore(max(REMUX_MAX_JOBS, 1))
+
+# Jobs started by this process: {key: subprocess.Popen, or None while
+# the job is starting}
+_running = {}
+_running_lock = threading.Lock()
+
+
+class RemuxBusy(Exception):
+    """
+    All remux job slots of this worker are in use.
+    """
+
+
+class RemuxFailed(Exception):
+    """
+    ffmpeg could not remux the file.
+    """
+
+
+def needs_remux(path: str) -> bool:
+    """
+    Return True if a file is not web-ready and gets an HLS stream entry.
+    """
+    return ENABLED and Path(path).suffix.lower() not in WEB_READY_EXTENSIONS
+
+
+def job_dir(path: str, size: int) -> Path:
+    """
+    Return the cache directory of a file; a replaced file (new size)
+    gets a new directory.
+    """
+    key = hashlib.sha256(f"{path}\0{size}".encode()).hexdigest()[:24]
+    return Path(REMUX_CACHE_DIR) / key
+
+
+def is_complete(out: Path) -> bool:
+    return (out / COMPLETE_MARKER).exists()
+
+
+def touch(out: Path):
+    """
+    Mark a cache entry as played, so a file that is being watched is not
+    the least recently played one when evict() runs.
+    """
+    try:
+        if time.time() - out.stat().st_mtime >= TOUCH_SECONDS:
+            os.utime(out)
+    except FileNotFoundError:
+        pass
+
+
+def is_running(out: Path) -> bool:
+    """
+    Return True if any worker is still remuxing into out.
+    """
+    if out.name in _running:
+        return True
+
+    try:
+        with open(out / LOCK_FILE, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+    except BlockingIOError:
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _probe(path: str) -> dict:
+    """
+    Return {codec_type: codec_name} for the first video and audio streams.
+    """
+    result = subprocess.run(
+        [
+            FFPROBE_PATH, "-v", "error",
+            "-show_entries", "stream=codec_type,codec_name",
+            "-of", "json", path,
+        ],
+        capture_output=True,
+        check=True,
+        timeout=30,
+    )
+
+    codecs = {}
+    for stream in json.loads(result.stdout).get("streams", []):
+        codecs.setdefault(stream.get("codec_type"), stream.get("codec_name"))
+    return codecs
+
+
+def _command(path: str, out: Path, codecs: dict) -> list[str]:
+    command = [
+        FFMPEG_PATH, "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", path,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c:v", "copy",
+    ]
+
+    # Apple players and most TVs expect the hvc1 tag for HEVC in MP4
+    if codecs.get("video") == "hevc":
+        command += ["-tag:v", "hvc1"]
+
+    if codecs.get("audio") in WEB_AUDIO_CODECS:
+        command += ["-c:a", "copy"]
+    else:
+        command += ["-c:a", "aac", "-b:a", AUDIO_BITRATE, "-ac", "2"]
+
+    command += [
+        "-sn",
+        "-f", "hls",
+        "-hls_time", str(REMUX_SEGMENT_SECONDS),
+        "-hls_playlist_type", "event",
+        # Segments appear under their final name only once complete
+        "-hls_flags", "temp_file",
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", INIT_SEGMENT,
+        "-hls_segment_filename", str(out / "seg_%05d.m4s"),
+        str(out / PLAYLIST),
+    ]
+    return command
+
+
+def start_job(path: str, size: int) -> Path:
+    """
+    Make sure a remux of path is complete or in progress and return its
+    cache directory.
+
+    Raises RemuxBusy when a new job is needed but no slot is free, and
+    RemuxFailed when an earlier attempt failed.
+    """
+    out = job_dir(path, size)
+    out.mkdir(parents=True, exist_ok=True)
+
+    # Directory mtime is the last access time for eviction
+    os.utime(out)
+
+    if is_complete(out):
+        return out
+
+    try:
+        if time.time() - (out / FAILED_MARKER).stat().st_mtime < RETRY_SECONDS:
+            raise RemuxFailed(path)
+    except FileNotFoundError:
+        pass
+
+    with _running_lock:
+        if out.name in _running:
+            return out
+
+        lock_file = open(out / LOCK_FILE, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another worker is remuxing this file
+            lock_file.close()
+            return out
+
+        if not _slots.acquire(blocking=False):
+            lock_file.close()
+            raise RemuxBusy(path)
+
+        # Claim the job; ffprobe runs outside the lock, so requests for
+        # other files are not held up
+        _running[out.name] = None
+
+    try:
+        # Output of an interrupted job (e.g. a restarted worker)
+        for stale in out.iterdir():
+            if stale.name != LOCK_FILE:
+                stale.unlink()
+
+        codecs = _probe(path)
+        proc = subprocess.Popen(
+            _command(path, out, codecs),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        logger.warning("Remux could not start for %s: %s", path, e)
+        (out / FAILED_MARKER).touch()
+        with _running_lock:
+            _running.pop(out.name, None)
+        _slots.release()
+        lock_file.close()
+        raise RemuxFailed(path) from e
+
+    with _running_lock:
+        _running[out.name] = proc
+
+    logger.info("Remux started: %s", path, extra={"fields": {"codecs": codecs}})
+
+    threading.Thread(
+        target=_finish_job,
+        args=(path, out, proc, lock_file),
+        name="remux-wait",
+        daemon=True,
+    ).start()
+
+    return out
+
+
+def _finish_job(path: str, out: Path, proc, lock_file):
+    try:
+        _, stderr = proc.communicate()
+
+        if proc.returncode == 0:
+            (out / COMPLETE_MARKER).touch()
+            logger.info("Remux complete: %s", path)
+        else:
+            (out / FAILED_MARKER).touch()
+            logger.warning(
+                "Remux failed: %s",
+                path,
+                extra={
+                    "fields": {
+                        "returncode": proc.returncode,
+                        "stderr": stderr[-500:].decode(errors="replace"),
+                    }
+                },
+            )
+    finally:
+        with _running_lock:
+            _running.pop(out.name, None)
+        _slots.release()
+        lock_file.close()
+
+    evict()
+
+
+def _dir_size(path: Path) -> int:
+    return sum(entry.stat().st_size for entry in path.iterdir() if entry.is_file())
+
+
+def evict():
+    """
+    Remove the least recently played cache entries until the cache fits
+    REMUX_CACHE_BYTES. Entries with a running job are kept.
+    """
+    root = Path(REMUX_CACHE_DIR)
+
+    try:
+        entries = [(entry.stat().st_mtime, entry) for entry in root.iterdir() if entry.is_dir()]
+    except FileNotFoundError:
+        return
+
+    sizes = {entry: _dir_size(entry) for _, entry in entries}
+    total = sum(sizes.values())
+
+    for _, entry in sorted(entries):
+        if total <= REMUX_CACHE_BYTES:
+            break
+
+        if is_running(entry):
+            continue
+
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= sizes[entry]
+        logger.info(
+            "Evicted remux cache entry %s", entry.name, extra={"fields": {"bytes": sizes[entry]}}
+        )
@@ -0,0 +1,400 @@
+"""
+Request and scan tracing.
+
+Lightweight spans for finding where time goes: a trace is started per
+HTTP request (TraceMiddleware, sampled at TRACE_SAMPLE_RATE) and per
+scan, ingestion or agent manifest (always sampled). Inside a trace,
+`span()` and `@traced()` record nested spans, e.g. around DB queries
+(db.connection), TMDB calls, stream building and scanner phases.
+
+Finished spans are queued and written by a background thread, either as
+JSON lines to a file or to an OTLP/HTTP collector (see TRACE_EXPORT), so
+request threads never wait on the exporter. If the queue is full, spans
+are dropped rather than slowing requests down.
+
+When tracing is off, `@traced()` returns the function unchanged and
+`span()` returns a shared no-op context manager; outside a sampled trace
+it costs a single context variable lookup.
+"""
+
+import atexit
+from contextlib import nullcontext
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+from core.config import TRACE_EXPORT, TRACE_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+ENABLED = bool(TRACE_EXPORT)
+
+SERVICE_NAME = "remote-files"
+
+# Spans written per export batch, and the longest a span waits for one
+BATCH_SIZE = 512
+BATCH_INTERVAL = 1.0
+
+# Finished spans waiting for export; further spans are dropped
+QUEUE_SIZE = 10000
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+
+_NOOP = nullcontext()
+
+# Innermost open span of the current thread / task
+_current = contextvars.ContextVar("trace_span", default=None)
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_exporter = None
+_exporter_lock = threading.Lock()
+_dropped = 0
+
+
+class Span:
+    """
+    One timed operation. Use as a context manager; see span() and
+    start_trace().
+    """
+
+    __slots__ = (
+        "name", "kind", "trace_id", "span_id", "parent_id",
+        "start_ns", "end_ns", "attributes", "error", "_token",
+    )
+
+    def __init__(self, name: str, parent=None, kind: int = KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes or {}
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error = None
+        self._token = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current.reset(self._token)
+
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+
+        _export(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation API
+# ---------------------------------------------------------------------------
+
+def start_trace(name: str, sampled: bool | None = None, kind: int = KIND_INTERNAL, **attributes):
+    """
+    Start a new trace (root span) for a unit of work.
+
+    sampled None samples at TRACE_SAMPLE_RATE; True always records (for
+    rare, expensive work such as scans). Unsampled traces record nothing,
+    including their nested spans.
+    """
+    if not ENABLED:
+        return _NOOP
+
+    if sampled is None:
+        sampled = random.random() < TRACE_SAMPLE_RATE
+
+    if not sampled:
+        # Hide any enclosing trace from nested spans
+        return _Unsampled()
+
+    return Span(name, kind=kind, attributes=attributes)
+
+
+def span(name: str, **attributes):
+    """
+    Record a nested span if the current trace is sampled.
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+
+    return Span(name, parent=parent, attributes=attributes)
+
+
+def traced(name: str | None = None, root: bool = False):
+    """
+    Decorator recording a span for each call of a function.
+
+    With root=True the call starts its own (always sampled) trace when it
+    is not already part of one, e.g. for scans started outside requests.
+    Coroutine functions are supported. Returns the function unchanged
+    when tracing is off.
+    """
+
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        span_name = name or func.__qualname__
+
+        def context():
+            if root and _current.get() is None:
+                return start_trace(span_name, sampled=True)
+            return span(span_name)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with context():
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with context():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class _Unsampled:
+    """
+    Context of an unsampled trace: nested spans are not recorded.
+    """
+
+    __slots__ = ("_token",)
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        self._token = _current.set(None)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+# ---------------------------------------------------------------------------
+# HTTP middleware
+# ---------------------------------------------------------------------------
+
+class TraceMiddleware:
+    """
+    ASGI middleware starting a sampled trace for each HTTP request.
+
+    Spans are named after the route template (e.g.
+    `GET /external/stream/movie/{imdb_id}.json`) so IDs don't end up in
+    span names; query strings (stream tokens) are never recorded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Renamed after routing; unmatched requests keep the bare method
+        context = start_trace(
+            scope["method"], kind=KIND_SERVER, **{"http.target": scope["path"]}
+        )
+        if not isinstance(context, Span):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            await send(message)
+
+            if message["type"] == "http.response.start":
+                context.set("http.status_code", message["status"])
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                # Background tasks (e.g. next-episode prefetch) run after
+                # this point and are part of the span, but not of the
+                # response time
+                context.set("response_ms", round((time.time_ns() - context.start_ns) / 1e6, 3))
+
+        with context:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                path = getattr(route, "path", None)
+                if path:
+                    context.name = f"{scope['method']} {path}"
+                    context.set("http.route", path)
+                context.set("http.method", scope["method"])
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def _export(finished: Span):
+    global _dropped
+
+    _ensure_exporter()
+
+    try:
+        _queue.put_nowait(finished)
+    except queue.Full:
+        _dropped += 1
+
+
+def _ensure_exporter():
+    global _exporter
+
+    if _exporter is not None:
+        return
+
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = threading.Thread(target=_export_loop, name="trace-export", daemon=True)
+            _exporter.start()
+            atexit.register(_shutdown)
+
+
+def _shutdown():
+    # Flush what is queued, then stop the export thread
+    _queue.put(None)
+    _exporter.join(timeout=5)
+
+
+def _export_loop():
+    global _dropped
+
+    write = _post_otlp if TRACE_EXPORT.startswith(("http://", "https://")) else _write_file
+    stopping = False
+
+    while not stopping:
+        batch = []
+        deadline = time.monotonic() + BATCH_INTERVAL
+
+        while len(batch) < BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+
+            try:
+                item = _queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            if item is None:
+                stopping = True
+                break
+
+            batch.append(item)
+
+        if not batch:
+            continue
+
+        try:
+            write(batch)
+        except (OSError, ValueError) as e:
+            logger.warning("Trace export failed: %s", e, extra={"fields": {"spans": len(batch)}})
+
+        if _dropped:
+            logger.warning("Dropped %s span(s): export queue full", _dropped)
+            _dropped = 0
+
+
+def _write_file(batch):
+    with open(TRACE_EXPORT, "a", encoding="utf-8") as f:
+        for finished in batch:
+            f.write(json.dumps(finished.to_dict(), default=str) + "\n")
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict):
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+
+def _otlp_span(finished: Span) -> dict:
+    entry = {
+        "traceId": finished.trace_id,
+        "spanId": finished.span_id,
+        "name": finished.name,
+        "kind": finished.kind,
+        "startTimeUnixNano": str(finished.start_ns),
+        "endTimeUnixNano": str(finished.end_ns),
+        "attributes": _otlp_attributes(finished.attributes),
+    }
+
+    if finished.parent_id:
+        entry["parentSpanId"] = finished.parent_id
+
+    if finished.error:
+        entry["status"] = {"code": 2, "message": finished.error}
+
+    return entry
+
+
+def _post_otlp(batch):
+    payload = {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [
+                    {
+                        "scope": {"name": __name__},
+                        "spans": [_otlp_span(finished) for finished in batch],
+                    }
+                ],
+            }
+        ]
+    }
+
+    request = urllib.request.Request(
+        TRACE_EXPORT,
+        data=json.dumps(payload).encode(),
+        method="POST",
+        headers={"Content-Type": "application/json"},
+    )
+
+    with urllib.request.urlopen(request, timeout=10) as resp:
+        resp.read()
@@ -0,0 +1,37 @@
+"""
+Scan agent repository helpers.
+
+Tracks the version of the last manifest accepted from the storage-side
+scan agent, per library (see scanner.manifest).
+"""
+
+
+def get_manifest_version(conn, library):
+    """
+    Return the version of the last accepted manifest, or 0.
+    """
+    row = conn.execute(
+        "SELECT version FROM agent_manifests WHERE library = ?",
+        (library,),
+    ).fetchone()
+
+    return row[0] if row else 0
+
+
+def set_manifest_version(conn, library, version):
+    conn.execute(
+        """
+        INSERT INTO agent_manifests (library, version)
+        VALUES (?, ?)
+        ON CONFLICT(library) DO UPDATE SET version = excluded.version
+        """,
+        (library, version),
+    )
+
+
+def reset_manifest_versions(conn):
+    """
+    Forget all manifest versions, so agents resend full manifests
+    (e.g. after the library tables were cleared).
+    """
+    conn.execute("DELETE FROM agent_manifests")
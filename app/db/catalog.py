@@ -3,44 +3,110 @@ Catalog query helpers.
 
 This module provides database access functions for building Stremio
 catalog responses for movies and series.
+
+Besides the alphabetical catalogs, SORTED_CATALOGS are returned in pages
+of PAGE_SIZE. Each is read from a covering index (see schema.sql), so a
+page costs an index range scan regardless of the library size.
 """
 
 import json
 
+from metadata.posters import local_poster_url
 
-def get_movie_catalog(conn):
-    """
-    Return the movie catalog for Stremio.
 
-    Expects an open SQLite connection and returns a list of catalog
-    entries sorted by title.
-    """
-    rows = conn.execute(
+def _poster(imdb_id: str, poster_url: str | None, poster_base_url: str | None):
+    # Cached posters are served by the addon itself (see metadata.posters)
+    if poster_base_url:
+        return local_poster_url(poster_base_url, imdb_id) or poster_url
+    return poster_url
+
+
+# Items per page of a sorted catalog (Stremio requests the next page
+# with skip=<items so far>)
+PAGE_SIZE = 100
+
+# (catalog_type, catalog_id) -> (name, query). Each ORDER BY matches the
+# column order of its covering index; titles break ties so pages are
+# stable. Rows without a timestamp or year are listed last.
+SORTED_CATALOGS = {
+    ("movie", "recent"): (
+        "Recently added",
         """
         SELECT imdb_id, title, poster_url, genres
         FROM movies
-        ORDER BY title
+        ORDER BY added_at DESC, title, imdb_id
+        LIMIT ? OFFSET ?
+        """,
+    ),
+    ("movie", "by-year"): (
+        "By year",
         """
-    ).fetchall()
+        SELECT imdb_id, title, poster_url, genres
+        FROM movies
+        ORDER BY year DESC, title, imdb_id
+        LIMIT ? OFFSET ?
+        """,
+    ),
+    ("series", "recent"): (
+        "Recently added",
+        """
+        SELECT imdb_id, title, poster_url, genres
+        FROM series
+        ORDER BY added_at DESC, title, imdb_id
+        LIMIT ? OFFSET ?
+        """,
+    ),
+    ("series", "new-episodes"): (
+        "New episodes",
+        """
+        SELECT imdb_id, title, poster_url, genres
+        FROM series
+        ORDER BY episode_added_at DESC, title, imdb_id
+        LIMIT ? OFFSET ?
+        """,
+    ),
+}
+
 
+def _metas(rows, catalog_type: str, poster_base_url: str | None):
     return [
         {
             "id": row[0],
-            "type": "movie",
+            "type": catalog_type,
             "name": row[1],
-            "poster": row[2],
+            "poster": _poster(row[0], row[2], poster_base_url),
             "genres": json.loads(row[3]) if row[3] else [],
         }
         for row in rows
     ]
 
 
-def get_series_catalog(conn):
+def get_movie_catalog(conn, poster_base_url: str | None = None):
+    """
+    Return the movie catalog for Stremio.
+
+    Expects an open SQLite connection and returns a list of catalog
+    entries sorted by title. With poster_base_url, cached posters point
+    at the local poster cache under that URL.
+    """
+    rows = conn.execute(
+        """
+        SELECT imdb_id, title, poster_url, genres
+        FROM movies
+        ORDER BY title
+        """
+    ).fetchall()
+
+    return _metas(rows, "movie", poster_base_url)
+
+
+def get_series_catalog(conn, poster_base_url: str | None = None):
     """
     Return the series catalog for Stremio.
 
     Expects an open SQLite connection and returns a list of catalog
-    entries sorted by title.
+    entries sorted by title. With poster_base_url, cached posters point
+    at the local poster cache under that URL.
     """
     rows = conn.execute(
         """
@@ -50,13 +116,35 @@ def get_series_catalog(conn):
         """
     ).fetchall()
 
-    return [
-        {
-            "id": row[0],
-            "type": "series",
-            "name": row[1],
-            "poster": row[2],
-            "genres": json.loads(row[3]) if row[3] else [],
-        }
-        for row in rows
-    ]
+    return _metas(rows, "series", poster_base_url)
+
+
+def get_sorted_catalog(
+    conn,
+    catalog_type: str,
+    catalog_id: str,
+    skip: int = 0,
+    poster_base_url: str | None = None,
+):
+    """
+    Return one page of a sorted catalog (see SORTED_CATALOGS).
+
+    skip is the number of items already shown. Returns None for an
+    unknown catalog and an empty list past the last page.
+    """
+    catalog = SORTED_CATALOGS.get((catalog_type, catalog_id))
+    if catalog is None:
+        return None
+
+    rows = conn.execute(catalog[1], (PAGE_SIZE, max(skip, 0))).fetchall()
+    return _metas(rows, catalog_type, poster_base_url)
+
+
+def get_sorted_catalog_ids(conn, catalog_type: str, catalog_id: str):
+    """
+    Return the IMDb IDs of a whole sorted catalog, in catalog order.
+    """
+    query = SORTED_CATALOGS[(catalog_type, catalog_id)][1]
+
+    # LIMIT -1: no limit
+    return [row[0] for row in conn.execute(query, (-1, 0))]
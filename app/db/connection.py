@@ -0,0 +1,57 @@
+"""
+SQLite connection helper.
+
+Every connection to the library database is opened here so per-connection
+settings are applied consistently:
+- Foreign keys are enforced (SQLite leaves them off by default)
+- Writers wait for the lock instead of failing immediately, since scans,
+  ingestion and several uvicorn workers share one database file
+- With tracing on, statements run through Connection.execute* are
+  recorded as `db.query` spans (see core.tracing)
+"""
+
+import sqlite3
+
+from core import tracing
+from core.config import DB_PATH
+
+# Seconds to wait for a locked database before raising
+BUSY_TIMEOUT = 30
+
+# Longest SQL text recorded on a span
+TRACE_STATEMENT_LENGTH = 200
+
+
+def _statement(sql: str) -> str:
+    return " ".join(sql.split())[:TRACE_STATEMENT_LENGTH]
+
+
+class TracedConnection(sqlite3.Connection):
+    """
+    Connection recording a span per statement.
+
+    For queries the span covers execution up to the first row; rows
+    fetched later are not included.
+    """
+
+    def execute(self, sql, *args):
+        with tracing.span("db.query", statement=_statement(sql)):
+            return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        with tracing.span("db.query", statement=_statement(sql), many=True):
+            return super().executemany(sql, *args)
+
+    def executescript(self, sql):
+        with tracing.span("db.script"):
+            return super().executescript(sql)
+
+
+def connect(path: str = DB_PATH):
+    """
+    Open a connection to the library database.
+    """
+    factory = TracedConnection if tracing.ENABLED else sqlite3.Connection
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, factory=factory)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
@@ -0,0 +1,157 @@
+"""
+Media file database repository helpers.
+
+This module contains write helpers that operate on file records
+regardless of whether they belong to a movie or an episode.
+"""
+
+import os
+
+
+def get_file(conn, path):
+    """
+    Return (id, movie_imdb_id, episode_id) for the file at path, or None.
+    """
+    return conn.execute(
+        """
+        SELECT id, movie_imdb_id, episode_id
+        FROM files
+        WHERE path = ?
+        """,
+        (path,),
+    ).fetchone()
+
+
+def find_moved_file(conn, inode, size, dev=None):
+    """
+    Find a file record that was renamed or moved on disk.
+
+    Matches records with the same inode, size and device whose stored
+    path no longer exists. Inode numbers are only unique per device, so
+    files from other folders (disks, shares) never match. Agent manifests
+    have no device (None) and only match each other. Records whose path
+    still exists are hard links or copies and are left alone.
+
+    Returns (id, path, movie_imdb_id, series_imdb_id) or None.
+    """
+    rows = conn.execute(
+        """
+        SELECT f.id, f.path, f.movie_imdb_id, e.series_imdb_id
+        FROM files f
+        LEFT JOIN episodes e ON e.id = f.episode_id
+        WHERE f.inode = ? AND f.size = ? AND f.dev IS ?
+        """,
+        (inode, size, dev),
+    ).fetchall()
+
+    for row in rows:
+        if not os.path.exists(row[1]):
+            return row
+
+    return None
+
+
+def move_file(conn, file_id, new_path):
+    """
+    Point an existing file record at its new path, keeping its metadata.
+    """
+    conn.execute(
+        "UPDATE files SET path = ? WHERE id = ?",
+        (new_path, file_id),
+    )
+
+
+def series_for_folder(conn, series_dir):
+    """
+    Return the series IMDb ID already associated with files in a series
+    folder, or None if no file below it is indexed.
+    """
+    prefix = series_dir.rstrip("/") + "/"
+
+    row = conn.execute(
+        """
+        SELECT e.series_imdb_id
+        FROM files f
+        JOIN episodes e ON e.id = f.episode_id
+        WHERE substr(f.path, 1, ?) = ?
+        LIMIT 1
+        """,
+        (len(prefix), prefix),
+    ).fetchone()
+
+    return row[0] if row else None
+
+
+def delete_files_under(conn, path):
+    """
+    Delete the file record at path and any records below it.
+
+    Path may be a single media file or a directory (e.g. a series folder).
+    Returns the number of deleted records.
+    """
+    prefix = path.rstrip("/") + "/"
+
+    cur = conn.execute(
+        """
+        DELETE FROM files
+        WHERE path = ?
+           OR substr(path, 1, ?) = ?
+        """,
+        (path, len(prefix), prefix),
+    )
+
+    return cur.rowcount
+
+
+def prune_files_under(conn, path, seen_paths, column):
+    """
+    Delete file records below path that were not seen during a scan.
+
+    Only records with a non-NULL `column` (movie_imdb_id or episode_id)
+    are considered, so movie and series scans never prune each other.
+    Seen paths are staged in a temporary table, which avoids SQLite's
+    bound-parameter limit on large libraries.
+
+    Returns the number of deleted records.
+    """
+    prefix = path.rstrip("/") + "/"
+
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen_paths (path TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM seen_paths")
+    conn.executemany(
+        "INSERT OR IGNORE INTO seen_paths (path) VALUES (?)",
+        ((p,) for p in seen_paths),
+    )
+
+    cur = conn.execute(
+        f"""
+        DELETE FROM files
+        WHERE {column} IS NOT NULL
+          AND (path = ? OR substr(path, 1, ?) = ?)
+          AND path NOT IN (SELECT path FROM seen_paths)
+        """,
+        (path, len(prefix), prefix),
+    )
+
+    conn.execute("DELETE FROM seen_paths")
+
+    return cur.rowcount
+
+
+def get_paths_under(conn, path, column):
+    """
+    Return the paths of all file records below path with a non-NULL
+    `column` (movie_imdb_id or episode_id).
+    """
+    prefix = path.rstrip("/") + "/"
+
+    rows = conn.execute(
+        f"""
+        SELECT path FROM files
+        WHERE {column} IS NOT NULL
+          AND (path = ? OR substr(path, 1, ?) = ?)
+        """,
+        (path, len(prefix), prefix),
+    ).fetchall()
+
+    return [row[0] for row in rows]
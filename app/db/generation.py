@@ -0,0 +1,31 @@
+"""
+Library generation counter helpers.
+
+The generation is a single integer stored in the database and bumped
+whenever a scan commits changes. Each uvicorn worker keeps its own
+in-memory caches; comparing the cached generation with the stored one
+is how a worker notices that another process rebuilt the library.
+"""
+
+
+def get_generation(conn):
+    """
+    Return the current library generation.
+    """
+    row = conn.execute(
+        "SELECT generation FROM library_state WHERE id = 1"
+    ).fetchone()
+
+    return row[0] if row else 0
+
+
+def bump_generation(conn):
+    """
+    Increment the library generation.
+
+    Must be called inside the transaction that changes library data so
+    readers never observe new data with an old generation.
+    """
+    conn.execute(
+        "UPDATE library_state SET generation = generation + 1 WHERE id = 1"
+    )
@@ -2,14 +2,53 @@
 import sqlite3
 from pathlib import Path
 
-DB_PATH = "/data/library.db"
+from core.config import DB_PATH
+from .connection import BUSY_TIMEOUT
+from .migrations import SCHEMA_VERSION, get_version, migrate
+
 SCHEMA_PATH = Path(__file__).with_name("schema.sql")
 
+
+def is_empty(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'movies'"
+    ).fetchone()
+
+    return row is None
+
+
+def create_schema(conn):
+    with open(SCHEMA_PATH, "r") as f:
+        schema = f.read()
+
+    # One transaction, so a concurrent worker either sees no schema or
+    # the complete schema with its version
+    conn.executescript(
+        f"BEGIN IMMEDIATE;\n{schema}\nPRAGMA user_version = {SCHEMA_VERSION};\nCOMMIT;"
+    )
+
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    # Several uvicorn workers may run this concurrently; wait for the
+    # write lock instead of failing immediately.
+    # Foreign keys stay off here (plain connection): migrations may need
+    # to delete rows that violate them.
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT)
     try:
-        with open(SCHEMA_PATH, "r") as f:
-            conn.executescript(f.read())
-        conn.commit()
+        new = is_empty(conn) and get_version(conn) == 0
+
+        # Incremental auto-vacuum can only be enabled before anything is
+        # written, even the WAL switch (existing databases are converted
+        # by db.maintenance)
+        if new:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+        # WAL lets workers keep reading while a scan is writing
+        conn.execute("PRAGMA journal_mode=WAL")
+
+        if new:
+            create_schema(conn)
+        else:
+            migrate(conn)
     finally:
         conn.close()
@@ -0,0 +1,163 @@
+"""
+Database maintenance.
+
+Runs after every scan (and on demand via POST /admin/maintenance):
+1) Orphan cleanup: movies without files, episodes without files and
+   series without episodes are removed, so deleted titles leave the
+   catalogs; series that lost their newest episode move down in "New
+   episodes"
+2) Query planner statistics: `PRAGMA optimize` (full ANALYZE after
+   rebuilds or when requested)
+3) Space reclaim: `PRAGMA incremental_vacuum` returns free pages to the
+   filesystem; databases created before incremental auto-vacuum are
+   converted once with a full VACUUM
+4) WAL checkpoint: folds the write-ahead log back into the database and
+   truncates it
+
+Returns a report with database size and fragmentation (share of free
+pages) before and after.
+"""
+
+from collections import Counter
+import logging
+import os
+import time
+
+from core.config import DB_PATH
+from core.log import log_summary
+from core.tracing import traced
+from .connection import connect
+from .generation import bump_generation
+from .series_repo import refresh_episode_added
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA auto_vacuum values
+AUTO_VACUUM_NONE = 0
+
+# Deletion order matters: episodes first, so their series become orphans
+ORPHAN_CLEANUP = [
+    (
+        "episodes",
+        """
+        DELETE FROM episodes
+        WHERE NOT EXISTS (SELECT 1 FROM files WHERE files.episode_id = episodes.id)
+        """,
+    ),
+    (
+        "series",
+        """
+        DELETE FROM series
+        WHERE NOT EXISTS (SELECT 1 FROM episodes WHERE episodes.series_imdb_id = series.imdb_id)
+        """,
+    ),
+    (
+        "movies",
+        """
+        DELETE FROM movies
+        WHERE NOT EXISTS (SELECT 1 FROM files WHERE files.movie_imdb_id = movies.imdb_id)
+        """,
+    ),
+]
+
+
+def db_report(conn):
+    """
+    Return size and fragmentation figures for the database.
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    wal_path = f"{DB_PATH}-wal"
+    wal_bytes = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+    return {
+        "size_bytes": page_size * page_count,
+        "free_bytes": page_size * freelist_count,
+        "wal_bytes": wal_bytes,
+        "fragmentation": round(freelist_count / page_count, 4) if page_count else 0.0,
+    }
+
+
+def cleanup_orphans(conn):
+    """
+    Delete library rows no longer backed by any file.
+
+    Returns a Counter of deleted rows per table.
+    """
+    removed = Counter()
+
+    for table, sql in ORPHAN_CLEANUP:
+        count = conn.execute(sql).rowcount
+        if count:
+            removed[f"orphan_{table}"] = count
+
+    # After orphan episodes are gone
+    refreshed = refresh_episode_added(conn)
+    if refreshed:
+        removed["episode_added_refreshed"] = refreshed
+
+    # Deleted titles disappear from catalogs: invalidate worker caches
+    if removed:
+        bump_generation(conn)
+
+    conn.commit()
+    return removed
+
+
+@traced("db.maintenance")
+def run_maintenance(analyze: bool = False) -> dict:
+    """
+    Run all maintenance steps and return a report.
+
+    Callers must hold the scan lock (see scanner.leader) so maintenance
+    never overlaps a scan.
+    """
+    started = time.monotonic()
+
+    conn = connect()
+    try:
+        before = db_report(conn)
+        counts = cleanup_orphans(conn)
+
+        if analyze:
+            conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_NONE:
+            logger.info("Enabling incremental auto-vacuum (one-time VACUUM)")
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            # Runs one step per freed page; consume all rows to finish
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+
+        # (busy, wal pages, checkpointed pages); busy when readers
+        # still use the WAL, which the next run picks up
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+
+        after = db_report(conn)
+    finally:
+        conn.close()
+
+    report = {
+        **counts,
+        "checkpoint_busy": bool(busy),
+        "before": before,
+        "after": after,
+    }
+
+    log_summary(
+        logger,
+        "Database maintenance complete",
+        counts,
+        started,
+        size_bytes=after["size_bytes"],
+        reclaimed_bytes=before["size_bytes"] - after["size_bytes"],
+        fragmentation=after["fragmentation"],
+        wal_bytes=after["wal_bytes"],
+        checkpoint_busy=bool(busy),
+    )
+
+    return report
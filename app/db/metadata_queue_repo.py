@@ -0,0 +1,218 @@
+"""
+Metadata retry queue repository helpers.
+
+Movie files and series folders whose TMDB lookup failed because TMDB
+could not answer are queued here (see scanner.resolve). Each row keeps
+what indexing the entry needs once it is resolved: the parsed title,
+local IDs and its media files, so retries need neither the filesystem
+nor the scan agent.
+
+files is a JSON-encoded list of dicts with path, resolution, size,
+inode, dev and mtime, plus season, file_season and episode for
+episodes.
+"""
+
+import json
+import time
+
+from core.config import METADATA_RETRY_MAX_SECONDS, METADATA_RETRY_SECONDS
+
+
+def retry_delay(attempts: int) -> int:
+    """
+    Return the seconds to wait before the retry following `attempts`
+    failed attempts (retry_due_later computes the same in SQL).
+    """
+    return min(METADATA_RETRY_SECONDS * 2 ** min(attempts, 32), METADATA_RETRY_MAX_SECONDS)
+
+
+def defer_lookup(conn, library, path, title, year, ids, files, error):
+    """
+    Queue a movie file or series folder for a metadata retry.
+
+    An entry that is already queued gets the new title, IDs and files
+    but keeps its retry schedule.
+    """
+    now = int(time.time())
+
+    conn.execute(
+        """
+        INSERT INTO metadata_queue
+        (path, library, title, year, imdb_id, tmdb_id, files,
+         attempts, next_attempt_at, last_error, queued_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET
+          title = excluded.title,
+          year = excluded.year,
+          imdb_id = excluded.imdb_id,
+          tmdb_id = excluded.tmdb_id,
+          files = excluded.files
+        """,
+        (
+            path,
+            library,
+            title,
+            year,
+            ids["imdb_id"],
+            ids["tmdb_id"],
+            json.dumps(files),
+            now + retry_delay(0),
+            error,
+            now,
+        ),
+    )
+
+
+def get_deferred(conn, path):
+    """
+    Return the queued files of a movie file or series folder, or None if
+    it is not queued.
+    """
+    row = conn.execute(
+        "SELECT files FROM metadata_queue WHERE path = ?",
+        (path,),
+    ).fetchone()
+
+    return json.loads(row[0]) if row else None
+
+
+def due_lookups(conn, now, limit=100):
+    """
+    Return the entries due for a retry, oldest schedule first, as dicts.
+    """
+    rows = conn.execute(
+        """
+        SELECT path, library, title, year, imdb_id, tmdb_id, files, attempts
+        FROM metadata_queue
+        WHERE next_attempt_at <= ?
+        ORDER BY next_attempt_at
+        LIMIT ?
+        """,
+        (now, limit),
+    ).fetchall()
+
+    return [
+        {
+            "path": path,
+            "library": library,
+            "title": title,
+            "year": year,
+            "ids": {"imdb_id": imdb_id, "tmdb_id": tmdb_id},
+            "files": json.loads(files),
+            "attempts": attempts,
+        }
+        for path, library, title, year, imdb_id, tmdb_id, files, attempts in rows
+    ]
+
+
+def next_retry_at(conn):
+    """
+    Return when the next entry is due (unix seconds), or None if the
+    queue is empty.
+    """
+    return conn.execute("SELECT MIN(next_attempt_at) FROM metadata_queue").fetchone()[0]
+
+
+def retry_due_later(conn, now, error):
+    """
+    Record a failed attempt for every due entry and schedule each one's
+    next attempt with exponential backoff (see retry_delay).
+
+    TMDB being unavailable is not specific to one title: retrying only
+    the failed entry would leave the others due, and TMDB would be
+    contacted on every poll for the whole outage. Returns the number of
+    rescheduled entries.
+    """
+    cur = conn.execute(
+        """
+        UPDATE metadata_queue
+        SET attempts = attempts + 1,
+            next_attempt_at = :now + MIN(:delay * (1 << MIN(attempts + 1, 32)), :max_delay),
+            last_error = :error
+        WHERE next_attempt_at <= :now
+        """,
+        {
+            "now": now,
+            "delay": METADATA_RETRY_SECONDS,
+            "max_delay": METADATA_RETRY_MAX_SECONDS,
+            "error": error,
+        },
+    )
+    return cur.rowcount
+
+
+def retry_now(conn):
+    """
+    Make every queued entry due immediately. Returns the number of
+    entries.
+    """
+    cur = conn.execute("UPDATE metadata_queue SET next_attempt_at = ?", (int(time.time()),))
+    return cur.rowcount
+
+
+def remove_deferred(conn, path):
+    conn.execute("DELETE FROM metadata_queue WHERE path = ?", (path,))
+
+
+def delete_deferred_under(conn, path):
+    """
+    Remove the queued entry at path and any entries below it.
+
+    Returns the number of removed entries.
+    """
+    prefix = path.rstrip("/") + "/"
+
+    cur = conn.execute(
+        """
+        DELETE FROM metadata_queue
+        WHERE path = ?
+           OR substr(path, 1, ?) = ?
+        """,
+        (path, len(prefix), prefix),
+    )
+
+    return cur.rowcount
+
+
+def clear_deferred(conn):
+    """
+    Empty the queue (e.g. after the library tables were cleared).
+    """
+    conn.execute("DELETE FROM metadata_queue")
+
+
+def get_deferred_entries(conn, limit=100):
+    """
+    Return queued entries for the admin API, next retry first.
+    """
+    rows = conn.execute(
+        """
+        SELECT path, library, title, attempts, next_attempt_at, last_error, queued_at
+        FROM metadata_queue
+        ORDER BY next_attempt_at
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+
+    return [
+        {
+            "path": path,
+            "library": library,
+            "title": title,
+            "attempts": attempts,
+            "next_attempt_at": next_attempt_at,
+            "last_error": last_error,
+            "queued_at": queued_at,
+        }
+        for path, library, title, attempts, next_attempt_at, last_error, queued_at in rows
+    ]
+
+
+def count_deferred(conn):
+    """
+    Return {library: queued entries}.
+    """
+    return dict(
+        conn.execute("SELECT library, COUNT(*) FROM metadata_queue GROUP BY library").fetchall()
+    )
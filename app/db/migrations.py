@@ -0,0 +1,238 @@
+"""
+Versioned schema migrations.
+
+schema.sql always describes the latest schema and is used as-is for new
+databases. Existing databases are brought up to date by the migrations
+below, tracked in `PRAGMA user_version`:
+
+    user_version 0  ->  release 1.3.0 schema (or an empty database)
+    user_version N  ->  MIGRATIONS[:N] applied
+
+Rules for new migrations:
+- Append only; never edit or reorder a released migration
+- Update schema.sql to match the result, so new and migrated databases
+  are identical
+- Use conn.execute() only; each migration runs in its own transaction
+  together with the user_version bump
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def add_rename_detection_and_generation(conn):
+    """
+    files.inode for rename/move detection, library_state for cache
+    invalidation across workers.
+    """
+    # Development builds may already have the column
+    if "inode" not in _columns(conn, "files"):
+        conn.execute("ALTER TABLE files ADD COLUMN inode INTEGER")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_files_inode ON files(inode, size)")
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS library_state (
+          id INTEGER PRIMARY KEY CHECK (id = 1),
+          generation INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO library_state (id, generation) VALUES (1, 0)")
+
+
+def remove_foreign_key_violations(conn):
+    """
+    Delete rows that reference missing parents, so foreign keys can be
+    enforced from now on.
+    """
+    # Children first: deleting an episode may orphan its files
+    for table in ("episodes", "files"):
+        violations = conn.execute(f"PRAGMA foreign_key_check({table})").fetchall()
+        for _, rowid, _, _ in violations:
+            conn.execute(f"DELETE FROM {table} WHERE rowid = ?", (rowid,))
+
+        if violations:
+            logger.warning("Removed %s %s row(s) with missing parents", len(violations), table)
+
+
+def add_agent_manifests(conn):
+    """
+    Manifest versions of the storage-side scan agent.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS agent_manifests (
+          library TEXT PRIMARY KEY,
+          version INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def add_added_at(conn):
+    """
+    added_at timestamps and covering indexes for the sorted catalogs.
+
+    Existing rows start as NULL (listed last) and are filled in from
+    file mtimes by the next scan.
+    """
+    for table, columns in (
+        ("movies", ("added_at",)),
+        ("series", ("added_at", "episode_added_at")),
+        ("episodes", ("added_at",)),
+    ):
+        existing = _columns(conn, table)
+        for column in columns:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_movies_added
+          ON movies(added_at DESC, title, imdb_id, poster_url, genres)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_movies_year
+          ON movies(year DESC, title, imdb_id, poster_url, genres)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_series_added
+          ON series(added_at DESC, title, imdb_id, poster_url, genres)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_series_episode_added
+          ON series(episode_added_at DESC, title, imdb_id, poster_url, genres)
+        """
+    )
+
+
+def add_scan_cursors(conn):
+    """
+    scan_cursors for checkpointed, resumable library scans.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scan_cursors (
+          library TEXT PRIMARY KEY,
+          scope TEXT NOT NULL,
+          cursor TEXT NOT NULL,
+          started_at INTEGER NOT NULL,
+          updated_at INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def add_scan_cursor_roots(conn):
+    """
+    One scan cursor per library folder (MOVIES_ROOTS / SERIES_ROOTS)
+    instead of one per library. Cursors are kept.
+    """
+    conn.execute("ALTER TABLE scan_cursors RENAME TO scan_cursors_old")
+    conn.execute(
+        """
+        CREATE TABLE scan_cursors (
+          library TEXT NOT NULL,
+          scope TEXT NOT NULL,
+          cursor TEXT NOT NULL,
+          started_at INTEGER NOT NULL,
+          updated_at INTEGER NOT NULL,
+          PRIMARY KEY (library, scope)
+        )
+        """
+    )
+    conn.execute("INSERT INTO scan_cursors SELECT * FROM scan_cursors_old")
+    conn.execute("DROP TABLE scan_cursors_old")
+
+
+def add_metadata_queue(conn):
+    """
+    metadata_queue for deferred TMDB lookups.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS metadata_queue (
+          path TEXT PRIMARY KEY,
+          library TEXT NOT NULL,
+          title TEXT NOT NULL,
+          year INTEGER,
+          imdb_id TEXT,
+          tmdb_id INTEGER,
+          files TEXT NOT NULL,
+          attempts INTEGER NOT NULL DEFAULT 0,
+          next_attempt_at INTEGER NOT NULL,
+          last_error TEXT,
+          queued_at INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_metadata_queue_due
+          ON metadata_queue(next_attempt_at)
+        """
+    )
+
+
+def add_file_devices(conn):
+    """
+    files.dev, so rename detection only matches inodes of the same
+    device. Existing rows get theirs from the next scan.
+    """
+    if "dev" not in _columns(conn, "files"):
+        conn.execute("ALTER TABLE files ADD COLUMN dev INTEGER")
+
+
+MIGRATIONS = [
+    add_rename_detection_and_generation,
+    remove_foreign_key_violations,
+    add_agent_manifests,
+    add_added_at,
+    add_scan_cursors,
+    add_scan_cursor_roots,
+    add_metadata_queue,
+    add_file_devices,
+]
+
+# Version of a database created from schema.sql
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Apply all pending migrations, one transaction each.
+
+    Safe to run from several processes at once: the version is re-read
+    after taking the write lock, so each migration is applied only once.
+    """
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if get_version(conn) >= version:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_version(conn) < version:
+                logger.info("Applying migration %s: %s", version, migration.__name__)
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
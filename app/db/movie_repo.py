@@ -6,6 +6,7 @@ associated media files stored in the SQLite database.
 """
 
 import json
+import time
 
 
 def upsert_movie(conn, movie):
@@ -30,7 +31,21 @@ def upsert_movie(conn, movie):
     )
 
 
-def upsert_movie_file(conn, imdb_id, path, resolution, size):
+def movie_exists(conn, imdb_id):
+    """
+    Return True if a movie with the given IMDb ID is already stored.
+
+    Used by scanners to skip metadata lookups for locally identified titles.
+    """
+    row = conn.execute(
+        "SELECT 1 FROM movies WHERE imdb_id = ?",
+        (imdb_id,),
+    ).fetchone()
+
+    return row is not None
+
+
+def upsert_movie_file(conn, imdb_id, path, resolution, size, inode=None, dev=None):
     """
     Insert or update a movie file entry.
 
@@ -39,13 +54,34 @@ def upsert_movie_file(conn, imdb_id, path, resolution, size):
     """
     conn.execute(
         """
-        INSERT INTO files (movie_imdb_id, path, resolution, size)
-        VALUES (?, ?, ?, ?)
+        INSERT INTO files (movie_imdb_id, path, resolution, size, inode, dev)
+        VALUES (?, ?, ?, ?, ?, ?)
         ON CONFLICT(path) DO UPDATE SET
             movie_imdb_id = excluded.movie_imdb_id,
             resolution = excluded.resolution,
             size = excluded.size,
+            inode = excluded.inode,
+            dev = excluded.dev,
             episode_id = NULL
         """,
-        (imdb_id, path, resolution, size),
+        (imdb_id, path, resolution, size, inode, dev),
+    )
+
+
+def mark_movie_added(conn, imdb_id, added_at):
+    """
+    Record when a movie was added to the library.
+
+    added_at is the mtime of one of its files; the oldest one wins, so
+    adding another version of a movie doesn't make it "recently added".
+    """
+    # Clock skew on the storage host must not pin a movie to the top
+    added_at = int(min(added_at, time.time()))
+
+    conn.execute(
+        """
+        UPDATE movies SET added_at = ?
+        WHERE imdb_id = ? AND (added_at IS NULL OR added_at > ?)
+        """,
+        (added_at, imdb_id, added_at),
     )
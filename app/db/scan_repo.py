@@ -0,0 +1,83 @@
+"""
+Scan cursor repository helpers.
+
+Stores the progress of unfinished full library walks, per library folder
+(see scanner.checkpoint).
+"""
+
+import time
+
+
+def get_scan_cursor(conn, library, scope):
+    """
+    Return the cursor of an unfinished walk of scope, or None.
+
+    Cursors are kept per folder, so a folder removed from MOVIES_ROOTS /
+    SERIES_ROOTS leaves its cursor unused until the walk completes.
+    """
+    row = conn.execute(
+        "SELECT cursor FROM scan_cursors WHERE library = ? AND scope = ?",
+        (library, scope),
+    ).fetchone()
+
+    return row[0] if row else None
+
+
+def save_scan_cursor(conn, library, scope, cursor):
+    """
+    Record the last folder entry fully indexed by a walk.
+
+    Must be called inside the transaction that commits the indexed data,
+    so the cursor never runs ahead of the library.
+    """
+    now = int(time.time())
+
+    conn.execute(
+        """
+        INSERT INTO scan_cursors (library, scope, cursor, started_at, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(library, scope) DO UPDATE SET
+          cursor = excluded.cursor,
+          updated_at = excluded.updated_at
+        """,
+        (library, scope, cursor, now, now),
+    )
+
+
+def clear_scan_cursor(conn, library):
+    """
+    Forget the walks of all folders of a library.
+    """
+    conn.execute("DELETE FROM scan_cursors WHERE library = ?", (library,))
+
+
+def clear_scan_cursors(conn):
+    """
+    Forget all unfinished walks (e.g. after the library tables were
+    cleared).
+    """
+    conn.execute("DELETE FROM scan_cursors")
+
+
+def get_scan_cursors(conn):
+    """
+    Return all unfinished walks as dicts, for the admin API.
+    """
+    rows = conn.execute(
+        """
+        SELECT library, scope, cursor, started_at, updated_at
+        FROM scan_cursors
+        ORDER BY library, scope
+        """
+    ).fetchall()
+
+    return [
+        {
+            "library": row[0],
+            "scope": row[1],
+            "cursor": row[2],
+            "started_at": row[3],
+            "updated_at": row[4],
+        }
+        for row in rows
+    ]
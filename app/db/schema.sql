@@ -20,7 +20,8 @@ CREATE TABLE IF NOT EXISTS movies (
   title TEXT NOT NULL,
   year INTEGER,
   poster_url TEXT,
-  genres TEXT          -- JSON-encoded list
+  genres TEXT,         -- JSON-encoded list
+  added_at INTEGER     -- oldest file mtime (unix seconds)
 );
 
 
@@ -32,7 +33,9 @@ CREATE TABLE IF NOT EXISTS series (
   imdb_id TEXT PRIMARY KEY,
   title TEXT NOT NULL,
   poster_url TEXT,
-  genres TEXT          -- JSON-encoded list
+  genres TEXT,             -- JSON-encoded list
+  added_at INTEGER,        -- oldest episode added_at (unix seconds)
+  episode_added_at INTEGER -- newest episode added_at (unix seconds)
 );
 
 
@@ -46,6 +49,7 @@ CREATE TABLE IF NOT EXISTS episodes (
   series_imdb_id TEXT NOT NULL,
   season INTEGER NOT NULL,
   episode INTEGER NOT NULL,
+  added_at INTEGER,    -- oldest file mtime (unix seconds)
   UNIQUE (series_imdb_id, season, episode),
   FOREIGN KEY (series_imdb_id) REFERENCES series(imdb_id)
 );
@@ -66,11 +70,74 @@ CREATE TABLE IF NOT EXISTS files (
   path TEXT NOT NULL UNIQUE,
   resolution TEXT,
   size INTEGER,
+  inode INTEGER,       -- used to detect renames / moves
+  dev INTEGER,         -- device of inode (NULL for agent manifests)
   FOREIGN KEY(movie_imdb_id) REFERENCES movies(imdb_id),
   FOREIGN KEY(episode_id) REFERENCES episodes(id)
 );
 
 
+-- ----------------------------
+-- Library state
+-- ----------------------------
+-- Single-row table holding the library generation counter.
+-- Every committed scan bumps the generation so per-process caches
+-- (one per uvicorn worker) know when to reload.
+CREATE TABLE IF NOT EXISTS library_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  generation INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO library_state (id, generation) VALUES (1, 0);
+
+
+-- ----------------------------
+-- Agent manifests
+-- ----------------------------
+-- Version of the last manifest accepted per library from the
+-- storage-side scan agent. Agents send deltas against this version;
+-- a mismatch makes them resend a full manifest.
+CREATE TABLE IF NOT EXISTS agent_manifests (
+  library TEXT PRIMARY KEY,      -- movies | series
+  version INTEGER NOT NULL
+);
+
+
+-- ----------------------------
+-- Scan cursors
+-- ----------------------------
+-- Progress of an unfinished full library walk (see scanner.checkpoint);
+-- the row is deleted when the walk completes
+CREATE TABLE IF NOT EXISTS scan_cursors (
+  library TEXT NOT NULL,       -- movies | series
+  scope TEXT NOT NULL,         -- library folder being walked (one per root)
+  cursor TEXT NOT NULL,        -- last folder entry fully indexed (walked in name order)
+  started_at INTEGER NOT NULL, -- unix seconds
+  updated_at INTEGER NOT NULL, -- unix seconds
+  PRIMARY KEY (library, scope)
+);
+
+
+-- ----------------------------
+-- Metadata retry queue
+-- ----------------------------
+-- Movie files and series folders whose TMDB lookup failed because TMDB
+-- could not answer; retried with exponential backoff (see scanner.resolve)
+CREATE TABLE IF NOT EXISTS metadata_queue (
+  path TEXT PRIMARY KEY,            -- movie file or series folder
+  library TEXT NOT NULL,            -- movies | series
+  title TEXT NOT NULL,              -- parsed title (series: folder name without ID tags)
+  year INTEGER,                     -- movies only
+  imdb_id TEXT,                     -- local IDs (see metadata.local)
+  tmdb_id INTEGER,
+  files TEXT NOT NULL,              -- JSON-encoded media files to index once resolved
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at INTEGER NOT NULL, -- unix seconds
+  last_error TEXT,
+  queued_at INTEGER NOT NULL        -- unix seconds
+);
+
+
 -- ----------------------------
 -- Indexes
 -- ----------------------------
@@ -83,6 +150,28 @@ CREATE INDEX IF NOT EXISTS idx_files_movie
 CREATE INDEX IF NOT EXISTS idx_files_episode
   ON files(episode_id);
 
+-- Rename / move detection (inode, size and device of vanished files)
+CREATE INDEX IF NOT EXISTS idx_files_inode
+  ON files(inode, size);
+
 -- Fast episode resolution from Stremio IDs
 CREATE INDEX IF NOT EXISTS idx_episodes_lookup
   ON episodes(series_imdb_id, season, episode);
+
+-- Sorted catalogs (see db.catalog); each index covers its catalog
+-- query, so a page is read from the index alone
+CREATE INDEX IF NOT EXISTS idx_movies_added
+  ON movies(added_at DESC, title, imdb_id, poster_url, genres);
+
+CREATE INDEX IF NOT EXISTS idx_movies_year
+  ON movies(year DESC, title, imdb_id, poster_url, genres);
+
+CREATE INDEX IF NOT EXISTS idx_series_added
+  ON series(added_at DESC, title, imdb_id, poster_url, genres);
+
+CREATE INDEX IF NOT EXISTS idx_series_episode_added
+  ON series(episode_added_at DESC, title, imdb_id, poster_url, genres);
+
+-- Due metadata retries
+CREATE INDEX IF NOT EXISTS idx_metadata_queue_due
+  ON metadata_queue(next_attempt_at);
@@ -6,6 +6,7 @@ and associated media files stored in the SQLite database.
 """
 
 import json
+import time
 
 
 def upsert_series(conn, series):
@@ -29,6 +30,20 @@ def upsert_series(conn, series):
     )
 
 
+def series_exists(conn, imdb_id):
+    """
+    Return True if a series with the given IMDb ID is already stored.
+
+    Used by scanners to skip metadata lookups for locally identified titles.
+    """
+    row = conn.execute(
+        "SELECT 1 FROM series WHERE imdb_id = ?",
+        (imdb_id,),
+    ).fetchone()
+
+    return row is not None
+
+
 def upsert_episode(conn, series_imdb_id, season, episode):
     """
     Insert an episode if it does not already exist and return its ID.
@@ -56,7 +71,7 @@ def upsert_episode(conn, series_imdb_id, season, episode):
     return row[0]
 
 
-def upsert_episode_file(conn, episode_id, path, resolution, size):
+def upsert_episode_file(conn, episode_id, path, resolution, size, inode=None, dev=None):
     """
     Insert or update a media file associated with an episode.
 
@@ -64,12 +79,84 @@ def upsert_episode_file(conn, episode_id, path, resolution, size):
     """
     conn.execute(
         """
-        INSERT INTO files (episode_id, path, resolution, size)
-        VALUES (?, ?, ?, ?)
+        INSERT INTO files (episode_id, path, resolution, size, inode, dev)
+        VALUES (?, ?, ?, ?, ?, ?)
         ON CONFLICT(path) DO UPDATE SET
             episode_id = excluded.episode_id,
             resolution = excluded.resolution,
-            size = excluded.size
+            size = excluded.size,
+            inode = excluded.inode,
+            dev = excluded.dev
+        """,
+        (episode_id, path, resolution, size, inode, dev),
+    )
+
+
+def mark_episode_added(conn, series_imdb_id, episode_id, added_at):
+    """
+    Record when an episode was added to the library.
+
+    added_at is the mtime of one of its files; the oldest one wins. The
+    series keeps its oldest episode time (added_at) and its newest one
+    (episode_added_at, for the "new episodes" catalog).
+    """
+    # Clock skew on the storage host must not pin a series to the top
+    added_at = int(min(added_at, time.time()))
+
+    conn.execute(
+        """
+        UPDATE episodes SET added_at = ?
+        WHERE id = ? AND (added_at IS NULL OR added_at > ?)
         """,
-        (episode_id, path, resolution, size),
+        (added_at, episode_id, added_at),
+    )
+
+    conn.execute(
+        """
+        UPDATE series SET added_at = ?
+        WHERE imdb_id = ? AND (added_at IS NULL OR added_at > ?)
+        """,
+        (added_at, series_imdb_id, added_at),
+    )
+
+    # The episode's own time (an upgraded old episode is not new)
+    conn.execute(
+        """
+        UPDATE series
+        SET episode_added_at = (SELECT added_at FROM episodes WHERE id = :episode_id)
+        WHERE imdb_id = :series_imdb_id
+          AND (
+            episode_added_at IS NULL
+            OR episode_added_at < (SELECT added_at FROM episodes WHERE id = :episode_id)
+          )
+        """,
+        {"episode_id": episode_id, "series_imdb_id": series_imdb_id},
+    )
+
+
+def refresh_episode_added(conn):
+    """
+    Recompute episode_added_at from the episodes that still have files.
+
+    mark_episode_added only moves it forward; once the newest episode is
+    removed, this moves it back. Returns the number of updated series.
+    """
+    cur = conn.execute(
+        """
+        UPDATE series
+        SET episode_added_at = newest.added_at
+        FROM (
+            SELECT series.imdb_id AS imdb_id,
+                   (
+                       SELECT MAX(episodes.added_at)
+                       FROM episodes
+                       WHERE episodes.series_imdb_id = series.imdb_id
+                         AND EXISTS (SELECT 1 FROM files WHERE files.episode_id = episodes.id)
+                   ) AS added_at
+            FROM series
+        ) AS newest
+        WHERE newest.imdb_id = series.imdb_id
+          AND series.episode_added_at IS NOT newest.added_at
+        """
     )
+    return cur.rowcount
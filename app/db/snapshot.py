@@ -0,0 +1,216 @@
+"""
+In-memory library snapshot for the addon endpoints.
+
+Catalog and stream requests are answered from a per-process snapshot of
+the library instead of SQLite, so the handlers in api.stremio run
+directly on the event loop: no blocking database I/O and no hop to the
+thread pool.
+
+A snapshot belongs to one library generation (see db.generation). A
+daemon thread checks the generation every SNAPSHOT_POLL_SECONDS and
+loads a new snapshot when a scan committed changes. It is swapped in
+with a single assignment, so a request sees either the old or the new
+library, never a mix; responses may lag a commit by one poll interval.
+
+Each title has one meta dict per URL base (internal, external); the
+sorted catalogs hold references to the same dicts. The alphabetical
+catalogs are kept serialized, ready to send.
+"""
+
+import bisect
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from core.config import (
+    MEDIA_BASE_URL_EXTERNAL,
+    MEDIA_BASE_URL_INTERNAL,
+    SNAPSHOT_POLL_SECONDS,
+)
+from core.log import log_summary
+from core.tracing import traced
+from db.catalog import (
+    PAGE_SIZE,
+    SORTED_CATALOGS,
+    get_movie_catalog,
+    get_series_catalog,
+    get_sorted_catalog_ids,
+)
+from db.connection import connect
+from db.generation import get_generation
+from db.streams import get_all_episode_files, get_all_movie_files
+
+logger = logging.getLogger(__name__)
+
+CATALOG_LOADERS = {
+    "movie": get_movie_catalog,
+    "series": get_series_catalog,
+}
+
+
+class Snapshot:
+    """
+    Immutable view of the library at one generation.
+    """
+
+    __slots__ = (
+        "generation",
+        "catalog_json",
+        "sorted_catalogs",
+        "movie_files",
+        "episode_files",
+        "episodes",
+    )
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        # {(catalog_type, external): b'{"metas":[...]}'} (alphabetical)
+        self.catalog_json = {}
+        # {(catalog_type, catalog_id, external): [meta, ...]}
+        self.sorted_catalogs = {}
+        # {imdb_id: [(path, resolution, size), ...]}
+        self.movie_files = {}
+        # {(series_imdb_id, season, episode): [(path, resolution, size), ...]}
+        self.episode_files = {}
+        # {series_imdb_id: [(season, episode), ...]} episodes with files,
+        # in playback order
+        self.episodes = {}
+
+    def catalog_page(self, catalog_type: str, catalog_id: str, skip: int, external: bool):
+        """
+        Return one page of a sorted catalog, or None if it is unknown.
+        """
+        metas = self.sorted_catalogs.get((catalog_type, catalog_id, external))
+        if metas is None:
+            return None
+        return metas[skip:skip + PAGE_SIZE]
+
+    def next_episode_files(self, series_imdb_id: str, season: int, episode: int, count: int):
+        """
+        Return (season, episode, path, resolution, size) for the files of
+        the next `count` episodes with files after the given one.
+        """
+        order = self.episodes.get(series_imdb_id, [])
+        start = bisect.bisect_right(order, (season, episode))
+
+        return [
+            (next_season, next_episode, *row)
+            for next_season, next_episode in order[start:start + count]
+            for row in self.episode_files[(series_imdb_id, next_season, next_episode)]
+        ]
+
+
+# Empty until the first load; generation -1 never matches the database
+_current = Snapshot(-1)
+_thread = None
+
+
+def current() -> Snapshot:
+    return _current
+
+
+@traced("snapshot.load", root=True)
+def load_snapshot(conn) -> Snapshot:
+    """
+    Read the whole addon view of the library in one transaction.
+    """
+    conn.execute("BEGIN")
+    try:
+        snapshot = Snapshot(get_generation(conn))
+
+        sorted_ids = {key: get_sorted_catalog_ids(conn, *key) for key in SORTED_CATALOGS}
+
+        base_urls = ((False, MEDIA_BASE_URL_INTERNAL), (True, MEDIA_BASE_URL_EXTERNAL))
+
+        for external, base_url in base_urls:
+            for catalog_type, loader in CATALOG_LOADERS.items():
+                # Cached posters are served from the same host as the media
+                metas = loader(conn, base_url)
+                snapshot.catalog_json[(catalog_type, external)] = json.dumps(
+                    {"metas": metas}, ensure_ascii=False, separators=(",", ":")
+                ).encode()
+
+                by_id = {meta["id"]: meta for meta in metas}
+                for (sorted_type, catalog_id), ids in sorted_ids.items():
+                    if sorted_type == catalog_type:
+                        snapshot.sorted_catalogs[(catalog_type, catalog_id, external)] = [
+                            by_id[imdb_id] for imdb_id in ids
+                        ]
+
+        for imdb_id, path, resolution, size in get_all_movie_files(conn):
+            snapshot.movie_files.setdefault(imdb_id, []).append((path, resolution, size))
+
+        # Ordered by series, season and episode
+        for series_imdb_id, season, episode, path, resolution, size in get_all_episode_files(conn):
+            files = snapshot.episode_files.get((series_imdb_id, season, episode))
+            if files is None:
+                files = snapshot.episode_files[(series_imdb_id, season, episode)] = []
+                snapshot.episodes.setdefault(series_imdb_id, []).append((season, episode))
+            files.append((path, resolution, size))
+    finally:
+        conn.rollback()
+
+    return snapshot
+
+
+def refresh(conn) -> bool:
+    """
+    Load a new snapshot if the library generation changed.
+
+    Returns True if a new snapshot was swapped in.
+    """
+    global _current
+
+    if get_generation(conn) == _current.generation:
+        return False
+
+    started = time.monotonic()
+    snapshot = load_snapshot(conn)
+    _current = snapshot
+
+    counts = {
+        "movies": len(snapshot.movie_files),
+        "episodes": len(snapshot.episode_files),
+    }
+    log_summary(logger, "Library snapshot loaded", counts, started, generation=snapshot.generation)
+    return True
+
+
+def _poll():
+    conn = connect()
+    try:
+        while True:
+            time.sleep(SNAPSHOT_POLL_SECONDS)
+            try:
+                refresh(conn)
+            except sqlite3.Error as e:
+                # E.g. a locked database: keep serving the previous snapshot
+                logger.warning("Library snapshot refresh failed: %s", e)
+            except Exception:
+                # Bad library data must not end the thread: keep serving the
+                # previous snapshot and retry on the next poll
+                logger.exception("Library snapshot refresh failed")
+    finally:
+        conn.close()
+
+
+def start_refresh():
+    """
+    Load the first snapshot and start the refresh thread (once per
+    process).
+    """
+    global _thread
+
+    if _thread is not None:
+        return
+
+    conn = connect()
+    try:
+        refresh(conn)
+    finally:
+        conn.close()
+
+    _thread = threading.Thread(target=_poll, name="library-snapshot", daemon=True)
+    _thread.start()
@@ -2,40 +2,55 @@
 Stream query helpers.
 
 This module provides read-only database helpers for resolving
-media files used by Stremio stream endpoints.
+media files used by Stremio stream endpoints (loaded into the library
+snapshot, see db.snapshot) and the remux endpoints.
 """
 
 
-def get_movie_files(conn, imdb_id):
+def get_all_movie_files(conn):
     """
-    Return all media files associated with a movie.
+    Return (imdb_id, path, resolution, size) for every movie file.
 
-    Expects an open SQLite connection and a movie IMDb ID.
+    Used to load all stream lists in one pass (library snapshot, static
+    export).
     """
     return conn.execute(
         """
-        SELECT path, resolution, size
+        SELECT movie_imdb_id, path, resolution, size
         FROM files
-        WHERE movie_imdb_id = ?
-        """,
-        (imdb_id,),
+        WHERE movie_imdb_id IS NOT NULL
+        ORDER BY movie_imdb_id
+        """
     ).fetchall()
 
 
-def get_episode_files(conn, series_imdb_id, season, episode):
+def get_all_episode_files(conn):
     """
-    Return all media files associated with a specific episode.
+    Return (series_imdb_id, season, episode, path, resolution, size) for
+    every episode file.
 
-    Episodes are identified by series IMDb ID, season, and episode number.
+    Used to load all stream lists in one pass (library snapshot, static
+    export).
     """
     return conn.execute(
         """
-        SELECT f.path, f.resolution, f.size
+        SELECT e.series_imdb_id, e.season, e.episode,
+               f.path, f.resolution, f.size
         FROM episodes e
         JOIN files f ON f.episode_id = e.id
-        WHERE e.series_imdb_id = ?
-          AND e.season = ?
-          AND e.episode = ?
-        """,
-        (series_imdb_id, season, episode),
+        ORDER BY e.series_imdb_id, e.season, e.episode
+        """
     ).fetchall()
+
+
+def get_file_size(conn, path):
+    """
+    Return the size of an indexed media file, or None if the path is not
+    in the library.
+    """
+    row = conn.execute(
+        "SELECT size FROM files WHERE path = ?",
+        (path,),
+    ).fetchone()
+
+    return row[0] if row else None
@@ -0,0 +1,212 @@
+"""
+Static export of the internal addon.
+
+Manifests, catalogs and stream lists are a pure function of library.db.
+After each scan, this module renders every internal addon response into a
+versioned directory tree that Caddy can serve with `file_server`, keeping
+Python out of the request path for internal clients:
+
+    <STATIC_EXPORT_DIR>/
+      current -> 42                      (relative symlink, swapped atomically)
+      42/internal/manifest.json
+      42/internal/catalog/movie/remote-files.json
+      42/internal/catalog/series/remote-files.json
+      42/internal/catalog/movie/recent.json          (sorted catalogs,
+      42/internal/catalog/movie/recent/skip=100.json  one file per page)
+      42/internal/stream/movie/<imdb_id>.json
+      42/internal/stream/series/<imdb_id>:<season>:<episode>.json
+
+Versions are named after the library generation. A version is written to
+a temporary directory and renamed into place before `current` is swapped,
+so the proxy never sees a partially written tree. External endpoints are
+not exported; they require token checks in the API.
+
+Scans, ingestion and metadata retries may export from different
+processes. Exports hold an flock on EXPORT_LOCK_PATH, a version that
+already exists is not rendered again, and `current` never moves back to
+an older generation.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+import fcntl
+from itertools import groupby
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import time
+
+from core.config import (
+    EXPORT_LOCK_PATH,
+    MEDIA_BASE_URL_INTERNAL,
+    STATIC_EXPORT_DIR,
+    STREAM_PROVIDER_NAME_INTERNAL,
+)
+from core.log import log_summary
+from core.tracing import traced
+from db.connection import connect
+from db.catalog import (
+    PAGE_SIZE,
+    SORTED_CATALOGS,
+    get_movie_catalog,
+    get_series_catalog,
+    get_sorted_catalog,
+)
+from db.generation import get_generation
+from db.streams import get_all_movie_files, get_all_episode_files
+from api.stremio import internal_manifest, movie_streams, episode_streams, remux_base_url
+
+logger = logging.getLogger(__name__)
+
+# Previous versions kept for requests that are still being served
+KEEP_VERSIONS = 2
+
+
+def _write_json(path: Path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def _render(conn, root: Path) -> Counter:
+    addon = root / "internal"
+    counts = Counter()
+
+    _write_json(addon / "manifest.json", internal_manifest())
+
+    _write_json(
+        addon / "catalog" / "movie" / "remote-files.json",
+        {"metas": get_movie_catalog(conn, MEDIA_BASE_URL_INTERNAL)},
+    )
+    _write_json(
+        addon / "catalog" / "series" / "remote-files.json",
+        {"metas": get_series_catalog(conn, MEDIA_BASE_URL_INTERNAL)},
+    )
+
+    # Sorted catalogs: the first page plus one file per further page
+    for catalog_type, catalog_id in SORTED_CATALOGS:
+        skip = 0
+        while True:
+            metas = get_sorted_catalog(
+                conn, catalog_type, catalog_id, skip, MEDIA_BASE_URL_INTERNAL
+            )
+            name = f"{catalog_id}.json" if skip == 0 else f"{catalog_id}/skip={skip}.json"
+            _write_json(addon / "catalog" / catalog_type / name, {"metas": metas})
+            counts["catalog_pages"] += 1
+
+            if len(metas) < PAGE_SIZE:
+                break
+            skip += PAGE_SIZE
+
+    streams = {
+        "base_url": MEDIA_BASE_URL_INTERNAL,
+        "provider_name": STREAM_PROVIDER_NAME_INTERNAL,
+        "remux_url": remux_base_url(MEDIA_BASE_URL_INTERNAL, external=False),
+    }
+
+    for imdb_id, rows in groupby(get_all_movie_files(conn), key=lambda r: r[0]):
+        files = [row[1:] for row in rows]
+        _write_json(
+            addon / "stream" / "movie" / f"{imdb_id}.json",
+            {"streams": movie_streams(files, **streams)},
+        )
+        counts["movie_streams"] += 1
+
+    for (series_imdb_id, season, episode), rows in groupby(
+        get_all_episode_files(conn), key=lambda r: r[:3]
+    ):
+        files = [row[3:] for row in rows]
+        _write_json(
+            addon / "stream" / "series" / f"{series_imdb_id}:{season}:{episode}.json",
+            {"streams": episode_streams(files, series_imdb_id=series_imdb_id, **streams)},
+        )
+        counts["episode_streams"] += 1
+
+    return counts
+
+
+@contextmanager
+def _export_lock():
+    # Blocks while another process exports; it usually renders the same
+    # or an older generation, so waiting is short
+    with open(EXPORT_LOCK_PATH, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _current_version(export_dir: Path) -> str | None:
+    try:
+        target = os.readlink(export_dir / "current")
+    except OSError:
+        return None
+    return target if target.isdigit() else None
+
+
+def _prune_versions(export_dir: Path, current: str):
+    versions = sorted(
+        (p for p in export_dir.iterdir() if p.is_dir() and not p.is_symlink() and p.name.isdigit()),
+        key=lambda p: int(p.name),
+    )
+
+    for old in versions[:-KEEP_VERSIONS]:
+        if old.name != current:
+            shutil.rmtree(old, ignore_errors=True)
+
+    # Leftovers from interrupted exports (no other export is running)
+    for tmp in export_dir.glob(".tmp-*"):
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+@traced("export.static")
+def export_static():
+    """
+    Render the internal addon into STATIC_EXPORT_DIR, if enabled.
+
+    The tree for the current library generation is only rendered once;
+    later calls just make sure `current` points at it.
+    """
+    if not STATIC_EXPORT_DIR:
+        return
+
+    export_dir = Path(STATIC_EXPORT_DIR)
+    export_dir.mkdir(parents=True, exist_ok=True)
+
+    counts = Counter()
+    started = time.monotonic()
+
+    with _export_lock():
+        # Read everything in one transaction so the export matches a
+        # single library generation even if another write commits meanwhile
+        conn = connect()
+        try:
+            conn.execute("BEGIN")
+            generation = str(get_generation(conn))
+
+            final = export_dir / generation
+            if not final.is_dir():
+                tmp = export_dir / f".tmp-{generation}-{os.getpid()}"
+                shutil.rmtree(tmp, ignore_errors=True)
+                counts = _render(conn, tmp)
+                os.rename(tmp, final)
+        finally:
+            conn.close()
+
+        current = _current_version(export_dir)
+        if current is None or int(current) <= int(generation):
+            # Atomically repoint `current` (relative, so it resolves inside
+            # the proxy container regardless of the mount point)
+            link_tmp = export_dir / f".current-{os.getpid()}"
+            if link_tmp.is_symlink():
+                link_tmp.unlink()
+            os.symlink(generation, link_tmp)
+            os.replace(link_tmp, export_dir / "current")
+            current = generation
+
+        _prune_versions(export_dir, current)
+
+    log_summary(logger, "Static export complete", counts, started, generation=generation)
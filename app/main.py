@@ -8,11 +8,22 @@ and wires together the API routers.
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from core.log import setup_logging
+from core.tracing import TraceMiddleware
 from db.init import init_db
+from db.snapshot import start_refresh
 from api.stremio import router as stremio_router
 from api.admin import router as admin_router
 from api.auth import router as auth_router
-from scanner import scan_movies, scan_series
+from api.ingest import router as ingest_router
+from api.agent import router as agent_router
+from api.posters import router as posters_router
+from api.remux import router as remux_router
+from api.profile import router as profile_router
+from scanner import start_retries, start_scanner
+
+# Queue-backed logging (before anything logs)
+setup_logging()
 
 app = FastAPI()
 
@@ -22,6 +33,9 @@ app.add_middleware(
     allow_origins=["*"],
 )
 
+# Request tracing (no-op unless TRACE_EXPORT is set)
+app.add_middleware(TraceMiddleware)
+
 
 @app.on_event("startup")
 def startup():
@@ -30,9 +44,16 @@ def startup():
     """
     init_db()
 
-    # Initial library scan (runs once on startup)
-    scan_movies()
-    scan_series()
+    # Addon requests are served from memory (see db.snapshot)
+    start_refresh()
+
+    # Initial library scan, in a separate process so the API starts
+    # serving immediately. With several workers only the process holding
+    # the scan lock scans; the others exit right away.
+    start_scanner("scan")
+
+    # Metadata lookups deferred while TMDB was unavailable
+    start_retries()
 
 
 # Public Stremio addon endpoints
@@ -42,4 +63,19 @@ app.include_router(stremio_router)
 app.include_router(admin_router)
 
 # Auth endpoints
-app.include_router(auth_router)
\ No newline at end of file
+app.include_router(auth_router)
+
+# Per-item ingestion (download webhooks)
+app.include_router(ingest_router)
+
+# Storage-side scan agent manifests
+app.include_router(agent_router)
+
+# Cached posters
+app.include_router(posters_router)
+
+# HLS remux of files that are not web-ready
+app.include_router(remux_router)
+
+# On-demand CPU / memory profiles
+app.include_router(profile_router)
\ No newline at end of file
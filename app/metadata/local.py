@@ -0,0 +1,139 @@
+"""
+Local metadata ID helpers.
+
+This module resolves IMDb / TMDB IDs from information stored next to the
+media, so scanners can skip the TMDB title search entirely:
+
+- ID tags in file or folder names, e.g. `{imdb-tt0063350}`,
+  `[imdbid-tt0063350]`, `{tmdb-10331}` or `[tmdbid-10331]`
+- Kodi-style `.nfo` sidecar files (`<movie file>.nfo`, `tvshow.nfo`)
+"""
+
+from pathlib import Path
+import re
+import xml.etree.ElementTree as ET
+
+# Sidecar files are never media files
+NFO_SUFFIX = ".nfo"
+
+# Series-level sidecar inside the series folder
+SERIES_NFO_NAME = "tvshow.nfo"
+
+# NFO files larger than this are not metadata (e.g. scene release info)
+NFO_MAX_BYTES = 1024 * 1024
+
+# {imdb-tt1234567} / [imdbid-tt1234567]
+IMDB_TAG_PATTERN = re.compile(
+    r"[\[{]\s*imdb(?:id)?[-=\s]\s*(?P<imdb_id>tt\d{7,})\s*[\]}]",
+    re.IGNORECASE,
+)
+
+# {tmdb-123} / [tmdbid-123]
+TMDB_TAG_PATTERN = re.compile(
+    r"[\[{]\s*tmdb(?:id)?[-=\s]\s*(?P<tmdb_id>\d+)\s*[\]}]",
+    re.IGNORECASE,
+)
+
+# Bare IMDb IDs and TMDB URLs inside plain-text NFO files
+IMDB_ID_PATTERN = re.compile(r"\b(?P<imdb_id>tt\d{7,})\b")
+TMDB_URL_PATTERN = re.compile(r"themoviedb\.org/(?:movie|tv)/(?P<tmdb_id>\d+)")
+
+
+def strip_id_tags(name: str) -> str:
+    """
+    Remove IMDb / TMDB ID tags from a file or folder name.
+    """
+    name = IMDB_TAG_PATTERN.sub("", name)
+    name = TMDB_TAG_PATTERN.sub("", name)
+
+    # Collapse whitespace left behind by the removed tags
+    return re.sub(r"\s{2,}", " ", name).strip()
+
+
+def parse_id_tags(name: str) -> dict:
+    """
+    Extract IMDb / TMDB IDs from tags embedded in a file or folder name.
+
+    Returns a dict with imdb_id and tmdb_id (either may be None).
+    """
+    imdb_match = IMDB_TAG_PATTERN.search(name)
+    tmdb_match = TMDB_TAG_PATTERN.search(name)
+
+    return {
+        "imdb_id": imdb_match.group("imdb_id").lower() if imdb_match else None,
+        "tmdb_id": int(tmdb_match.group("tmdb_id")) if tmdb_match else None,
+    }
+
+
+def read_nfo_ids(path: Path) -> dict:
+    """
+    Extract IMDb / TMDB IDs from a Kodi-style NFO file.
+
+    Supports XML NFOs (<uniqueid type="imdb">, <imdbid>, <tmdbid>, <id>)
+    and plain-text NFOs that only contain an IMDb or TMDB URL.
+
+    Returns a dict with imdb_id and tmdb_id (either may be None).
+    """
+    ids = {"imdb_id": None, "tmdb_id": None}
+
+    try:
+        if not path.is_file() or path.stat().st_size > NFO_MAX_BYTES:
+            return ids
+        text = path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return ids
+
+    try:
+        root = ET.fromstring(text.strip())
+    except ET.ParseError:
+        root = None
+
+    if root is not None:
+        for el in root.iter("uniqueid"):
+            value = (el.text or "").strip()
+            kind = (el.get("type") or "").lower()
+            if kind == "imdb" and IMDB_ID_PATTERN.fullmatch(value):
+                ids["imdb_id"] = ids["imdb_id"] or value
+            elif kind == "tmdb" and value.isdigit():
+                ids["tmdb_id"] = ids["tmdb_id"] or int(value)
+
+        for tag in ("imdbid", "imdb_id", "id"):
+            value = (root.findtext(tag) or "").strip()
+            if IMDB_ID_PATTERN.fullmatch(value):
+                ids["imdb_id"] = ids["imdb_id"] or value
+
+        value = (root.findtext("tmdbid") or "").strip()
+        if value.isdigit():
+            ids["tmdb_id"] = ids["tmdb_id"] or int(value)
+
+    # Plain-text NFO (or XML without ID elements): look for URLs / bare IDs
+    if not ids["imdb_id"]:
+        match = IMDB_ID_PATTERN.search(text)
+        if match:
+            ids["imdb_id"] = match.group("imdb_id")
+
+    if not ids["tmdb_id"]:
+        match = TMDB_URL_PATTERN.search(text)
+        if match:
+            ids["tmdb_id"] = int(match.group("tmdb_id"))
+
+    return ids
+
+
+def local_ids(name: str, nfo_path: Path) -> dict:
+    """
+    Resolve IDs for a media item from its name tags and NFO sidecar.
+
+    ID tags in the name take precedence over the NFO file.
+    """
+    ids = parse_id_tags(name)
+
+    if ids["imdb_id"] and ids["tmdb_id"]:
+        return ids
+
+    nfo_ids = read_nfo_ids(nfo_path)
+
+    return {
+        "imdb_id": ids["imdb_id"] or nfo_ids["imdb_id"],
+        "tmdb_id": ids["tmdb_id"] or nfo_ids["tmdb_id"],
+    }
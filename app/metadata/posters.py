@@ -0,0 +1,59 @@
+"""
+Local poster cache.
+
+Catalog posters normally point at images.metahub.space, so every client
+downloads full-size posters from a third party on every catalog render.
+With POSTER_CACHE_DIR set, each poster is fetched once after a scan and
+stored on disk together with resized variants:
+
+    <POSTER_CACHE_DIR>/<imdb_id>/original.jpg
+    <POSTER_CACHE_DIR>/<imdb_id>/small.jpg      (VARIANTS widths)
+    <POSTER_CACHE_DIR>/<imdb_id>/medium.jpg
+
+Catalogs then point at `/posters/<imdb_id>/<POSTER_VARIANT>.jpg` on the
+addon's own host (see api.posters), served with long-lived cache headers.
+
+This module is the read side used by the API (lookups only, no HTTP
+client or Pillow); the scanner fills the cache (see scanner.posters).
+"""
+
+from pathlib import Path
+import re
+
+from core.config import POSTER_CACHE_DIR, POSTER_VARIANT
+
+ENABLED = bool(POSTER_CACHE_DIR)
+
+# Variant name -> width in pixels (height keeps the aspect ratio)
+VARIANTS = {
+    "small": 185,
+    "medium": 342,
+}
+ORIGINAL = "original"
+
+IMDB_ID_PATTERN = re.compile(r"tt\d+")
+
+
+def poster_file(imdb_id: str, variant: str) -> Path | None:
+    """
+    Return the cached file for a poster variant (falling back to the
+    original), or None if the poster is not cached.
+    """
+    folder = Path(POSTER_CACHE_DIR) / imdb_id
+
+    for name in (variant, ORIGINAL):
+        path = folder / f"{name}.jpg"
+        if path.is_file():
+            return path
+
+    return None
+
+
+def local_poster_url(base_url: str, imdb_id: str) -> str | None:
+    """
+    Return the local URL of a cached poster, or None if it is not cached.
+    """
+    if not ENABLED or poster_file(imdb_id, POSTER_VARIANT) is None:
+        return None
+
+    return f"{base_url}/posters/{imdb_id}/{POSTER_VARIANT}.jpg"
@@ -3,39 +3,86 @@ TMDB metadata lookup helpers.
 
 This module provides thin wrappers around the TMDB API for resolving
 movies and TV series into normalized metadata used by the application.
+
+Lookups return None when TMDB has no match and raise TMDBUnavailable
+when TMDB could not answer (timeouts, connection errors, 429 and 5xx
+responses). After such a failure, requests fail fast for
+METADATA_RETRY_SECONDS, so an outage costs a scan one timeout instead of
+one per title (see scanner.resolve).
 """
 
+import logging
 import os
+import time
+
 import requests
 
+from core.config import METADATA_RETRY_SECONDS
+from core.tracing import span
+
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 TMDB_BASE = "https://api.themoviedb.org/3"
 
+logger = logging.getLogger(__name__)
+
 # Fail fast if TMDB access is not configured
 if not TMDB_API_KEY:
     raise RuntimeError("TMDB_API_KEY is not set")
 
+# Monotonic time until which requests fail fast after a failure
+_unavailable_until = 0.0
+
+
+class TMDBUnavailable(Exception):
+    """
+    TMDB could not answer a request, or failed less than
+    METADATA_RETRY_SECONDS ago.
+    """
+
 
 def _tmdb_get(path, params=None):
     """
     Perform a GET request against the TMDB API and return parsed JSON.
+
+    Returns None for other client errors (e.g. 404 for an unknown ID).
     """
+    global _unavailable_until
+
+    if time.monotonic() < _unavailable_until:
+        raise TMDBUnavailable(f"{path}: TMDB failed recently")
+
     if params is None:
         params = {}
 
     params["api_key"] = TMDB_API_KEY
 
-    try:
-        resp = requests.get(
-            f"{TMDB_BASE}{path}",
-            params=params,
-            timeout=10,
-        )
-        resp.raise_for_status()
-        return resp.json()
-    except requests.exceptions.RequestException as e:
-        print(f"[ERROR] TMDB request failed: {e}")
-        return None
+    # The span records the path only: params carry the API key
+    with span("tmdb.request", path=path) as trace:
+        try:
+            resp = requests.get(
+                f"{TMDB_BASE}{path}",
+                params=params,
+                timeout=10,
+            )
+            if trace:
+                trace.set("http.status_code", resp.status_code)
+            resp.raise_for_status()
+            return resp.json()
+        except requests.exceptions.RequestException as e:
+            # The exception text contains the URL with the API key: only
+            # the status or exception type is logged and traced
+            status = e.response.status_code if e.response is not None else None
+            reason = f"HTTP {status}" if status else type(e).__name__
+
+            logger.error("TMDB request failed: %s: %s", path, reason)
+            if trace:
+                trace.error = reason
+
+            if status is None or status == 429 or status >= 500:
+                _unavailable_until = time.monotonic() + METADATA_RETRY_SECONDS
+                raise TMDBUnavailable(f"{path}: {reason}")
+
+            return None
 
 
 def lookup_movie(title: str, year: int | None = None):
@@ -53,17 +100,36 @@ def lookup_movie(title: str, year: int | None = None):
 
     search = _tmdb_get("/search/movie", search_params)
 
-    if not search["results"]:
+    if not search or not search["results"]:
         return None
 
     movie = search["results"][0]
-    tmdb_id = movie["id"]
 
-    # 2) Fetch details and external IDs
-    details = _tmdb_get(f"/movie/{tmdb_id}")
-    externals = _tmdb_get(f"/movie/{tmdb_id}/external_ids")
+    # 2) Fetch details (including external IDs)
+    return lookup_movie_by_id(tmdb_id=movie["id"])
+
+
+def lookup_movie_by_id(tmdb_id: int | None = None, imdb_id: str | None = None):
+    """
+    Lookup a movie by TMDB or IMDb ID, skipping the title search.
+
+    TMDB accepts IMDb IDs on the movie details endpoint, so this is a
+    single request in both cases.
 
-    imdb_id = externals.get("imdb_id")
+    Returns the same dict as lookup_movie, or None if not found.
+    """
+    movie_id = tmdb_id or imdb_id
+    if not movie_id:
+        return None
+
+    details = _tmdb_get(
+        f"/movie/{movie_id}",
+        {"append_to_response": "external_ids"},
+    )
+    if not details:
+        return None
+
+    imdb_id = details.get("external_ids", {}).get("imdb_id") or imdb_id
     if not imdb_id:
         return None
 
@@ -78,7 +144,7 @@ def lookup_movie(title: str, year: int | None = None):
     return {
         "imdb_id": imdb_id,
         "title": details.get("title"),
-        "year": details.get("release_date", "")[:4],
+        "year": (details.get("release_date") or "")[:4],
         "genres": genres,
         "poster_url": poster_url,
     }
@@ -95,17 +161,41 @@ def lookup_series(title: str):
     # 1) Search TV series
     search = _tmdb_get("/search/tv", {"query": title})
 
-    if not search["results"]:
+    if not search or not search["results"]:
         return None
 
     series = search["results"][0]
-    tmdb_id = series["id"]
 
-    # 2) Fetch details and external IDs
-    details = _tmdb_get(f"/tv/{tmdb_id}")
-    externals = _tmdb_get(f"/tv/{tmdb_id}/external_ids")
+    # 2) Fetch details (including external IDs)
+    return lookup_series_by_id(tmdb_id=series["id"])
+
+
+def lookup_series_by_id(tmdb_id: int | None = None, imdb_id: str | None = None):
+    """
+    Lookup a TV series by TMDB or IMDb ID, skipping the title search.
+
+    The TV details endpoint only accepts TMDB IDs, so an IMDb ID costs
+    one extra /find request.
+
+    Returns the same dict as lookup_series, or None if not found.
+    """
+    if not tmdb_id and imdb_id:
+        found = _tmdb_get(f"/find/{imdb_id}", {"external_source": "imdb_id"})
+        if not found or not found.get("tv_results"):
+            return None
+        tmdb_id = found["tv_results"][0]["id"]
+
+    if not tmdb_id:
+        return None
+
+    details = _tmdb_get(
+        f"/tv/{tmdb_id}",
+        {"append_to_response": "external_ids"},
+    )
+    if not details:
+        return None
 
-    imdb_id = externals.get("imdb_id")
+    imdb_id = details.get("external_ids", {}).get("imdb_id") or imdb_id
     if not imdb_id:
         return None
 
@@ -1,4 +1,35 @@
-from .scan_movies import scan_movies
-from .scan_series import scan_series
+"""
+Library scanner package.
 
-__all__ = ["scan_movies", "scan_series"]
+Public entry points are imported on first use, so lightweight entry
+points such as the storage-side agent (`python -m scanner.agent`) don't
+load the API configuration, the database layer or the TMDB client, and
+the API only loads the launcher of the scanner process
+(`python -m scanner`, see scanner.process).
+"""
+
+import importlib
+
+# Public name -> submodule defining it
+_EXPORTS = {
+    "scan_movies": ".scan_movies",
+    "scan_series": ".scan_series",
+    "run_scan": ".run",
+    "run_db_maintenance": ".run",
+    "request_cancel": ".checkpoint",
+    "cancel_requested": ".checkpoint",
+    "scan_running": ".leader",
+    "scan_leader_pid": ".leader",
+    "run_scanner": ".process",
+    "start_scanner": ".process",
+    "start_retries": ".process",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
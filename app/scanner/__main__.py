@@ -0,0 +1,144 @@
+"""
+Scanner process entry point.
+
+    cd app
+    python -m scanner scan [--scope all|movies|series] [--path PATH] [--rebuild]
+    python -m scanner maintenance
+    python -m scanner ingest [--no-refresh] < paths.json   # ["/media/movies/...", ...]
+    python -m scanner manifest < manifest.json   # scan agent manifest (JSON)
+    python -m scanner resolve                    # retry deferred TMDB lookups
+    python -m scanner refresh                    # cache posters, refresh the static export
+
+Started by the API for startup and admin actions (see scanner.process),
+or on its own, e.g. from cron in the API image. The process lowers its
+CPU priority by SCANNER_NICE, prints one JSON result on stdout and logs
+to stderr. A watcher thread captures CPU / memory profiles requested
+through the admin API (see core.profiling).
+
+Exit status: 0 done, 1 failed (traceback on stderr), 2 invalid arguments
+or input, 3 out of date agent manifest, 75 another process holds the
+scan lock (or runs the metadata retries).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from core.config import SCANNER_NICE
+from core.log import setup_logging
+from core.profiling import watch_requests
+from db.init import init_db
+from .ingest import ingest_paths
+from .manifest import ManifestOutOfDate, run_manifest
+from .process import EXIT_BUSY, EXIT_CONFLICT, EXIT_INVALID, EXIT_OK, InvalidInput
+from .resolve import run_resolve
+from .run import run_db_maintenance, run_refresh, run_scan
+
+
+def scan(args) -> dict | None:
+    result = run_scan(rebuild=args.rebuild, scope=args.scope, path=args.path)
+    return {"result": result} if result else None
+
+
+def maintenance(args) -> dict | None:
+    return run_db_maintenance()
+
+
+def _read_json():
+    try:
+        return json.load(sys.stdin.buffer)
+    except ValueError as e:
+        raise InvalidInput(f"Invalid JSON on stdin: {e}") from None
+
+
+def ingest(args) -> dict:
+    paths = _read_json()
+    if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+        raise InvalidInput("Expected a JSON list of paths")
+
+    results = ingest_paths(paths, refresh=not args.no_refresh)
+    return {"results": results} if results is not None else None
+
+
+def manifest(args) -> dict | None:
+    manifest = _read_json()
+    if not isinstance(manifest, dict):
+        raise InvalidInput("Expected a JSON object")
+
+    return run_manifest(manifest)
+
+
+def refresh(args) -> dict | None:
+    return {"result": "complete"} if run_refresh() else None
+
+
+def resolve(args) -> dict | None:
+    counts = run_resolve()
+    return {"counts": counts} if counts is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m scanner", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = commands.add_parser("scan", help="Scan the library (incremental)")
+    scan_parser.add_argument("--scope", default="all", help="all, movies or series")
+    scan_parser.add_argument("--path", help="Movie file or series folder inside the scope")
+    scan_parser.add_argument("--rebuild", action="store_true", help="Clear the library first")
+    scan_parser.set_defaults(run=scan)
+
+    commands.add_parser("maintenance", help="Maintain the database").set_defaults(run=maintenance)
+    ingest_parser = commands.add_parser("ingest", help="Index paths read from stdin")
+    ingest_parser.add_argument(
+        "--no-refresh",
+        action="store_true",
+        help="Leave posters and the static export to a later 'refresh'",
+    )
+    ingest_parser.set_defaults(run=ingest)
+    commands.add_parser("manifest", help="Apply an agent manifest read from stdin").set_defaults(
+        run=manifest
+    )
+    commands.add_parser("resolve", help="Retry deferred metadata lookups").set_defaults(
+        run=resolve
+    )
+    commands.add_parser("refresh", help="Cache posters and refresh the static export").set_defaults(
+        run=refresh
+    )
+
+    args = parser.parse_args()
+
+    # Before any thread starts: new threads inherit the priority
+    if SCANNER_NICE:
+        os.nice(SCANNER_NICE)
+
+    # stdout carries the result
+    setup_logging(sys.stderr)
+    init_db()
+
+    # Profiles requested through the admin API (target=scan)
+    watch_requests(f"scanner {args.command}")
+
+    status = EXIT_OK
+    try:
+        result = args.run(args)
+    except InvalidInput as e:
+        # Only argument and input checks: other errors are failures
+        status, result = EXIT_INVALID, {"detail": str(e)}
+    except ManifestOutOfDate as e:
+        # Tells the agent to resend a full manifest
+        status, result = EXIT_CONFLICT, {
+            "detail": {"error": "manifest_out_of_date", "version": e.version},
+        }
+
+    if result is None:
+        busy = "Metadata retries" if args.command == "resolve" else "Scan"
+        status, result = EXIT_BUSY, {"detail": f"{busy} already running"}
+
+    json.dump(result, sys.stdout)
+    sys.stdout.write("\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
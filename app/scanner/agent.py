@@ -0,0 +1,362 @@
+"""
+Storage-side scan agent.
+
+Walking /media over a network mount is the slowest part of a scan. The
+agent runs on the storage host instead, walks the library on local disk,
+parses file names with the same rules as the API (scanner.naming,
+metadata.local) and pushes a compact manifest to
+`POST /admin/agent/manifest`. The API then only resolves metadata for
+entries it has not seen before.
+
+Manifests are delta-encoded: the agent remembers what it last pushed
+(--state) and only sends new or changed rows plus deleted paths, gzip
+compressed. The first push, and any push after the API reports that the
+agent's base version is out of date (e.g. after a rebuild), is a full
+manifest that replaces the library listing. Rows the API could not index
+(e.g. no TMDB match) are left out of the state, so they are sent again
+with the next delta.
+
+Only the Python standard library is needed:
+
+    cd app
+    python -m scanner.agent --api http://api-host:7000 --token ADMIN_SCAN_TOKEN \\
+        --movies /volume1/media/movies --series /volume1/media/series --interval 300
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+from pathlib import Path
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from metadata.local import SERIES_NFO_NAME, NFO_SUFFIX, local_ids
+from .naming import is_sidecar, parse_episode_filename, parse_movie_filename, season_number
+
+logger = logging.getLogger(__name__)
+
+# Manifest row layouts (shared with scanner.manifest on the API side).
+# Paths are relative to the library folder.
+MOVIE_FIELDS = (
+    "path", "size", "mtime", "inode",
+    "title", "year", "resolution", "imdb_id", "tmdb_id",
+)
+EPISODE_FIELDS = (
+    "path", "size", "mtime", "inode",
+    "season", "file_season", "episode", "resolution",
+)
+
+MANIFEST_ENDPOINT = "/admin/agent/manifest"
+
+
+# ---------------------------------------------------------------------------
+# Walking
+# ---------------------------------------------------------------------------
+
+def walk_movies(root: Path):
+    """
+    Return ({path: row}, skipped) for the movie files directly in root.
+    """
+    rows = {}
+    skipped = 0
+
+    for entry in os.scandir(root):
+        if not entry.is_file() or is_sidecar(entry.name):
+            continue
+
+        parsed = parse_movie_filename(entry.name)
+        if not parsed:
+            skipped += 1
+            continue
+
+        stat = entry.stat()
+        ids = local_ids(entry.name, (root / entry.name).with_suffix(NFO_SUFFIX))
+        title, year, resolution = parsed
+
+        rows[entry.name] = [
+            entry.name, stat.st_size, stat.st_mtime_ns, stat.st_ino,
+            title, year, resolution, ids["imdb_id"], ids["tmdb_id"],
+        ]
+
+    return rows, skipped
+
+
+def walk_series(root: Path):
+    """
+    Return ({path: row}, {series folder: [imdb_id, tmdb_id]}, skipped)
+    for the episode files below root (<series>/Season XX/<file>).
+    """
+    rows = {}
+    series_ids = {}
+    skipped = 0
+
+    for series_dir in os.scandir(root):
+        if not series_dir.is_dir():
+            continue
+
+        ids = local_ids(series_dir.name, Path(series_dir.path) / SERIES_NFO_NAME)
+        series_ids[series_dir.name] = [ids["imdb_id"], ids["tmdb_id"]]
+
+        for season_dir in os.scandir(series_dir.path):
+            if not season_dir.is_dir():
+                continue
+
+            season_num = season_number(Path(season_dir.path))
+            if season_num is None:
+                skipped += 1
+                continue
+
+            for ep_file in os.scandir(season_dir.path):
+                if not ep_file.is_file() or is_sidecar(ep_file.name):
+                    continue
+
+                parsed = parse_episode_filename(ep_file.name)
+                if not parsed:
+                    skipped += 1
+                    continue
+
+                stat = ep_file.stat()
+                file_season, episode, resolution = parsed
+                path = f"{series_dir.name}/{season_dir.name}/{ep_file.name}"
+
+                rows[path] = [
+                    path, stat.st_size, stat.st_mtime_ns, stat.st_ino,
+                    season_num, file_season, episode, resolution,
+                ]
+
+    return rows, series_ids, skipped
+
+
+# ---------------------------------------------------------------------------
+# Manifests
+# ---------------------------------------------------------------------------
+
+def build_manifest(library: str, rows: dict, series_ids: dict, skipped: int, previous):
+    """
+    Build a manifest for one library.
+
+    previous is the state of the last accepted push ({version, rows,
+    series_ids}) or None for a full manifest.
+    """
+    manifest = {
+        "library": library,
+        "fields": MOVIE_FIELDS if library == "movies" else EPISODE_FIELDS,
+        "skipped": skipped,
+    }
+
+    if previous is None:
+        manifest.update(
+            base=None,
+            upsert=list(rows.values()),
+            delete=[],
+            series_ids=series_ids,
+        )
+        return manifest
+
+    # Series whose local IDs changed (tvshow.nfo, folder tags) are re-sent
+    old_ids = previous["series_ids"]
+    changed_series = {name for name, ids in series_ids.items() if old_ids.get(name) != ids}
+
+    old_rows = previous["rows"]
+    upsert = [
+        row
+        for path, row in rows.items()
+        if old_rows.get(path) != row or path.split("/", 1)[0] in changed_series
+    ]
+
+    manifest.update(
+        base=previous["version"],
+        upsert=upsert,
+        delete=[path for path in old_rows if path not in rows],
+        series_ids={
+            name: series_ids[name]
+            for name in {row[0].split("/", 1)[0] for row in upsert}
+            if name in series_ids
+        },
+    )
+    return manifest
+
+
+def push(api: str, token: str, manifest: dict, timeout: float):
+    """
+    POST a gzip-compressed manifest.
+
+    Returns (status, response JSON).
+    """
+    body = gzip.compress(json.dumps(manifest, separators=(",", ":")).encode())
+
+    request = urllib.request.Request(
+        api.rstrip("/") + MANIFEST_ENDPOINT,
+        data=body,
+        method="POST",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        },
+    )
+
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            return resp.status, json.load(resp)
+    except urllib.error.HTTPError as e:
+        try:
+            return e.code, json.load(e)
+        except ValueError:
+            return e.code, {}
+
+
+def sync_library(args, state: dict, library: str, root: Path):
+    """
+    Walk one library and push its manifest. Updates state on success.
+    Returns False when the push failed.
+    """
+    if library == "movies":
+        rows, skipped = walk_movies(root)
+        series_ids = {}
+    else:
+        rows, series_ids, skipped = walk_series(root)
+
+    previous = state.get(library)
+
+    # A full walk that found nothing (e.g. unmounted disk) is not pushed
+    if not rows and previous and previous["rows"]:
+        logger.warning("%s: no files found in %s, skipping push", library, root)
+        return True
+
+    # Empty deltas are still sent: they tell us if the API lost our base
+    # version (e.g. after a rebuild)
+    manifest = build_manifest(library, rows, series_ids, skipped, previous)
+    status, result = push(args.api, args.token, manifest, args.timeout)
+
+    # Base version out of date (first push, rebuild, lost state): send everything
+    if status == 409 and isinstance(result.get("detail"), dict):
+        logger.info("%s: API requested a full manifest", library)
+        manifest = build_manifest(library, rows, series_ids, skipped, None)
+        status, result = push(args.api, args.token, manifest, args.timeout)
+
+    if status != 200:
+        logger.warning("%s: push failed (%s): %s", library, status, result.get("detail", result))
+        return False
+
+    # Rows the API did not index are resent with the next delta
+    not_indexed = set(result.get("skipped") or ())
+    state[library] = {
+        "version": result["version"],
+        "rows": {path: row for path, row in rows.items() if path not in not_indexed},
+        "series_ids": series_ids,
+    }
+
+    if not result["changed"]:
+        logger.info("%s: up to date (version %s)", library, result["version"])
+        return True
+
+    logger.info(
+        "%s: pushed %d upserts, %d deletes, %d not indexed (version %s)",
+        library,
+        len(manifest["upsert"]),
+        len(manifest["delete"]),
+        len(not_indexed),
+        result["version"],
+    )
+    return True
+
+
+def load_state(path: Path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path: Path, state: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--api",
+        default=os.getenv("AGENT_API_URL"),
+        help="API base URL (env: AGENT_API_URL)",
+    )
+    parser.add_argument(
+        "--token",
+        default=os.getenv("ADMIN_SCAN_TOKEN"),
+        help="Admin token (env: ADMIN_SCAN_TOKEN)",
+    )
+    parser.add_argument(
+        "--movies",
+        type=Path,
+        default=os.getenv("AGENT_MOVIES_DIR"),
+        help="Local movies folder (env: AGENT_MOVIES_DIR)",
+    )
+    parser.add_argument(
+        "--series",
+        type=Path,
+        default=os.getenv("AGENT_SERIES_DIR"),
+        help="Local series folder (env: AGENT_SERIES_DIR)",
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        default=os.getenv("AGENT_STATE_PATH", ".scan-agent-state.json"),
+        help="State file of the last push (env: AGENT_STATE_PATH)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=float(os.getenv("AGENT_INTERVAL", "0")),
+        help="Seconds between syncs; 0 syncs once (env: AGENT_INTERVAL)",
+    )
+    parser.add_argument("--timeout", type=float, default=600, help="HTTP timeout in seconds")
+    args = parser.parse_args()
+
+    if not args.api or not args.token or not (args.movies or args.series):
+        parser.error("--api, --token and at least one of --movies / --series are required")
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
+    )
+
+    state = load_state(args.state)
+
+    while True:
+        failed = False
+        for library, root in (("movies", args.movies), ("series", args.series)):
+            if root is None:
+                continue
+
+            if not root.is_dir():
+                logger.warning("%s: directory not found: %s", library, root)
+                failed = True
+                continue
+
+            try:
+                if not sync_library(args, state, library, root):
+                    failed = True
+            except OSError as e:
+                logger.warning("%s: sync failed: %s", library, e)
+                failed = True
+
+        save_state(args.state, state)
+
+        # One-shot runs report failures through the exit status (e.g. for cron)
+        if args.interval <= 0:
+            return 1 if failed else 0
+
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
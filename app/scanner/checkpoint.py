@@ -0,0 +1,220 @@
+"""
+Checkpointed, resumable and cancellable library walks.
+
+A first scan or rebuild of a large library runs for hours. Instead of
+holding everything in one transaction, full movie and series scans walk
+their library folders in name order and commit their progress at least
+every SCAN_CHECKPOINT_SECONDS, together with a cursor per folder: the
+last folder entry fully indexed (see db.scan_repo).
+
+A library can span several folders (MOVIES_ROOTS / SERIES_ROOTS), often
+on different disks. Each folder is listed and read by its own walker
+thread, so the walk takes as long as the slowest disk rather than the
+sum of all of them. Walkers only touch the filesystem; the database
+work (and TMDB lookups) stays on the scanning thread and its single
+connection, so writers never contend for the SQLite lock.
+
+A walk that was interrupted (restart, crash) or cancelled resumes after
+its cursor on the next full scan. Files below the entries it skips count
+as seen, so they are not pruned; the cursor is cleared once a walk
+completes.
+
+Cancel requests are a flag file (SCAN_CANCEL_PATH) rather than a row in
+the database: any worker can set it, and the scanning connection sees it
+immediately instead of only after its next commit.
+"""
+
+import logging
+import os
+from pathlib import Path
+import queue
+import threading
+import time
+
+from core.config import SCAN_CANCEL_PATH, SCAN_CHECKPOINT_SECONDS
+from db.file_repo import get_paths_under
+from db.generation import bump_generation
+from db.scan_repo import clear_scan_cursor, get_scan_cursor, save_scan_cursor
+
+logger = logging.getLogger(__name__)
+
+# Entries each walker may prepare ahead of the scanning thread
+PREPARE_AHEAD = 32
+
+
+def request_cancel():
+    """
+    Ask the running scan to stop after its current folder entry.
+    """
+    Path(SCAN_CANCEL_PATH).touch()
+
+
+def clear_cancel():
+    Path(SCAN_CANCEL_PATH).unlink(missing_ok=True)
+
+
+def cancel_requested() -> bool:
+    return os.path.exists(SCAN_CANCEL_PATH)
+
+
+class LibraryWalk:
+    """
+    One walk over the entries of one or more library folders (scopes).
+
+    Iterate entries() and index each yielded entry; the walk commits
+    checkpoints in between and stops early on a cancel request
+    (cancelled is then True). Call finish() inside the final transaction.
+
+    Only full library walks are resumable; a walk of a single movie file
+    or series folder just honours cancel requests.
+    """
+
+    def __init__(self, conn, library: str, scopes, counts, resumable: bool = True):
+        self.conn = conn
+        self.library = library
+        self.scopes = [Path(scope) for scope in scopes]
+        self.counts = counts
+        self.resumable = resumable
+        # {scope: cursor} of unfinished earlier walks
+        self.cursors = {
+            scope: get_scan_cursor(conn, library, str(scope)) if resumable else None
+            for scope in self.scopes
+        }
+        self.cancelled = False
+        # {scope: last entry name yielded}
+        self._last = {}
+        self._resumed = {}
+        self._next_checkpoint = time.monotonic() + SCAN_CHECKPOINT_SECONDS
+
+    def entries(self, prepare, candidates=None):
+        """
+        Yield (scope, entry, prepared) in the calling thread.
+
+        Each scope is walked in name order by a walker thread, which
+        calls prepare(entry) for the filesystem work of an entry (stat,
+        parsing, sidecar files) and must not use the database. Entries
+        of different scopes are interleaved as they become ready.
+
+        candidates replaces the listing of a single scope (e.g. one movie
+        file).
+        """
+        for scope, cursor in self.cursors.items():
+            if cursor is not None:
+                logger.info("Resuming %s scan of %s after %s", self.library, scope, cursor)
+
+        ready = queue.Queue(maxsize=PREPARE_AHEAD * len(self.scopes))
+        stop = threading.Event()
+        walkers = [
+            threading.Thread(
+                target=self._walk,
+                args=(scope, candidates, prepare, ready, stop),
+                name=f"walk-{self.library}",
+                daemon=True,
+            )
+            for scope in self.scopes
+        ]
+        for walker in walkers:
+            walker.start()
+
+        running = len(walkers)
+        try:
+            while running:
+                scope, entry, prepared = ready.get()
+
+                if entry is None:
+                    # Walker finished; prepared is its error, if any
+                    running -= 1
+                    if self._resumed.get(scope):
+                        self.counts["resumed"] += self._resumed[scope]
+                    if prepared is not None:
+                        raise prepared
+                    continue
+
+                if cancel_requested():
+                    logger.info("Scan of %s cancelled before %s", self.library, entry.name)
+                    self.cancelled = True
+                    return
+
+                yield scope, entry, prepared
+                self._last[scope] = entry.name
+
+                if self.resumable and time.monotonic() >= self._next_checkpoint:
+                    self.checkpoint()
+        finally:
+            stop.set()
+            # Unblock walkers waiting for room in the queue
+            while any(walker.is_alive() for walker in walkers):
+                try:
+                    ready.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    def _walk(self, scope: Path, candidates, prepare, ready, stop):
+        error = None
+        try:
+            cursor = self.cursors[scope]
+            resumed = 0
+
+            if candidates is None:
+                candidates = scope.iterdir()
+
+            for entry in sorted(candidates, key=lambda p: p.name):
+                if stop.is_set():
+                    return
+
+                if cursor is not None and entry.name <= cursor:
+                    resumed += 1
+                    continue
+
+                ready.put((scope, entry, prepare(entry)))
+
+            self._resumed[scope] = resumed
+        except Exception as e:  # re-raised by the scanning thread
+            error = e
+        finally:
+            ready.put((scope, None, error))
+
+    def checkpoint(self):
+        """
+        Commit the progress so far together with the cursors.
+        """
+        for scope, last in self._last.items():
+            save_scan_cursor(self.conn, self.library, str(scope), last)
+
+        # Catalogs fill up while a long scan is running
+        bump_generation(self.conn)
+        self.conn.commit()
+
+        self.counts["checkpoints"] += 1
+        self._next_checkpoint = time.monotonic() + SCAN_CHECKPOINT_SECONDS
+
+    def resumed_paths(self, scope: Path, column: str) -> set:
+        """
+        Return the indexed paths below the entries of scope skipped by a
+        resumed walk (seen for pruning: they were walked by the earlier
+        run).
+        """
+        cursor = self.cursors.get(scope)
+        if cursor is None:
+            return set()
+
+        prefix = str(scope).rstrip("/") + "/"
+        return {
+            path
+            for path in get_paths_under(self.conn, str(scope), column)
+            if path[len(prefix):].split("/", 1)[0] <= cursor
+        }
+
+    def finish(self):
+        """
+        Save the cursors of a cancelled walk or clear them after a
+        complete one.
+        """
+        if not self.resumable:
+            return
+
+        if not self.cancelled:
+            clear_scan_cursor(self.conn, self.library)
+        else:
+            for scope, last in self._last.items():
+                save_scan_cursor(self.conn, self.library, str(scope), last)
@@ -0,0 +1,194 @@
+"""
+Per-item library ingestion.
+
+Indexes individual files or folders (e.g. reported by Sonarr/Radarr
+download webhooks) without walking the whole library. Uses the same
+parse/resolve/upsert logic as the full scanners.
+
+Every path is synchronized with the disk:
+- Existing movie files are indexed
+- Existing episode files, season folders, and series folders are indexed
+  together with their parent series
+- Missing paths are removed from the database (deletes, and the old side
+  of renames)
+- Titles TMDB could not answer for are queued for a metadata retry
+  (see scanner.resolve) and reported as deferred
+
+Ingestion holds the scan lock: a running scan keeps its write
+transaction open for a whole checkpoint, so ingestion would only wait
+for it and fail. Busy callers retry later; the running scan may already
+pick up the paths.
+"""
+
+from collections import Counter
+import logging
+from pathlib import Path
+import time
+
+from core.config import MOVIES_ROOTS
+from core.log import log_summary
+from core.media import find_root
+from core.tracing import traced
+from db.connection import connect
+from db.file_repo import delete_files_under
+from db.generation import bump_generation
+from db.metadata_queue_repo import delete_deferred_under, get_deferred
+from db.series_repo import refresh_episode_added
+from metadata.tmdb import TMDBUnavailable
+from .leader import scan_leader
+from .run import run_refresh
+from .scan_movies import index_movie_file
+from .naming import season_number
+from .scan_series import (
+    defer_series,
+    index_episode_file,
+    index_series,
+    read_episode_entries,
+    read_series_folder,
+    resolve_series,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFERRED_REASON = "TMDB unavailable, metadata lookup queued for retry"
+
+
+def _ingest_movie(conn, path: Path, counts: Counter):
+    if path.parent not in MOVIES_ROOTS:
+        return "skipped", "movies must be placed directly in the movies folder"
+
+    if not index_movie_file(conn, path, counts):
+        return "skipped", "unrecognized movie file or metadata lookup failed"
+
+    if get_deferred(conn, str(path)) is not None:
+        return "deferred", DEFERRED_REASON
+
+    return "indexed", None
+
+
+def _ingest_series(conn, path: Path, root: Path, counts: Counter):
+    parts = path.relative_to(root).parts
+
+    # <series>/
+    if len(parts) == 1 and path.is_dir():
+        if not index_series(conn, path, counts):
+            return "skipped", "no episodes indexed"
+        if get_deferred(conn, str(path)) is not None:
+            return "deferred", DEFERRED_REASON
+        return "indexed", None
+
+    # <series>/Season XX/ or <series>/Season XX/<episode file>
+    if len(parts) not in (2, 3):
+        return "skipped", "path does not match the series folder layout"
+
+    season_dir = path if len(parts) == 2 else path.parent
+    season_num = season_number(season_dir)
+    if season_num is None:
+        return "skipped", "season folder must be named 'Season <number>'"
+
+    series_dir = season_dir.parent
+    try:
+        series_imdb_id = resolve_series(conn, series_dir, counts)
+    except TMDBUnavailable as e:
+        # Queue the whole folder: the series is indexed as one entry
+        read = read_series_folder(series_dir)
+        defer_series(conn, series_dir, read[0], read_episode_entries(read), e, counts)
+        return "deferred", DEFERRED_REASON
+
+    if not series_imdb_id:
+        return "skipped", "series metadata lookup failed"
+
+    ep_files = sorted(season_dir.iterdir()) if len(parts) == 2 else [path]
+    indexed = [f for f in ep_files if index_episode_file(conn, series_imdb_id, season_num, f, counts)]
+
+    if not indexed:
+        return "skipped", "unrecognized episode file"
+
+    return "indexed", None
+
+
+@traced("ingest", root=True)
+def ingest_paths(paths: list[str], refresh: bool = True) -> list[dict] | None:
+    """
+    Synchronize the given library paths with the database if no scan is
+    running.
+
+    Paths must be absolute paths under a movie or series folder.
+    Returns one result dict (path, action, reason) per input path, or
+    None if another process holds the scan lock. With refresh False,
+    posters and the static export are left to the caller (run_refresh).
+    """
+    with scan_leader() as leader:
+        if not leader:
+            return None
+
+        results, changed = _sync_paths(paths)
+
+    if changed and refresh:
+        run_refresh()
+
+    return results
+
+
+def _sync_paths(paths: list[str]) -> tuple[list[dict], bool]:
+    results = []
+
+    conn = connect()
+    changed = False
+    counts = Counter()
+    started = time.monotonic()
+
+    try:
+        for raw in paths:
+            path = Path(raw)
+            root = find_root(path)
+            reason = None
+
+            if not path.is_absolute() or ".." in path.parts:
+                action, reason = "skipped", "path must be absolute and normalized"
+
+            elif root is None:
+                action, reason = "skipped", "path is outside the media library"
+
+            elif path == root:
+                action, reason = "skipped", "use /admin/scan for the whole library"
+
+            elif not path.exists():
+                removed = delete_files_under(conn, str(path))
+                removed += delete_deferred_under(conn, str(path))
+                action = "removed" if removed else "unchanged"
+
+            elif root in MOVIES_ROOTS:
+                action, reason = _ingest_movie(conn, path, counts)
+
+            else:
+                action, reason = _ingest_series(conn, path, root, counts)
+
+            if action in ("indexed", "removed"):
+                changed = True
+
+            logger.info(
+                "Ingest %s: %s",
+                action,
+                path,
+                extra={"fields": {"reason": reason}} if reason else None,
+            )
+            counts[f"paths_{action}"] += 1
+            results.append({"path": str(path), "action": action, "reason": reason})
+
+        # Removed episodes may have been their series' newest one (their
+        # rows stay until the next maintenance run)
+        if counts["paths_removed"]:
+            refresh_episode_added(conn)
+
+        # Let other workers know their caches are stale
+        if changed:
+            bump_generation(conn)
+
+        conn.commit()
+        log_summary(logger, "Ingest complete", counts, started)
+
+    finally:
+        conn.close()
+
+    return results, changed
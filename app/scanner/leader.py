@@ -0,0 +1,73 @@
+"""
+Scan leader election.
+
+When the API runs with several uvicorn workers, every worker executes the
+startup hook and any worker may receive an admin scan request. A scan is
+only allowed in the process holding an exclusive lock on SCAN_LOCK_PATH;
+everyone else skips instead of scanning concurrently.
+
+The lock is an flock() on a file next to the database, so it is released
+automatically by the kernel if the scanning process dies. The leader
+writes its PID into the file, so admin tools can find the scanning
+process (see core.profiling).
+"""
+
+from contextlib import contextmanager
+import fcntl
+import os
+
+from core.config import SCAN_LOCK_PATH
+
+
+@contextmanager
+def scan_leader():
+    """
+    Try to become the scan leader without blocking.
+
+    Yields True if the lock was acquired (the caller may scan), or False
+    if another process currently holds it.
+    """
+    with open(SCAN_LOCK_PATH, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def scan_running() -> bool:
+    """
+    Return True if any process currently holds the scan lock.
+    """
+    with open(SCAN_LOCK_PATH, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return False
+
+
+def scan_leader_pid() -> int | None:
+    """
+    Return the PID of the process holding the scan lock, or None if no
+    scan is running.
+    """
+    if not scan_running():
+        return None
+
+    try:
+        with open(SCAN_LOCK_PATH) as lock_file:
+            return int(lock_file.read())
+    except (OSError, ValueError):  # lock taken, PID not written yet
+        return None
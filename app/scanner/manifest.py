@@ -0,0 +1,314 @@
+"""
+Agent manifest ingestion.
+
+Applies manifests pushed by the storage-side scan agent (scanner.agent)
+to the database, without walking /media: file names arrive already
+parsed, with size, inode and local IDs, so only entries that are not
+indexed yet need metadata resolution (TMDB). Known paths are resolved
+from the database.
+
+Manifests are versioned per library (db.agent_repo):
+- base None: full manifest; files below the library folder that are
+  not listed are pruned
+- base == current version: delta; listed rows are upserted, `delete`
+  paths are removed
+- otherwise ManifestOutOfDate, and the agent resends a full manifest
+
+Empty deltas are cheap version checks: nothing is written.
+
+Results list the upserted paths that were not indexed (`skipped`, e.g.
+no TMDB match). The agent leaves them out of its baseline, so its next
+delta sends them again, like a scan retries such files on every pass.
+"""
+
+from collections import Counter
+from itertools import groupby
+import logging
+from pathlib import PurePosixPath
+import time
+
+from core.config import MOVIES_ROOTS, SERIES_ROOTS
+from core.log import log_summary
+from core.tracing import traced
+from db.agent_repo import get_manifest_version, set_manifest_version
+from db.connection import connect
+from db.file_repo import delete_files_under, prune_files_under
+from db.metadata_queue_repo import delete_deferred_under
+from db.generation import bump_generation
+from db.maintenance import run_maintenance
+from export.static import export_static
+from metadata.tmdb import TMDBUnavailable
+from .posters import cache_posters
+from .agent import EPISODE_FIELDS, MOVIE_FIELDS
+from .leader import scan_leader
+from .process import InvalidInput
+from .scan_movies import store_movie_file
+from .scan_series import defer_series, episode_entry, resolve_series, store_episode_file
+
+logger = logging.getLogger(__name__)
+
+# Agent paths are relative to the first folder of each library
+# (MOVIES_ROOTS / SERIES_ROOTS)
+MOVIES_ROOT = MOVIES_ROOTS[0]
+SERIES_ROOT = SERIES_ROOTS[0]
+
+LIBRARIES = {
+    "movies": (MOVIES_ROOT, MOVIE_FIELDS, "movie_imdb_id"),
+    "series": (SERIES_ROOT, EPISODE_FIELDS, "episode_id"),
+}
+
+
+# Value types of manifest row fields (None: the field is optional)
+INT = (int,)
+STR = (str,)
+FIELD_TYPES = {
+    "size": INT,
+    "mtime": INT + (type(None),),
+    "inode": INT,
+    "title": STR,
+    "year": INT,
+    "resolution": STR + (type(None),),
+    "imdb_id": STR + (type(None),),
+    "tmdb_id": INT + (type(None),),
+    "season": INT,
+    "file_season": INT,
+    "episode": INT,
+}
+
+
+class ManifestOutOfDate(Exception):
+    """
+    The manifest is a delta against a version the API no longer has.
+    """
+
+    def __init__(self, version: int):
+        super().__init__(f"Manifest base is out of date (current version {version})")
+        self.version = version
+
+
+def _valid_path(path, depth: int) -> bool:
+    # Relative, normalized, and exactly as deep as the library layout
+    if not isinstance(path, str):
+        return False
+
+    parts = PurePosixPath(path).parts
+    return len(parts) == depth and ".." not in parts and not path.startswith("/")
+
+
+def _valid_row(row: dict, depth: int) -> bool:
+    if not _valid_path(row["path"], depth):
+        return False
+
+    # bool is an int subclass, but never a valid number here
+    return all(
+        isinstance(value, FIELD_TYPES[field]) and not isinstance(value, bool)
+        for field, value in row.items()
+        if field != "path"
+    )
+
+
+def _seconds(mtime_ns) -> float | None:
+    # Agents send st_mtime_ns
+    return mtime_ns / 1e9 if isinstance(mtime_ns, int) else None
+
+
+def _ids(imdb_id, tmdb_id) -> dict:
+    return {"imdb_id": imdb_id, "tmdb_id": tmdb_id}
+
+
+def _apply_movies(conn, rows, counts) -> set:
+    indexed = set()
+
+    for row in rows:
+        path = MOVIES_ROOT / row["path"]
+        parsed = (row["title"], row["year"], row["resolution"])
+        ids = _ids(row["imdb_id"], row["tmdb_id"])
+
+        if store_movie_file(
+            conn, path, parsed, ids, row["inode"], row["size"], counts, mtime=_seconds(row["mtime"])
+        ):
+            indexed.add(str(path))
+
+    return indexed
+
+
+def _apply_episodes(conn, rows, series_ids, counts) -> set:
+    indexed = set()
+
+    def folder(row):
+        return row["path"].split("/", 1)[0]
+
+    for name, group in groupby(sorted(rows, key=folder), key=folder):
+        group = list(group)
+        series_dir = SERIES_ROOT / name
+
+        ids = _ids(*(series_ids.get(name) or (None, None)))
+
+        try:
+            series_imdb_id = resolve_series(
+                conn,
+                series_dir,
+                counts,
+                ids=ids,
+                file_stats=[(row["inode"], row["size"], None) for row in group],
+            )
+        except TMDBUnavailable as e:
+            entries = [
+                episode_entry(
+                    SERIES_ROOT / row["path"],
+                    row["season"],
+                    (row["file_season"], row["episode"], row["resolution"]),
+                    row["inode"],
+                    row["size"],
+                    _seconds(row["mtime"]),
+                )
+                for row in group
+            ]
+            indexed.update(defer_series(conn, series_dir, ids, entries, e, counts))
+            continue
+
+        if not series_imdb_id:
+            continue
+
+        for row in group:
+            path = SERIES_ROOT / row["path"]
+            parsed = (row["file_season"], row["episode"], row["resolution"])
+
+            if store_episode_file(
+                conn,
+                series_imdb_id,
+                row["season"],
+                path,
+                parsed,
+                row["inode"],
+                row["size"],
+                counts,
+                mtime=_seconds(row["mtime"]),
+            ):
+                indexed.add(str(path))
+
+    return indexed
+
+
+def apply_manifest(manifest: dict) -> dict:
+    """
+    Apply one agent manifest and return {library, version, changed,
+    counts, skipped}.
+
+    Raises InvalidInput (a ValueError) for malformed manifests and
+    ManifestOutOfDate when a delta does not match the stored version.
+    """
+    library = manifest.get("library")
+    if library not in LIBRARIES:
+        raise InvalidInput(f"Unknown library: {library}")
+
+    root, fields, column = LIBRARIES[library]
+    if tuple(manifest.get("fields") or ()) != fields:
+        raise InvalidInput(f"Unsupported manifest fields for {library}")
+
+    skipped = manifest.get("skipped") or 0
+    if not isinstance(skipped, int):
+        raise InvalidInput("skipped must be an integer")
+
+    depth = 1 if library == "movies" else 3
+    counts = Counter(agent_skipped=skipped)
+    started = time.monotonic()
+
+    rows = []
+    for values in manifest.get("upsert") or []:
+        if not isinstance(values, list) or len(values) != len(fields):
+            counts["invalid"] += 1
+            continue
+
+        row = dict(zip(fields, values))
+        if _valid_row(row, depth):
+            rows.append(row)
+        else:
+            counts["invalid"] += 1
+
+    deletes = [p for p in manifest.get("delete") or [] if _valid_path(p, depth)]
+
+    conn = connect()
+    try:
+        version = get_manifest_version(conn, library)
+        base = manifest.get("base")
+
+        if base is not None and base != version:
+            raise ManifestOutOfDate(version)
+
+        if base is not None and not rows and not deletes:
+            return {
+                "library": library,
+                "version": version,
+                "changed": False,
+                "counts": dict(counts),
+                "skipped": [],
+            }
+
+        if library == "movies":
+            indexed = _apply_movies(conn, rows, counts)
+        else:
+            indexed = _apply_episodes(conn, rows, manifest.get("series_ids") or {}, counts)
+
+        if base is None:
+            # Full listing: prune everything else (an empty listing, e.g.
+            # from an unmounted disk, keeps the existing records)
+            if indexed:
+                counts["removed"] += prune_files_under(conn, str(root), indexed, column)
+        else:
+            for path in deletes:
+                counts["removed"] += delete_files_under(conn, str(root / path))
+                delete_deferred_under(conn, str(root / path))
+
+        # Let other workers know their caches are stale
+        bump_generation(conn)
+
+        version += 1
+        set_manifest_version(conn, library, version)
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Rows the agent should send again (relative paths, as received)
+    skipped = [row["path"] for row in rows if str(root / row["path"]) not in indexed]
+
+    log_summary(
+        logger,
+        "Agent manifest applied",
+        counts,
+        started,
+        library=library,
+        full=base is None,
+        version=version,
+    )
+
+    return {
+        "library": library,
+        "version": version,
+        "changed": True,
+        "counts": dict(counts),
+        "skipped": skipped,
+    }
+
+
+@traced("agent.manifest", root=True)
+def run_manifest(manifest: dict) -> dict | None:
+    """
+    Apply an agent manifest if no scan is running, then maintain the
+    database and refresh the static export (like run_scan).
+
+    Returns the apply_manifest result, or None if another process holds
+    the scan lock.
+    """
+    with scan_leader() as leader:
+        if not leader:
+            return None
+
+        result = apply_manifest(manifest)
+
+        if result["changed"]:
+            cache_posters()
+            run_maintenance()
+            export_static()
+
+        return result
@@ -0,0 +1,121 @@
+"""
+Media naming rules.
+
+Pure filename / folder name parsing shared by the scanners, per-item
+ingestion and the storage-side scan agent (scanner.agent). This module
+must stay free of configuration, database and network imports so the
+agent can run on the storage host with nothing but the standard library.
+"""
+
+from pathlib import Path
+import re
+
+from metadata.local import NFO_SUFFIX, strip_id_tags
+
+
+# ---------------------------------------------------------------------------
+# Movies
+# ---------------------------------------------------------------------------
+
+# Expected filename format:
+#   Movie Title (YYYY) [1080p].ext
+MOVIE_PATTERN = re.compile(
+    r"""
+    ^(?P<title>.+?)            # Movie title
+    \s*\( (?P<year>\d{4}) \)   # Year in parentheses
+    (?:\s*\[(?P<res>\d+p)\])?  # Optional [1080p]
+    \.\w+$                     # File extension
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+
+
+# ---------------------------------------------------------------------------
+# Series
+# ---------------------------------------------------------------------------
+
+# Expected season folder format:
+#   Season 01
+SEASON_PATTERN = re.compile(r"Season\s+(?P<season>\d+)", re.IGNORECASE)
+
+# Episode identity: find SxEx anywhere in filename
+EPISODE_SE_PATTERN = re.compile(
+    r"""
+    S(?P<season>\d{1,2})
+    E(?P<episode>\d{1,2})
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# Resolution tokens (optional metadata, anywhere in filename)
+RESOLUTION_PATTERN = re.compile(
+    r"""
+    (?P<res>
+        240p | 360p | 480p | 576p | 720p | 900p |
+        1080p | 1440p | 2160p | 4320p |
+        480i | 576i | 1080i |
+        2K | 4K | 8K
+    )
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def is_sidecar(filename: str) -> bool:
+    """
+    Return True for metadata sidecar files, which are never media files.
+    """
+    return filename.lower().endswith(NFO_SUFFIX)
+
+
+def parse_movie_filename(filename: str):
+    """
+    Extract title, year, and optional resolution from a movie filename.
+
+    ID tags ({imdb-tt...}, [tmdbid-...]) are not part of the title.
+
+    Returns:
+        (title: str, year: int, resolution: str | None)
+        or None if the filename does not match the naming rules.
+    """
+    match = MOVIE_PATTERN.match(strip_id_tags(filename))
+    if not match:
+        return None
+
+    return match.group("title"), int(match.group("year")), match.group("res")
+
+
+def parse_episode_filename(filename: str):
+    """
+    Extract season, episode, and optional resolution from an episode filename.
+
+    Returns:
+        (season_from_file: int, episode: int, resolution: str | None)
+        or None if no SxEx pattern is found.
+    """
+    se_match = EPISODE_SE_PATTERN.search(filename)
+    if not se_match:
+        return None
+
+    season_from_file = int(se_match.group("season"))
+    episode = int(se_match.group("episode"))
+
+    res_match = RESOLUTION_PATTERN.search(filename)
+    resolution = res_match.group("res") if res_match else None
+
+    return season_from_file, episode, resolution
+
+
+def season_number(season_dir: Path):
+    """
+    Return the season number of a `Season XX` folder, or None.
+    """
+    season_match = SEASON_PATTERN.match(season_dir.name)
+    if not season_match:
+        return None
+
+    return int(season_match.group("season"))
@@ -0,0 +1,182 @@
+"""
+Poster cache filler.
+
+Downloads the posters of all indexed titles that are not cached yet and
+stores them with their resized variants (layout and lookups: see
+metadata.posters). Runs after scans, in the scanner process.
+
+Resizing needs Pillow. Without it, only the original is stored and
+served for every variant.
+
+Posters that fail to download are retried after RETRY_SECONDS, not on
+every scan.
+"""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+import io
+import logging
+import os
+from pathlib import Path
+import time
+
+import requests
+
+from core.config import POSTER_CACHE_DIR, POSTER_ORIGIN
+from core.log import log_summary
+from core.tracing import span, traced
+from db.connection import connect
+from db.generation import bump_generation
+from metadata.posters import ENABLED, IMDB_ID_PATTERN, ORIGINAL, VARIANTS
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+JPEG_QUALITY = 85
+
+# Parallel downloads while filling the cache
+FETCH_WORKERS = 4
+FETCH_TIMEOUT = 10
+
+# Failed downloads are retried after this many seconds
+RETRY_SECONDS = 24 * 3600
+FAILED_MARKER = ".failed"
+
+
+def _origin_url(imdb_id: str, poster_url: str | None) -> str | None:
+    # POSTER_ORIGIN replaces the stored URL, e.g. for a mirror or a stub
+    if POSTER_ORIGIN:
+        return POSTER_ORIGIN.format(imdb_id=imdb_id)
+    return poster_url
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _resize(original: bytes, width: int) -> bytes:
+    with Image.open(io.BytesIO(original)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((width, width * 3), Image.LANCZOS)
+
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        return out.getvalue()
+
+
+def _needs_fetch(folder: Path) -> bool:
+    if (folder / f"{ORIGINAL}.jpg").is_file():
+        return False
+
+    marker = folder / FAILED_MARKER
+    try:
+        return time.time() - marker.stat().st_mtime >= RETRY_SECONDS
+    except FileNotFoundError:
+        return True
+
+
+def fetch_poster(imdb_id: str, url: str) -> bool:
+    """
+    Download one poster and store it with its resized variants.
+
+    Returns True if the poster was stored.
+    """
+    folder = Path(POSTER_CACHE_DIR) / imdb_id
+    folder.mkdir(parents=True, exist_ok=True)
+
+    with span("poster.fetch", imdb_id=imdb_id):
+        try:
+            resp = requests.get(url, timeout=FETCH_TIMEOUT)
+            resp.raise_for_status()
+            original = resp.content
+        except requests.exceptions.RequestException as e:
+            logger.warning("Poster download failed for %s: %s", imdb_id, e)
+            (folder / FAILED_MARKER).touch()
+            return False
+
+    if Image is not None:
+        try:
+            for variant, width in VARIANTS.items():
+                _write_atomic(folder / f"{variant}.jpg", _resize(original, width))
+        except (OSError, ValueError) as e:
+            # Not an image (e.g. an HTML error page): retry later
+            logger.warning("Poster for %s is not a valid image: %s", imdb_id, e)
+            (folder / FAILED_MARKER).touch()
+            return False
+
+    # Written last: its presence marks the poster as complete
+    _write_atomic(folder / f"{ORIGINAL}.jpg", original)
+    (folder / FAILED_MARKER).unlink(missing_ok=True)
+
+    logger.debug("Cached poster for %s", imdb_id)
+    return True
+
+
+@traced("posters.cache")
+def cache_posters() -> Counter:
+    """
+    Fetch the posters of all movies and series that are not cached yet.
+
+    When new posters were stored, the library generation is bumped so
+    catalogs switch to the local URLs. Returns the counters.
+    """
+    counts = Counter()
+    if not ENABLED:
+        return counts
+
+    started = time.monotonic()
+
+    conn = connect()
+    try:
+        rows = conn.execute(
+            """
+            SELECT imdb_id, poster_url FROM movies
+            UNION
+            SELECT imdb_id, poster_url FROM series
+            """
+        ).fetchall()
+    finally:
+        conn.close()
+
+    root = Path(POSTER_CACHE_DIR)
+    pending = []
+
+    for imdb_id, poster_url in rows:
+        url = _origin_url(imdb_id, poster_url)
+        if not url or not IMDB_ID_PATTERN.fullmatch(imdb_id):
+            counts["no_poster"] += 1
+        elif _needs_fetch(root / imdb_id):
+            pending.append((imdb_id, url))
+        else:
+            counts["cached"] += 1
+
+    if not pending:
+        return counts
+
+    if Image is None:
+        logger.warning("Pillow is not installed; posters are cached without resizing")
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="posters") as pool:
+        # copy_context keeps the downloads inside the current trace
+        futures = [pool.submit(copy_context().run, fetch_poster, *item) for item in pending]
+        for future in futures:
+            counts["fetched" if future.result() else "failed"] += 1
+
+    # Let workers reload their catalogs with the local URLs
+    if counts["fetched"]:
+        conn = connect()
+        try:
+            bump_generation(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    log_summary(logger, "Poster cache updated", counts, started)
+    return counts
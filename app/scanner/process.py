@@ -0,0 +1,181 @@
+"""
+Scanner process launcher.
+
+Scans, ingestion, agent manifests and maintenance run in a separate
+process (`python -m scanner`, see scanner.__main__) instead of inside the
+API workers. Their CPU work (file name parsing, JSON, SQLite writes) no
+longer competes with request handlers for the GIL, the process runs at a
+lower CPU priority (SCANNER_NICE), and the API never imports the TMDB
+client or Pillow.
+
+The API and the scanner only share the database: the scanner commits
+its changes and bumps the library generation, which each worker's
+snapshot thread picks up (see db.snapshot). The process exiting is the
+completion signal; its result is one JSON object on stdout, its logs go
+to stderr (the container log).
+
+Deferred metadata lookups (see scanner.resolve) are retried by the same
+process, started by a timer thread in each API worker whenever entries
+are due (start_retries).
+
+Only the standard library and the database layer are imported here.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+from db.connection import connect
+from db.metadata_queue_repo import next_retry_at
+
+logger = logging.getLogger(__name__)
+
+# Top-level packages (core, db, ...) are imported relative to app/
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# How often API workers check for due metadata retries
+RETRY_POLL_SECONDS = 30
+
+# Exit statuses of `python -m scanner`
+EXIT_OK = 0
+EXIT_INVALID = 2  # invalid arguments or input; result {"detail": ...}
+EXIT_CONFLICT = 3  # input does not match the library state; result {"detail": ...}
+EXIT_BUSY = os.EX_TEMPFAIL  # another process holds the scan lock
+
+
+class InvalidInput(ValueError):
+    """
+    Invalid arguments or input of a scanner command (EXIT_INVALID).
+
+    Other ValueErrors raised while a command runs are failures, not
+    invalid input.
+    """
+
+
+class ScannerConflict(Exception):
+    """
+    The scanner rejected its input for the current library state (e.g.
+    an out of date agent manifest). `detail` is the structured reason.
+    """
+
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class ScannerFailed(RuntimeError):
+    """
+    The scanner process crashed or exited without a result.
+    """
+
+
+def _command(args) -> list[str]:
+    return [sys.executable, "-m", "scanner", *args]
+
+
+def _result(args, returncode: int, stdout: bytes) -> dict | None:
+    if returncode == EXIT_BUSY:
+        return None
+
+    try:
+        result = json.loads(stdout)
+    except ValueError:
+        result = None
+
+    if not isinstance(result, dict) or returncode not in (EXIT_OK, EXIT_INVALID, EXIT_CONFLICT):
+        raise ScannerFailed(f"Scanner {args[0]} exited with status {returncode}")
+
+    if returncode == EXIT_INVALID:
+        raise ValueError(result.get("detail"))
+
+    if returncode == EXIT_CONFLICT:
+        raise ScannerConflict(result.get("detail"))
+
+    return result
+
+
+async def run_scanner(*args: str, input: bytes | None = None) -> dict | None:
+    """
+    Run one scanner command and wait for its result without blocking
+    the event loop. `input` is passed on stdin.
+
+    Returns the result, or None if another process holds the scan lock.
+    Raises ValueError for invalid input, ScannerConflict and
+    ScannerFailed.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *_command(args),
+        cwd=APP_DIR,
+        stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+    stdout, _ = await proc.communicate(input)
+
+    return _result(args, proc.returncode, stdout)
+
+
+def start_scanner(*args: str):
+    """
+    Start a scanner command in the background (e.g. the startup scan).
+
+    A daemon thread waits for the process; failures are logged, the
+    scanner logs everything else itself.
+    """
+    proc = subprocess.Popen(
+        _command(args),
+        cwd=APP_DIR,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+    )
+
+    def wait():
+        stdout, _ = proc.communicate()
+        try:
+            _result(args, proc.returncode, stdout)
+        except (ValueError, ScannerConflict, ScannerFailed) as e:
+            logger.error("Background %s failed: %s", args[0], e)
+
+    threading.Thread(target=wait, name="scanner", daemon=True).start()
+
+
+def _run_due_retries(conn):
+    due = next_retry_at(conn)
+    if due is None or due > time.time():
+        return
+
+    # With several workers, all but one exit right away (resolver lock)
+    proc = subprocess.run(
+        _command(["resolve"]),
+        cwd=APP_DIR,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+    )
+    _result(["resolve"], proc.returncode, proc.stdout)
+
+
+def start_retries():
+    """
+    Start a daemon thread that runs `python -m scanner resolve` whenever
+    deferred metadata lookups are due.
+    """
+
+    def poll():
+        conn = connect()
+        try:
+            while True:
+                time.sleep(RETRY_POLL_SECONDS)
+                try:
+                    _run_due_retries(conn)
+                except (sqlite3.Error, ValueError, ScannerConflict, ScannerFailed) as e:
+                    logger.error("Metadata retries failed: %s", e)
+        finally:
+            conn.close()
+
+    threading.Thread(target=poll, name="metadata-retries", daemon=True).start()
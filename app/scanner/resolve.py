@@ -0,0 +1,211 @@
+"""
+Deferred metadata resolution.
+
+Scans don't wait for TMDB. When it cannot answer (timeouts, connection
+errors, 429 / 5xx responses), movie files and series folders are queued
+in metadata_queue together with everything needed to index them (see
+db.metadata_queue_repo), and the scan moves on. After a failure the
+scanner stops asking TMDB for METADATA_RETRY_SECONDS (see metadata.tmdb),
+so an outage costs a scan one timeout instead of one per title.
+
+`python -m scanner resolve` retries the entries that are due, at most
+TMDB_RATE requests per second, indexes the files of resolved entries and
+bumps the library generation. The API starts it whenever entries are due
+(see scanner.process.start_retries):
+
+- TMDB still unavailable: the run stops, and every due entry is retried
+  after twice its last delay (METADATA_RETRY_SECONDS up to
+  METADATA_RETRY_MAX_SECONDS). Nothing is due until then, so the API
+  does not start the worker and TMDB is not contacted meanwhile
+- No match: the entry is dropped; the next scan looks it up again, like
+  any unresolved file
+
+The worker holds RESOLVE_LOCK_PATH instead of the scan lock, so it runs
+alongside scans. Queued files count as seen when scans prune, so files
+indexed by the worker while a scan is running are kept. Files deleted
+while queued are indexed anyway and pruned by the next full scan or
+agent manifest (the worker may not see the media folders).
+
+Posters and the static export are refreshed under the scan lock, like
+after scans. While another process holds it, they are left to that
+process: scans and changed agent manifests refresh both when they end,
+maintenance runs refresh the export.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+import fcntl
+import logging
+from pathlib import Path
+import sqlite3
+import time
+
+from core.config import RESOLVE_LOCK_PATH, TMDB_RATE
+from core.log import log_summary
+from core.tracing import traced
+from db.connection import connect
+from db.generation import bump_generation
+from db.metadata_queue_repo import due_lookups, remove_deferred, retry_due_later
+from db.movie_repo import upsert_movie
+from db.series_repo import upsert_series
+from metadata.tmdb import TMDBUnavailable
+from .run import run_refresh
+from .scan_movies import add_movie_file, fetch_movie
+from .scan_series import fetch_series, store_episode_file
+
+logger = logging.getLogger(__name__)
+
+# TMDB requests of one lookup at most (search + details)
+LOOKUP_REQUESTS = 2
+
+# Entries read from the queue at a time
+BATCH_SIZE = 100
+
+
+@contextmanager
+def resolver_lock():
+    """
+    Yield True if this process may run the retry worker, False if
+    another process is running it.
+    """
+    with open(RESOLVE_LOCK_PATH, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _index_movie(conn, entry: dict, meta: dict, counts: Counter):
+    upsert_movie(conn, meta)
+
+    for file in entry["files"]:
+        add_movie_file(
+            conn,
+            meta["imdb_id"],
+            Path(file["path"]),
+            file["resolution"],
+            file["size"],
+            file["inode"],
+            counts,
+            mtime=file["mtime"],
+            # Entries queued before files had a device
+            dev=file.get("dev"),
+        )
+
+
+def _index_series(conn, entry: dict, meta: dict, counts: Counter):
+    upsert_series(conn, meta)
+
+    for file in entry["files"]:
+        store_episode_file(
+            conn,
+            meta["imdb_id"],
+            file["season"],
+            Path(file["path"]),
+            (file["file_season"], file["episode"], file["resolution"]),
+            file["inode"],
+            file["size"],
+            counts,
+            mtime=file["mtime"],
+            dev=file.get("dev"),
+        )
+
+
+def resolve_entry(conn, entry: dict, counts: Counter) -> bool:
+    """
+    Retry the lookup of one queued entry and index its files.
+
+    Returns False if TMDB is still unavailable (all due entries are
+    rescheduled), True otherwise.
+    """
+    path = entry["path"]
+
+    try:
+        if entry["library"] == "movies":
+            meta = fetch_movie(entry["title"], entry["year"], entry["ids"], counts)
+        else:
+            meta = fetch_series(entry["title"], entry["ids"], counts)
+    except TMDBUnavailable as e:
+        counts["retried_later"] += retry_due_later(conn, int(time.time()), str(e))
+        return False
+
+    remove_deferred(conn, path)
+
+    if not meta:
+        logger.warning("TMDB lookup failed: %s", entry["title"])
+        counts["unresolved"] += 1
+        return True
+
+    if entry["library"] == "movies":
+        _index_movie(conn, entry, meta, counts)
+    else:
+        _index_series(conn, entry, meta, counts)
+
+    counts["resolved"] += 1
+    return True
+
+
+@traced("resolve", root=True)
+def run_resolve() -> dict | None:
+    """
+    Retry all due metadata lookups unless another process is doing so.
+
+    Each entry is committed on its own, so scans only wait for one entry
+    at a time; catalogs are refreshed after each batch. Returns the
+    counters, or None if the worker is already running.
+    """
+    with resolver_lock() as acquired:
+        if not acquired:
+            return None
+
+        counts = Counter()
+        started = time.monotonic()
+        interval = LOOKUP_REQUESTS / TMDB_RATE if TMDB_RATE > 0 else 0
+        next_lookup = started
+
+        conn = connect()
+        try:
+            available = True
+            while available:
+                entries = due_lookups(conn, int(time.time()), BATCH_SIZE)
+                if not entries:
+                    break
+
+                resolved = counts["resolved"]
+
+                for entry in entries:
+                    # Stay below the TMDB rate limit
+                    time.sleep(max(0.0, next_lookup - time.monotonic()))
+                    next_lookup = time.monotonic() + interval
+
+                    available = resolve_entry(conn, entry, counts)
+                    conn.commit()
+
+                    if not available:
+                        break
+
+                if counts["resolved"] > resolved:
+                    # Let other workers know their caches are stale
+                    bump_generation(conn)
+                    conn.commit()
+
+            log_summary(logger, "Metadata retries complete", counts, started)
+
+        except sqlite3.OperationalError as e:
+            # The database stayed locked (e.g. by a scan); the next run
+            # continues with the remaining entries
+            logger.warning("Metadata retries interrupted: %s", e)
+
+        finally:
+            conn.close()
+
+    if counts["resolved"] and run_refresh() is None:
+        logger.info("Scan lock held by another process, leaving posters and export to it")
+
+    return dict(counts)
@@ -0,0 +1,177 @@
+"""
+Library scan entry point shared by startup and admin actions.
+
+Wraps the movie and series scanners with leader election so only one
+process scans at a time, regardless of the number of uvicorn workers.
+
+After each scan, posters of new titles are cached (see scanner.posters),
+the database is maintained (orphan cleanup, statistics, vacuum, WAL
+checkpoint; see db.maintenance) and the internal addon is re-exported as
+static files (see export.static).
+
+Scans can be limited to one library (movies or series) or to a single
+movie file / series folder, in which case only that subtree is walked
+and pruned.
+
+Full scans commit in checkpoints, resume interrupted walks and can be
+cancelled from another process (see scanner.checkpoint).
+"""
+
+import logging
+from pathlib import Path
+
+from core.config import MOVIES_ROOTS, SERIES_ROOTS
+from core.tracing import traced
+from db.agent_repo import reset_manifest_versions
+from db.connection import connect
+from db.generation import bump_generation
+from db.metadata_queue_repo import clear_deferred
+from db.scan_repo import clear_scan_cursors
+from db.maintenance import run_maintenance
+from export.static import export_static
+from .posters import cache_posters
+from .checkpoint import clear_cancel
+from .leader import scan_leader
+from .process import InvalidInput
+from .scan_movies import scan_movies
+from .scan_series import scan_series
+
+logger = logging.getLogger(__name__)
+
+# Supported scan scopes
+SCAN_SCOPES = ("all", "movies", "series")
+
+
+def scope_path(scope: str, path: str | None):
+    """
+    Validate a scan scope and resolve its optional target path.
+
+    Path may be relative to one of the scope's media folders (e.g.
+    "Flash Gordon") or absolute, and must name a direct child of that
+    folder: a movie file or a series folder. It does not have to exist; a
+    missing target prunes its records. A relative path that exists in
+    none of the folders refers to the first one.
+
+    Returns the resolved Path, or None for a whole-library scope.
+    Raises InvalidInput (a ValueError) for invalid input.
+    """
+    if scope not in SCAN_SCOPES:
+        raise InvalidInput(f"Unknown scan scope: {scope}")
+
+    if not path:
+        return None
+
+    if scope == "all":
+        raise InvalidInput("A path requires the 'movies' or 'series' scope")
+
+    roots = MOVIES_ROOTS if scope == "movies" else SERIES_ROOTS
+    targets = [root / path for root in roots]
+    target = next((t for t in targets if t.exists()), targets[0])
+
+    if ".." in Path(path).parts or target.parent not in roots:
+        kind = "movie file" if scope == "movies" else "series folder"
+        folders = ", ".join(str(root) for root in roots)
+        raise InvalidInput(f"Path must be a {kind} directly inside {folders}")
+
+    return target
+
+
+@traced("scan", root=True)
+def run_scan(rebuild: bool = False, scope: str = "all", path: str | None = None) -> str | None:
+    """
+    Scan the library if no other process is scanning.
+
+    scope limits the scan to "movies" or "series"; path further limits it
+    to one movie file or series folder (see scope_path). When rebuild is
+    True, all library tables are cleared first and the whole library is
+    scanned.
+
+    Returns "complete" or "cancelled", or None if another process holds
+    the scan lock. Raises ValueError for an invalid scope or path.
+    """
+    target = scope_path(scope, path)
+
+    with scan_leader() as leader:
+        if not leader:
+            logger.info("Scan already running in another process, skipping")
+            return None
+
+        # A request that arrived after the previous scan ended
+        clear_cancel()
+
+        if rebuild:
+            with connect() as conn:
+                conn.execute("DELETE FROM files")
+                conn.execute("DELETE FROM episodes")
+                conn.execute("DELETE FROM series")
+                conn.execute("DELETE FROM movies")
+                # Agents must resend full manifests
+                reset_manifest_versions(conn)
+                clear_scan_cursors(conn)
+                clear_deferred(conn)
+                bump_generation(conn)
+                conn.commit()
+
+        completed = True
+
+        if scope in ("all", "movies"):
+            completed = scan_movies(target)
+
+        if completed and scope in ("all", "series"):
+            completed = scan_series(target)
+
+        if not completed:
+            clear_cancel()
+            # Posters and maintenance are left to the resumed scan; the
+            # export is refreshed to match the committed progress
+            export_static()
+            return "cancelled"
+
+        # Download posters of new titles (if the poster cache is enabled)
+        cache_posters()
+
+        # Rebuilds replace every row: refresh all planner statistics
+        run_maintenance(analyze=rebuild)
+
+        # Render the internal addon for the proxy (if enabled)
+        export_static()
+
+        return "complete"
+
+
+@traced("maintenance", root=True)
+def run_db_maintenance() -> dict | None:
+    """
+    Run database maintenance on demand if no scan is running.
+
+    Returns the maintenance report, or None if another process holds the
+    scan lock.
+    """
+    with scan_leader() as leader:
+        if not leader:
+            return None
+
+        report = run_maintenance(analyze=True)
+
+        # Orphan cleanup may have changed the catalogs
+        export_static()
+
+        return report
+
+
+def run_refresh() -> bool | None:
+    """
+    Cache new posters and refresh the static export if no scan is
+    running (e.g. after ingestion or metadata retries).
+
+    Returns True, or None if another process holds the scan lock; scans,
+    changed agent manifests and maintenance refresh the export themselves
+    when they end.
+    """
+    with scan_leader() as leader:
+        if not leader:
+            return None
+
+        cache_posters()
+        export_static()
+        return True
@@ -1,106 +1,339 @@
 """
 Movie filesystem scanner.
 
-This module scans the movies directory, resolves metadata via TMDB,
-and synchronizes movie and file records into the SQLite database.
+This module scans the movie folders (MOVIES_ROOTS), resolves metadata
+via local IDs (NFO sidecars / ID tags) or TMDB, and synchronizes movie
+and file records into the SQLite database. Files TMDB could not answer
+for are queued for a retry (see scanner.resolve).
 """
 
+from collections import Counter
+import logging
 from pathlib import Path
-import re
-import sqlite3
+import time
 
-from core.config import MOVIES_DIR_NAME
-from metadata.tmdb import lookup_movie
-from db.movie_repo import upsert_movie, upsert_movie_file
+from core.config import MOVIES_ROOTS
+from core.log import log_summary
+from core.tracing import span, traced
+from metadata.tmdb import TMDBUnavailable, lookup_movie, lookup_movie_by_id
+from metadata.local import NFO_SUFFIX, local_ids
+from db.connection import connect
+from db.metadata_queue_repo import defer_lookup, get_deferred
+from db.movie_repo import mark_movie_added, upsert_movie, upsert_movie_file, movie_exists
+from db.file_repo import get_file, find_moved_file, move_file, prune_files_under
+from db.generation import bump_generation
+from .checkpoint import LibraryWalk
+from .naming import is_sidecar, parse_movie_filename
 
-# Root directory for movie files (mounted volume)
-MOVIES_ROOT = Path("/media") / MOVIES_DIR_NAME
+logger = logging.getLogger(__name__)
 
-# SQLite database location
-DB_PATH = "/data/library.db"
 
-# Expected filename format:
-#   Movie Title (YYYY) [1080p].ext
-MOVIE_PATTERN = re.compile(
-    r"""
-    ^(?P<title>.+?)            # Movie title
-    \s*\( (?P<year>\d{4}) \)   # Year in parentheses
-    (?:\s*\[(?P<res>\d+p)\])?  # Optional [1080p]
-    \.\w+$                     # File extension
-    """,
-    re.VERBOSE | re.IGNORECASE,
-)
+def known_movie(conn, path: Path, inode: int, size: int, counts: Counter, dev=None):
+    """
+    Return the IMDb ID already associated with a movie file, or None.
+
+    A file is known if its path is indexed, or if it is a renamed/moved
+    copy (same inode, size and device) of an indexed file whose old path
+    vanished.
+    Moved records are updated in place, keeping their metadata.
+    """
+    row = get_file(conn, str(path))
+    if row and row[1]:
+        return row[1]
+
+    moved = find_moved_file(conn, inode, size, dev)
+    if moved and moved[2]:
+        logger.debug("Moved: %s -> %s", moved[1], path)
+        counts["moved"] += 1
+        move_file(conn, moved[0], str(path))
+        return moved[2]
+
+    return None
 
 
-def scan_movies():
+def resolve_movie(
+    conn,
+    path: Path,
+    title: str,
+    year: int,
+    ids: dict,
+    inode: int,
+    size: int,
+    counts: Counter,
+    dev: int | None = None,
+):
     """
-    Scan the movie directory and synchronize database records.
+    Resolve a movie file to an IMDb ID, upserting its metadata if needed.
 
-    - Discovers movie files on disk
-    - Looks up metadata via TMDB
-    - Inserts or updates movie and file records
-    - Removes database entries for files no longer present
+    Resolution order:
+    1) Already indexed (same path, or renamed/moved file): no network calls
+    2) Local IDs (filename tags, `<movie file>.nfo`) already in the
+       database: no network calls
+    3) Local IDs not yet in the database: a single TMDB details request
+    4) TMDB title search (search + details)
+
+    Files queued for a metadata retry are not looked up again.
+
+    ids are the local IDs ({imdb_id, tmdb_id}, see metadata.local). A
+    local IMDb ID that differs from the indexed one wins, so adding an ID
+    tag or NFO fixes a misidentified movie on the next scan.
+
+    Returns the IMDb ID, or None if the movie could not be resolved.
+    Raises TMDBUnavailable if TMDB could not answer or the file is queued.
+    """
+    known_id = known_movie(conn, path, inode, size, counts, dev)
+    if known_id and ids["imdb_id"] in (None, known_id):
+        return known_id
+
+    if ids["imdb_id"] and movie_exists(conn, ids["imdb_id"]):
+        return ids["imdb_id"]
+
+    # Queued for a retry: scans leave the lookup to scanner.resolve
+    if get_deferred(conn, str(path)) is not None:
+        raise TMDBUnavailable("queued for a metadata retry")
+
+    meta = fetch_movie(title, year, ids, counts)
+    if not meta:
+        logger.warning("TMDB lookup failed: %s", title)
+        counts["unresolved"] += 1
+        return None
+
+    upsert_movie(conn, meta)
+    return meta["imdb_id"]
+
+
+def fetch_movie(title: str, year: int | None, ids: dict, counts: Counter):
     """
-    if not MOVIES_ROOT.exists():
-        print(f"[WARN] Movies directory not found: {MOVIES_ROOT}")
-        return
+    Look up a movie on TMDB by its local IDs, then by title.
 
-    conn = sqlite3.connect(DB_PATH)
-    seen_paths = set()
+    Returns the metadata dict, or None if TMDB has no match. Raises
+    TMDBUnavailable if TMDB could not answer.
+    """
+    meta = None
+    if ids["imdb_id"] or ids["tmdb_id"]:
+        logger.debug("TMDB details: %s (%s)", title, ids["imdb_id"] or ids["tmdb_id"])
+        counts["tmdb_requests"] += 1
+        meta = lookup_movie_by_id(tmdb_id=ids["tmdb_id"], imdb_id=ids["imdb_id"])
+
+    if not meta:
+        logger.debug("TMDB lookup: %s (%s)", title, year)
+        counts["tmdb_requests"] += 1
+        meta = lookup_movie(title, year)
+
+    return meta
 
+
+def store_movie_file(
+    conn,
+    path: Path,
+    parsed: tuple,
+    ids: dict,
+    inode: int,
+    size: int,
+    counts: Counter,
+    mtime: float | None = None,
+    dev: int | None = None,
+) -> bool:
+    """
+    Resolve metadata for an already parsed movie file and upsert it.
+
+    parsed is the result of naming.parse_movie_filename. Shared by the
+    filesystem scan and agent manifests (scanner.manifest), which provide
+    the parsed name, local IDs and stat fields without touching the disk.
+    mtime (unix seconds) dates the movie for the "recently added" catalog.
+    dev is the file's st_dev (None for agent manifests).
+
+    When TMDB could not answer, the file is queued for a metadata retry
+    (see scanner.resolve) and indexed once it is resolved.
+
+    Returns True if the file was indexed or queued, False if it was
+    skipped.
+    """
+    title, year, resolution = parsed
+
+    # 1) Resolve and upsert movie metadata
     try:
-        for path in MOVIES_ROOT.iterdir():
-            if not path.is_file():
-                continue
+        imdb_id = resolve_movie(conn, path, title, year, ids, inode, size, counts, dev)
+    except TMDBUnavailable as e:
+        logger.info("Metadata lookup deferred: %s", path.name)
+        counts["deferred"] += 1
+        file = {
+            "path": str(path),
+            "resolution": resolution,
+            "size": size,
+            "inode": inode,
+            "dev": dev,
+            "mtime": mtime,
+        }
+        defer_lookup(conn, "movies", str(path), title, year, ids, [file], str(e))
+        return True
+
+    if not imdb_id:
+        return False
+
+    add_movie_file(conn, imdb_id, path, resolution, size, inode, counts, mtime, dev)
+    return True
+
 
-            match = MOVIE_PATTERN.match(path.name)
-            if not match:
-                print(f"[SKIP] Unrecognized movie filename: {path.name}")
-                continue
+def add_movie_file(
+    conn,
+    imdb_id: str,
+    path: Path,
+    resolution: str | None,
+    size: int,
+    inode: int,
+    counts: Counter,
+    mtime: float | None = None,
+    dev: int | None = None,
+):
+    """
+    Upsert the file record of a resolved movie.
+    """
+    upsert_movie_file(
+        conn,
+        imdb_id=imdb_id,
+        path=str(path),
+        resolution=resolution,
+        size=size,
+        inode=inode,
+        dev=dev,
+    )
 
-            data = match.groupdict()
+    if mtime is not None:
+        mark_movie_added(conn, imdb_id, mtime)
 
-            title = data["title"]
-            year = int(data["year"])
-            resolution = data.get("res")
+    counts["indexed"] += 1
 
-            print(f"[INFO] TMDB lookup: {title} ({year})")
 
-            meta = lookup_movie(title, year)
+def read_movie_file(path: Path):
+    """
+    Read what indexing a movie file needs from disk.
 
-            if not meta:
-                print(f"[WARN] TMDB lookup failed: {title}")
-                continue
+    Returns (parsed, ids, stat), with parsed None for an unrecognized
+    file name, or None if path is not a movie file. Runs in the walker
+    threads of a scan (see scanner.checkpoint): no database access.
+    """
+    if not path.is_file() or is_sidecar(path.name):
+        return None
 
+    parsed = parse_movie_filename(path.name)
+    if not parsed:
+        return None, None, None
+
+    return parsed, local_ids(path.name, path.with_suffix(NFO_SUFFIX)), path.stat()
+
+
+def index_read_movie_file(conn, path: Path, read, counts: Counter) -> bool:
+    """
+    Index a movie file from the result of read_movie_file.
+
+    Returns True if the file was indexed or queued, False if it was
+    skipped.
+    """
+    if read is None:
+        return False
+
+    parsed, ids, stat = read
+    if not parsed:
+        logger.info("Skipped unrecognized movie filename: %s", path.name)
+        counts["skipped"] += 1
+        return False
+
+    return store_movie_file(
+        conn,
+        path,
+        parsed,
+        ids,
+        stat.st_ino,
+        stat.st_size,
+        counts,
+        mtime=stat.st_mtime,
+        dev=stat.st_dev,
+    )
+
+
+def index_movie_file(conn, path: Path, counts: Counter) -> bool:
+    """
+    Index a single movie file (parse, resolve metadata, upsert).
+
+    Shared by the full directory scan and per-item ingestion. Outcomes are
+    tallied in counts for the end-of-scan summary.
+
+    Returns True if the file was indexed or queued, False if it was
+    skipped.
+    """
+    return index_read_movie_file(conn, path, read_movie_file(path), counts)
+
+
+@traced("scan.movies")
+def scan_movies(path: Path | None = None):
+    """
+    Scan the movie folders and synchronize database records.
+
+    - Discovers movie files on disk, one walker thread per folder
+    - Resolves metadata via local IDs or TMDB
+    - Inserts or updates movie and file records
+    - Removes database entries for files no longer present
+
+    When path is given (a single movie file directly in a movie folder),
+    only that file is indexed or pruned. Full scans commit in checkpoints
+    and resume an interrupted walk (see scanner.checkpoint).
+
+    Returns False if the scan was cancelled, True otherwise.
+    """
+    # A missing folder (e.g. an unmounted share) keeps its records
+    roots = [root for root in MOVIES_ROOTS if root.exists()]
+    for root in set(MOVIES_ROOTS) - set(roots):
+        logger.warning("Movies directory not found: %s", root)
+
+    if path is None:
+        scopes, candidates = roots, None
+    elif path.parent in roots:
+        scopes, candidates = [path], [path] if path.exists() else []
+    else:
+        return True
+
+    conn = connect()
+    seen_paths = {scope: set() for scope in scopes}
+    counts = Counter()
+    started = time.monotonic()
+    scope_names = ",".join(str(scope) for scope in scopes)
+
+    try:
+        walk = LibraryWalk(conn, "movies", scopes, counts, resumable=path is None)
+
+        for scope, candidate, read in walk.entries(read_movie_file, candidates):
             # Track file as seen for cleanup
-            seen_paths.add(str(path))
-
-            # 1) Upsert movie metadata
-            upsert_movie(conn, meta)
-
-            # 2) Upsert file record
-            upsert_movie_file(
-                conn,
-                imdb_id=meta["imdb_id"],
-                path=str(path),
-                resolution=resolution,
-                size=path.stat().st_size,
-            )
-
-        # 3) Delete movie files no longer present on disk
-        if seen_paths:
-            placeholders = ",".join("?" * len(seen_paths))
-            conn.execute(
-                f"""
-                DELETE FROM files
-                WHERE movie_imdb_id IS NOT NULL
-                  AND path NOT IN ({placeholders})
-                """,
-                tuple(seen_paths),
-            )
+            with span("scan.movie_file", file=candidate.name):
+                if index_read_movie_file(conn, candidate, read, counts):
+                    seen_paths[scope].add(str(candidate))
+
+        if walk.cancelled:
+            # Keep the progress; pruning needs a complete walk
+            walk.finish()
+            bump_generation(conn)
+            conn.commit()
+            log_summary(logger, "Movie scan cancelled", counts, started, scope=scope_names)
+            return False
+
+        for scope, seen in seen_paths.items():
+            # Entries walked by an interrupted earlier run
+            seen |= walk.resumed_paths(scope, "movie_imdb_id")
+
+            # Delete movie files no longer present on disk.
+            # A full scan that found nothing in a folder (e.g. an empty
+            # mount point) keeps its existing records.
+            if seen or path is not None:
+                counts["removed"] += prune_files_under(conn, str(scope), seen, "movie_imdb_id")
+
+        walk.finish()
+
+        # Let other workers know their caches are stale
+        bump_generation(conn)
 
         conn.commit()
-        print("[OK] Movie scan complete")
+        log_summary(logger, "Movie scan complete", counts, started, scope=scope_names)
+        return True
 
     finally:
         conn.close()
@@ -1,186 +1,512 @@
 """
 Series filesystem scanner.
 
-This module scans the series directory structure, resolves metadata via TMDB,
-and synchronizes series, episodes, and file records into the SQLite database.
+This module scans the series folders (SERIES_ROOTS), resolves metadata
+via local IDs (tvshow.nfo / ID tags) or TMDB, and synchronizes series,
+episodes, and file records into the SQLite database. Series folders TMDB
+could not answer for are queued for a retry (see scanner.resolve).
 """
 
+from collections import Counter
+import logging
 from pathlib import Path
-import re
-import sqlite3
+import time
+
+from core.config import SERIES_ROOTS
+from core.log import log_summary
+from core.tracing import span, traced
+from metadata.tmdb import TMDBUnavailable, lookup_series, lookup_series_by_id
+from metadata.local import SERIES_NFO_NAME, local_ids, strip_id_tags
+from db.connection import connect
+from db.metadata_queue_repo import defer_lookup, get_deferred
+from db.series_repo import (
+    mark_episode_added,
+    upsert_series,
+    upsert_episode,
+    upsert_episode_file,
+    series_exists,
+)
+from db.file_repo import (
+    get_file,
+    find_moved_file,
+    move_file,
+    series_for_folder,
+    prune_files_under,
+)
+from db.generation import bump_generation
+from .checkpoint import LibraryWalk
+from .naming import is_sidecar, parse_episode_filename, season_number
 
-from core.config import SERIES_DIR_NAME
-from metadata.tmdb import lookup_series
-from db.series_repo import upsert_series, upsert_episode, upsert_episode_file
+logger = logging.getLogger(__name__)
 
 
 # ---------------------------------------------------------------------------
-# Paths / config
+# Helpers
 # ---------------------------------------------------------------------------
 
-# Root directory for series files (mounted volume)
-SERIES_ROOT = Path("/media") / SERIES_DIR_NAME
+def _episode_stats(series_dir: Path):
+    for season_dir in series_dir.iterdir():
+        if not season_dir.is_dir() or season_number(season_dir) is None:
+            continue
 
-# SQLite database location
-DB_PATH = "/data/library.db"
+        for ep_file in season_dir.iterdir():
+            if ep_file.is_file():
+                stat = ep_file.stat()
+                yield stat.st_ino, stat.st_size, stat.st_dev
 
 
-# ---------------------------------------------------------------------------
-# Regex patterns
-# ---------------------------------------------------------------------------
+def known_series(conn, series_dir: Path, file_stats=None):
+    """
+    Return the IMDb ID already associated with a series folder, or None.
 
-# Expected season folder format:
-#   Season 01
-SEASON_PATTERN = re.compile(r"Season\s+(?P<season>\d+)", re.IGNORECASE)
-
-# Episode identity: find SxEx anywhere in filename
-EPISODE_SE_PATTERN = re.compile(
-    r"""
-    S(?P<season>\d{1,2})
-    E(?P<episode>\d{1,2})
-    """,
-    re.IGNORECASE | re.VERBOSE,
-)
+    A folder is known if any file below it is indexed, or if one of its
+    episode files is a renamed/moved copy (same inode, size and device)
+    of an indexed file whose old path vanished (e.g. a renamed series
+    folder).
+
+    file_stats are the (inode, size, dev) of the folder's episode files;
+    by default they are read from disk.
+    """
+    series_imdb_id = series_for_folder(conn, str(series_dir))
+    if series_imdb_id:
+        return series_imdb_id
+
+    if file_stats is None:
+        file_stats = _episode_stats(series_dir)
+
+    for inode, size, dev in file_stats:
+        moved = find_moved_file(conn, inode, size, dev)
+        if moved and moved[3]:
+            return moved[3]
+
+    return None
+
+
+def resolve_series(conn, series_dir: Path, counts: Counter, ids=None, file_stats=None):
+    """
+    Resolve a series folder to an IMDb ID, upserting its metadata if needed.
+
+    Resolution order:
+    1) Already indexed (files below the folder, or a renamed/moved
+       folder): no network calls
+    2) Local IDs (folder name tags, `tvshow.nfo`) already in the
+       database: no network calls
+    3) Local IDs not yet in the database: TMDB details only
+    4) TMDB title search (search + details)
+
+    Folders queued for a metadata retry are not looked up again.
+
+    A local IMDb ID that differs from the indexed one wins, so adding an
+    ID tag or tvshow.nfo fixes a misidentified series on the next scan.
+
+    ids (local IDs) and file_stats (see known_series) are read from disk
+    unless given, e.g. by an agent manifest.
+
+    Returns the IMDb ID, or None if the series could not be resolved.
+    Raises TMDBUnavailable if TMDB could not answer or the folder is
+    queued (see defer_series).
+    """
+    if ids is None:
+        ids = local_ids(series_dir.name, series_dir / SERIES_NFO_NAME)
+
+    known_id = known_series(conn, series_dir, file_stats)
+    if known_id and ids["imdb_id"] in (None, known_id):
+        return known_id
+
+    if ids["imdb_id"] and series_exists(conn, ids["imdb_id"]):
+        return ids["imdb_id"]
+
+    # Queued for a retry: scans leave the lookup to scanner.resolve
+    if get_deferred(conn, str(series_dir)) is not None:
+        raise TMDBUnavailable("queued for a metadata retry")
 
-# Resolution tokens (optional metadata, anywhere in filename)
-RESOLUTION_PATTERN = re.compile(
-    r"""
-    (?P<res>
-        240p | 360p | 480p | 576p | 720p | 900p |
-        1080p | 1440p | 2160p | 4320p |
-        480i | 576i | 1080i |
-        2K | 4K | 8K
+    # ID tags are not part of the title
+    series_name = strip_id_tags(series_dir.name)
+
+    meta = fetch_series(series_name, ids, counts)
+    if not meta:
+        logger.warning("TMDB lookup failed: %s", series_name)
+        counts["unresolved"] += 1
+        return None
+
+    upsert_series(conn, meta)
+    return meta["imdb_id"]
+
+
+def fetch_series(series_name: str, ids: dict, counts: Counter):
+    """
+    Look up a series on TMDB by its local IDs, then by title.
+
+    Returns the metadata dict, or None if TMDB has no match. Raises
+    TMDBUnavailable if TMDB could not answer.
+    """
+    meta = None
+    if ids["imdb_id"] or ids["tmdb_id"]:
+        logger.debug("TMDB details: %s (%s)", series_name, ids["imdb_id"] or ids["tmdb_id"])
+        counts["tmdb_requests"] += 1
+        meta = lookup_series_by_id(tmdb_id=ids["tmdb_id"], imdb_id=ids["imdb_id"])
+
+    if not meta:
+        logger.debug("TMDB lookup: %s", series_name)
+        counts["tmdb_requests"] += 1
+        meta = lookup_series(series_name)
+
+    return meta
+
+
+def defer_series(conn, series_dir: Path, ids: dict, files: list[dict], error, counts: Counter):
+    """
+    Queue a series folder TMDB could not answer for a metadata retry
+    (see scanner.resolve).
+
+    files are the episode files to index once the series is resolved
+    (see db.metadata_queue_repo); files queued earlier, e.g. by the
+    ingestion of another episode, are kept.
+
+    Returns the paths of the queued files.
+    """
+    logger.info("Metadata lookup deferred: %s", series_dir.name)
+    counts["deferred"] += 1
+
+    queued = {file["path"]: file for file in get_deferred(conn, str(series_dir)) or []}
+    queued.update((file["path"], file) for file in files)
+
+    defer_lookup(
+        conn,
+        "series",
+        str(series_dir),
+        strip_id_tags(series_dir.name),
+        None,
+        ids,
+        list(queued.values()),
+        str(error),
     )
-    """,
-    re.IGNORECASE | re.VERBOSE,
-)
 
+    return [file["path"] for file in files]
 
-# ---------------------------------------------------------------------------
-# Helpers
-# ---------------------------------------------------------------------------
 
-def parse_episode_filename(filename: str):
+def episode_entry(
+    ep_file: Path, season_num: int, parsed: tuple, inode: int, size: int, mtime, dev=None
+):
+    """
+    Return the queue entry of an episode file (see defer_series).
     """
-    Extract season, episode, and optional resolution from an episode filename.
+    season_from_file, episode_num, resolution = parsed
+
+    return {
+        "path": str(ep_file),
+        "season": season_num,
+        "file_season": season_from_file,
+        "episode": episode_num,
+        "resolution": resolution,
+        "size": size,
+        "inode": inode,
+        "dev": dev,
+        "mtime": mtime,
+    }
+
+
+def store_episode_file(
+    conn,
+    series_imdb_id: str,
+    season_num: int,
+    ep_file: Path,
+    parsed: tuple,
+    inode: int,
+    size: int,
+    counts: Counter,
+    mtime: float | None = None,
+    dev: int | None = None,
+) -> bool:
+    """
+    Upsert an already parsed episode file of a resolved series.
+
+    parsed is the result of naming.parse_episode_filename. Shared by the
+    filesystem scan and agent manifests (scanner.manifest), which provide
+    the parsed name and stat fields without touching the disk. mtime
+    (unix seconds) dates the episode for the sorted series catalogs; dev
+    is the file's st_dev (None for agent manifests).
 
-    Returns:
-        (season_from_file: int, episode: int, resolution: str | None)
-        or None if no SxEx pattern is found.
+    Returns True (the file was indexed).
     """
-    se_match = EPISODE_SE_PATTERN.search(filename)
-    if not se_match:
+    season_from_file, episode_num, resolution = parsed
+
+    # Optional sanity check (non-fatal)
+    if season_from_file != season_num:
+        logger.warning(
+            "Season mismatch: folder=%s, filename=%s (%s)",
+            season_num,
+            season_from_file,
+            ep_file.name,
+        )
+        counts["season_mismatches"] += 1
+
+    # Renamed/moved file: move the existing record in place
+    if not get_file(conn, str(ep_file)):
+        moved = find_moved_file(conn, inode, size, dev)
+        if moved and moved[3] == series_imdb_id:
+            logger.debug("Moved: %s -> %s", moved[1], ep_file)
+            counts["moved"] += 1
+            move_file(conn, moved[0], str(ep_file))
+
+    # 2) Upsert episode (folder season is authoritative)
+    episode_id = upsert_episode(
+        conn,
+        series_imdb_id,
+        season_num,
+        episode_num,
+    )
+
+    # 3) Upsert episode file
+    upsert_episode_file(
+        conn,
+        episode_id=episode_id,
+        path=str(ep_file),
+        resolution=resolution,
+        size=size,
+        inode=inode,
+        dev=dev,
+    )
+
+    if mtime is not None:
+        mark_episode_added(conn, series_imdb_id, episode_id, mtime)
+
+    counts["indexed"] += 1
+    return True
+
+
+def index_episode_file(
+    conn,
+    series_imdb_id: str,
+    season_num: int,
+    ep_file: Path,
+    counts: Counter,
+) -> bool:
+    """
+    Index a single episode file of an already resolved series.
+
+    Shared by the full directory scan and per-item ingestion. Outcomes are
+    tallied in counts for the end-of-scan summary.
+
+    Returns True if the file was indexed, False if it was skipped.
+    """
+    # Episode NFO sidecars (S01E01.nfo) also match SxEx
+    if not ep_file.is_file() or is_sidecar(ep_file.name):
+        return False
+
+    parsed = parse_episode_filename(ep_file.name)
+    if not parsed:
+        logger.info("Skipped episode file: %s", ep_file.name)
+        counts["skipped"] += 1
+        return False
+
+    stat = ep_file.stat()
+
+    return store_episode_file(
+        conn,
+        series_imdb_id,
+        season_num,
+        ep_file,
+        parsed,
+        stat.st_ino,
+        stat.st_size,
+        counts,
+        mtime=stat.st_mtime,
+        dev=stat.st_dev,
+    )
+
+
+def read_series_folder(series_dir: Path):
+    """
+    Read what indexing a series folder needs from disk.
+
+    Returns (ids, seasons), or None if series_dir is not a folder. ids
+    are the local IDs; seasons are (season_dir, season_num, files) with
+    season_num None for unrecognized folders, and files are
+    (ep_file, parsed, stat) with parsed None for sidecars and
+    unrecognized names. Runs in the walker threads of a scan (see
+    scanner.checkpoint): no database access.
+    """
+    if not series_dir.is_dir():
         return None
 
-    season_from_file = int(se_match.group("season"))
-    episode = int(se_match.group("episode"))
+    ids = local_ids(series_dir.name, series_dir / SERIES_NFO_NAME)
+    seasons = []
+
+    for season_dir in series_dir.iterdir():
+        if not season_dir.is_dir():
+            continue
+
+        season_num = season_number(season_dir)
+        files = []
+
+        if season_num is not None:
+            for ep_file in season_dir.iterdir():
+                if not ep_file.is_file():
+                    continue
+
+                # Episode NFO sidecars (S01E01.nfo) also match SxEx
+                parsed = None if is_sidecar(ep_file.name) else parse_episode_filename(ep_file.name)
+                files.append((ep_file, parsed, ep_file.stat()))
+
+        seasons.append((season_dir, season_num, files))
 
-    res_match = RESOLUTION_PATTERN.search(filename)
-    resolution = res_match.group("res") if res_match else None
+    return ids, seasons
 
-    return season_from_file, episode, resolution
+
+def read_episode_entries(read) -> list[dict]:
+    """
+    Return the queue entries of the episode files in the result of
+    read_series_folder (see defer_series).
+    """
+    return [
+        episode_entry(
+            ep_file, season_num, parsed, stat.st_ino, stat.st_size, stat.st_mtime, stat.st_dev
+        )
+        for _, season_num, files in read[1]
+        if season_num is not None
+        for ep_file, parsed, stat in files
+        if parsed
+    ]
+
+
+def index_read_series(conn, series_dir: Path, read, counts: Counter) -> list[str]:
+    """
+    Index a series folder from the result of read_series_folder.
+
+    Returns the paths of the indexed episode files, or of the queued ones
+    if the series lookup was deferred.
+    """
+    indexed = []
+    if read is None:
+        return indexed
+
+    ids, seasons = read
+    file_stats = [
+        (stat.st_ino, stat.st_size, stat.st_dev) for _, _, files in seasons for _, _, stat in files
+    ]
+
+    # 1) Resolve and upsert series metadata
+    try:
+        series_imdb_id = resolve_series(conn, series_dir, counts, ids=ids, file_stats=file_stats)
+    except TMDBUnavailable as e:
+        return defer_series(conn, series_dir, ids, read_episode_entries(read), e, counts)
+
+    if not series_imdb_id:
+        return indexed
+
+    for season_dir, season_num, files in seasons:
+        if season_num is None:
+            logger.info("Skipped season folder: %s", season_dir)
+            counts["skipped"] += 1
+            continue
+
+        for ep_file, parsed, stat in files:
+            if not parsed:
+                if not is_sidecar(ep_file.name):
+                    logger.info("Skipped episode file: %s", ep_file.name)
+                    counts["skipped"] += 1
+                continue
+
+            store_episode_file(
+                conn,
+                series_imdb_id,
+                season_num,
+                ep_file,
+                parsed,
+                stat.st_ino,
+                stat.st_size,
+                counts,
+                mtime=stat.st_mtime,
+                dev=stat.st_dev,
+            )
+            indexed.append(str(ep_file))
+
+    return indexed
+
+
+def index_series(conn, series_dir: Path, counts: Counter) -> list[str]:
+    """
+    Index a series folder: resolve the series and all of its episode files.
+
+    Returns the paths of the indexed episode files.
+    """
+    return index_read_series(conn, series_dir, read_series_folder(series_dir), counts)
 
 
 # ---------------------------------------------------------------------------
 # Scanner
 # ---------------------------------------------------------------------------
 
-def scan_series():
+@traced("scan.series")
+def scan_series(path: Path | None = None):
     """
-    Scan the series directory and synchronize database records.
+    Scan the series folders and synchronize database records.
 
-    - Discovers series, seasons, and episode files on disk
-    - Looks up series metadata via TMDB
+    - Discovers series, seasons, and episode files on disk, one walker
+      thread per folder
+    - Resolves series metadata via local IDs or TMDB
     - Inserts or updates series, episode, and file records
     - Removes database entries for files no longer present
-    """
-    if not SERIES_ROOT.exists():
-        print(f"[WARN] Series directory not found: {SERIES_ROOT}")
-        return
 
-    conn = sqlite3.connect(DB_PATH)
-    seen_paths = set()
+    When path is given (a single series folder), only that folder is
+    walked and pruned. Full scans commit in checkpoints and resume an
+    interrupted walk (see scanner.checkpoint).
+
+    Returns False if the scan was cancelled, True otherwise.
+    """
+    # A missing folder (e.g. an unmounted share) keeps its records
+    roots = [root for root in SERIES_ROOTS if root.exists()]
+    for root in set(SERIES_ROOTS) - set(roots):
+        logger.warning("Series directory not found: %s", root)
+
+    if path is None:
+        scopes, candidates = roots, None
+    elif path.parent in roots:
+        scopes, candidates = [path], [path] if path.exists() else []
+    else:
+        return True
+
+    conn = connect()
+    seen_paths = {scope: set() for scope in scopes}
+    counts = Counter()
+    started = time.monotonic()
+    scope_names = ",".join(str(scope) for scope in scopes)
 
     try:
-        for series_dir in SERIES_ROOT.iterdir():
-            if not series_dir.is_dir():
-                continue
+        walk = LibraryWalk(conn, "series", scopes, counts, resumable=path is None)
 
-            series_name = series_dir.name
-            print(f"[INFO] TMDB lookup: {series_name}")
+        for scope, series_dir, read in walk.entries(read_series_folder, candidates):
+            # Track files as seen for cleanup
+            with span("scan.series_folder", folder=series_dir.name):
+                seen_paths[scope].update(index_read_series(conn, series_dir, read, counts))
 
-            meta = lookup_series(series_name)
-            if not meta:
-                print(f"[WARN] TMDB lookup failed: {series_name}")
-                continue
+        if walk.cancelled:
+            # Keep the progress; pruning needs a complete walk
+            walk.finish()
+            bump_generation(conn)
+            conn.commit()
+            log_summary(logger, "Series scan cancelled", counts, started, scope=scope_names)
+            return False
 
-            # 1) Upsert series metadata
-            upsert_series(conn, meta)
-            series_imdb_id = meta["imdb_id"]
+        for scope, seen in seen_paths.items():
+            # Entries walked by an interrupted earlier run
+            seen |= walk.resumed_paths(scope, "episode_id")
 
-            for season_dir in series_dir.iterdir():
-                if not season_dir.is_dir():
-                    continue
+            # Delete episode files no longer present on disk.
+            # A full scan that found nothing in a folder (e.g. an empty
+            # mount point) keeps its existing records.
+            if seen or path is not None:
+                counts["removed"] += prune_files_under(conn, str(scope), seen, "episode_id")
 
-                season_match = SEASON_PATTERN.match(season_dir.name)
-                if not season_match:
-                    print(f"[SKIP] Season folder: {season_dir.name}")
-                    continue
+        walk.finish()
 
-                season_num = int(season_match.group("season"))
-
-                for ep_file in season_dir.iterdir():
-                    if not ep_file.is_file():
-                        continue
-
-                    parsed = parse_episode_filename(ep_file.name)
-                    if not parsed:
-                        print(f"[SKIP] Episode file: {ep_file.name}")
-                        continue
-
-                    season_from_file, episode_num, resolution = parsed
-
-                    # Optional sanity check (non-fatal)
-                    if season_from_file != season_num:
-                        print(
-                            f"[WARN] Season mismatch: folder={season_num}, "
-                            f"filename={season_from_file} ({ep_file.name})"
-                        )
-
-                    # Track file as seen for cleanup
-                    seen_paths.add(str(ep_file))
-
-                    # 2) Upsert episode (folder season is authoritative)
-                    episode_id = upsert_episode(
-                        conn,
-                        series_imdb_id,
-                        season_num,
-                        episode_num,
-                    )
-
-                    # 3) Upsert episode file
-                    upsert_episode_file(
-                        conn,
-                        episode_id=episode_id,
-                        path=str(ep_file),
-                        resolution=resolution,
-                        size=ep_file.stat().st_size,
-                    )
-
-        # 4) Delete episode files no longer present on disk
-        if seen_paths:
-            placeholders = ",".join("?" * len(seen_paths))
-            conn.execute(
-                f"""
-                DELETE FROM files
-                WHERE episode_id IS NOT NULL
-                  AND path NOT IN ({placeholders})
-                """,
-                tuple(seen_paths),
-            )
+        # Let other workers know their caches are stale
+        bump_generation(conn)
 
         conn.commit()
-        print("[OK] Series scan complete")
+        log_summary(logger, "Series scan complete", counts, started, scope=scope_names)
+        return True
 
     finally:
         conn.close()
@@ -86,6 +86,11 @@ check "Series catalog (bad token)" 200 \
 check "Series catalog (no token)" 200 \
   "$BASE/external/catalog/series/remote-files.json"
 
+check "Recently added movies (good token)" 200 \
+  "$BASE/external/catalog/movie/recent.json?token=$STREAM_TOKEN"
+check "Recently added movies (no token)" 200 \
+  "$BASE/external/catalog/movie/recent.json"
+
 echo
 echo "================ STREAM RESOLVERS (EXTERNAL) ================"
 check "Movie stream (good token)" 200 \
@@ -101,6 +106,8 @@ check "Series stream (bad token)" 200 \
   "$BASE/external/stream/series/tt0206512:1:1.json?token=$BAD_TOKEN"
 check "Series stream (no token)" 200 \
   "$BASE/external/stream/series/tt0206512:1:1.json"
+check "Remux playlist (no token)" 401 \
+  "$BASE/external/remux/movies/missing.mkv/index.m3u8"
 
 echo
 echo "================ MEDIA FILES (EXTERNAL) ================"
@@ -149,6 +156,46 @@ check "Admin scan (good token)" 200 \
   -X POST "$BASE/admin/scan" \
   -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
 
+check "Admin ingest (no token)" 401 \
+  -X POST "$BASE/admin/ingest" \
+  -H "Content-Type: application/json" \
+  -d '{"paths": []}'
+
+check "Admin ingest (bad token)" 403 \
+  -X POST "$BASE/admin/ingest" \
+  -H "Authorization: Bearer $BAD_TOKEN" \
+  -H "Content-Type: application/json" \
+  -d '{"paths": []}'
+
+check "Admin scan cancel (no token)" 401 \
+  -X POST "$BASE/admin/scan/cancel"
+
+check "Admin scan status (no token)" 401 \
+  "$BASE/admin/scan/status"
+
+check "Admin maintenance (no token)" 401 \
+  -X POST "$BASE/admin/maintenance"
+
+check "Admin token usage (no token)" 401 \
+  "$BASE/admin/tokens/usage"
+
+check "Admin CPU profile (no token)" 401 \
+  "$BASE/admin/profile/cpu?seconds=1"
+
+check "Admin memory profile (no token)" 401 \
+  "$BASE/admin/profile/memory?seconds=1"
+
+check "Admin metadata queue (no token)" 401 \
+  "$BASE/admin/metadata/queue"
+
+check "Admin metadata retry (no token)" 401 \
+  -X POST "$BASE/admin/metadata/retry"
+
+check "Agent manifest (no token)" 401 \
+  -X POST "$BASE/admin/agent/manifest" \
+  -H "Content-Type: application/json" \
+  -d '{}'
+
 echo
 echo "================ CONFIG PAGES (EXTERNAL) ================"
 check "Configure page" 200 \
@@ -73,6 +73,18 @@ check "Movie catalog" 200 \
   "$BASE/internal/catalog/movie/remote-files.json"
 check "Series catalog" 200 \
   "$BASE/internal/catalog/series/remote-files.json"
+check "Recently added movies" 200 \
+  "$BASE/internal/catalog/movie/recent.json"
+check "Movies by year (page 2)" 200 \
+  "$BASE/internal/catalog/movie/by-year/skip=100.json"
+check "Series with new episodes" 200 \
+  "$BASE/internal/catalog/series/new-episodes.json"
+check "Unknown catalog" 404 \
+  "$BASE/internal/catalog/movie/unknown.json"
+check "Poster (unknown title)" 404 \
+  "$BASE/posters/tt0000000/medium.jpg"
+check "Remux (unknown file)" 404 \
+  "$BASE/internal/remux/movies/missing.mkv/index.m3u8"
 
 echo
 echo "================ STREAM RESOLVERS (INTERNAL) ================"
@@ -101,10 +113,62 @@ check "Admin scan" 200 \
   -X POST "$BASE/admin/scan" \
   -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
 
+check "Admin ingest (empty)" 200 \
+  -X POST "$BASE/admin/ingest" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN" \
+  -H "Content-Type: application/json" \
+  -d '{"paths": []}'
+
+check "Admin scan status" 200 \
+  "$BASE/admin/scan/status" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
+
+check "Admin scan cancel (no scan running)" 409 \
+  -X POST "$BASE/admin/scan/cancel" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
+
+check "Admin scan resume (nothing to resume)" 409 \
+  -X POST "$BASE/admin/scan/resume" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
+
 check "Admin rebuild" 200 \
   -X POST "$BASE/admin/scan/rebuild" \
   -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
 
+check "Admin maintenance" 200 \
+  -X POST "$BASE/admin/maintenance" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
+
+check "Admin token usage" 200 \
+  "$BASE/admin/tokens/usage" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
+
+check "Admin CPU profile" 200 \
+  "$BASE/admin/profile/cpu?seconds=1" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
+
+check "Admin memory profile" 200 \
+  "$BASE/admin/profile/memory?seconds=1" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
+
+check "Admin scan profile (no scan running)" 409 \
+  "$BASE/admin/profile/cpu?seconds=1&target=scan" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
+
+check "Admin metadata queue" 200 \
+  "$BASE/admin/metadata/queue" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
+
+check "Admin metadata retry" 200 \
+  -X POST "$BASE/admin/metadata/retry" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN"
+
+check "Agent manifest (invalid)" 400 \
+  -X POST "$BASE/admin/agent/manifest" \
+  -H "Authorization: Bearer $ADMIN_SCAN_TOKEN" \
+  -H "Content-Type: application/json" \
+  -d '{"library": "unknown"}'
+
 echo
 echo "================ CONFIG PAGES (INTERNAL) ================"
 check "Configure page" 200 \
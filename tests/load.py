@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the addon endpoints and the /auth forward-auth path.
+
+By default this script is fully self-contained:
+  1) Builds a synthetic library.db (movies, series, episodes, files)
+  2) Starts the API locally with uvicorn against that database
+  3) Drives a mix of manifest, catalog, stream and /auth traffic at a
+     configurable concurrency for a fixed duration
+  4) Reports throughput, p50/p95/p99 latency and error rate per route
+
+Only the Python standard library is used by the load generator; starting
+the app needs the API requirements (app/requirements.txt).
+
+Examples:
+  python3 tests/load.py
+  python3 tests/load.py --concurrency 64 --duration 30 --workers 4
+  python3 tests/load.py --url https://internal.host.name:11443 --token TOKEN
+
+The load generator shares the CPU with the API when both run on the same
+host. For absolute numbers run it from a second machine with --url.
+"""
+
+import argparse
+import http.client
+import json
+import os
+from pathlib import Path
+import random
+import socket
+import sqlite3
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+SCHEMA_PATH = APP_DIR / "db" / "schema.sql"
+
+STREAM_TOKEN = "load-test-token"
+BAD_TOKEN = "invalid-token"
+
+# Relative weight of each route in the traffic mix.
+# /auth dominates real traffic: the proxy calls it for every external
+# media Range request.
+DEFAULT_MIX = {
+    "manifest": 5,
+    "catalog_movie": 5,
+    "catalog_series": 5,
+    "stream_movie": 15,
+    "stream_episode": 15,
+    "stream_external": 10,
+    "auth": 40,
+    "auth_denied": 5,
+}
+
+
+# ------------------------------------------------------------
+# Synthetic library
+# ------------------------------------------------------------
+
+def build_db(db_path, movies, series, seasons, episodes):
+    """
+    Create a synthetic library database and return the known IDs.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA_PATH.read_text())
+
+    rng = random.Random(42)
+    genres = ["Drama", "Comedy", "Horror", "Sci-Fi", "Documentary"]
+
+    movie_ids = []
+    for i in range(movies):
+        imdb_id = f"tt{1000000 + i}"
+        movie_ids.append(imdb_id)
+        conn.execute(
+            "INSERT INTO movies (imdb_id, title, year, poster_url, genres) VALUES (?, ?, ?, ?, ?)",
+            (
+                imdb_id,
+                f"Movie {i:05d}",
+                1950 + i % 75,
+                f"https://images.metahub.space/poster/medium/{imdb_id}/img",
+                json.dumps(rng.sample(genres, 2)),
+            ),
+        )
+        conn.execute(
+            "INSERT INTO files (movie_imdb_id, path, resolution, size) VALUES (?, ?, ?, ?)",
+            (
+                imdb_id,
+                f"/media/movies/Movie {i:05d} ({1950 + i % 75}) [1080p].mkv",
+                "1080p",
+                rng.randint(700, 9000) * 1024 ** 2,
+            ),
+        )
+
+    episode_ids = []
+    for i in range(series):
+        imdb_id = f"tt{5000000 + i}"
+        conn.execute(
+            "INSERT INTO series (imdb_id, title, poster_url, genres) VALUES (?, ?, ?, ?)",
+            (
+                imdb_id,
+                f"Series {i:04d}",
+                f"https://images.metahub.space/poster/medium/{imdb_id}/img",
+                json.dumps(rng.sample(genres, 2)),
+            ),
+        )
+
+        for season in range(1, seasons + 1):
+            for episode in range(1, episodes + 1):
+                cur = conn.execute(
+                    "INSERT INTO episodes (series_imdb_id, season, episode) VALUES (?, ?, ?)",
+                    (imdb_id, season, episode),
+                )
+                conn.execute(
+                    "INSERT INTO files (episode_id, path, resolution, size) VALUES (?, ?, ?, ?)",
+                    (
+                        cur.lastrowid,
+                        f"/media/series/Series {i:04d}/Season {season:02d}/"
+                        f"S{season:02d}E{episode:02d} [720p].mkv",
+                        "720p",
+                        rng.randint(200, 2000) * 1024 ** 2,
+                    ),
+                )
+                episode_ids.append(f"{imdb_id}:{season}:{episode}")
+
+    conn.commit()
+    conn.close()
+
+    return movie_ids, episode_ids
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(db_path, port, workers):
+    """
+    Start the API with uvicorn and wait until it answers.
+    """
+    env = dict(os.environ)
+    env.update(
+        {
+            "DB_PATH": str(db_path),
+            "MEDIA_BASE_URL_INTERNAL": "http://internal.load.test:11080",
+            "MEDIA_BASE_URL_EXTERNAL": "https://external.load.test:11443",
+            "STREAM_TOKENS": STREAM_TOKEN,
+            "ADMIN_SCAN_TOKEN": "load-test-admin-token",
+            "TMDB_API_KEY": "load-test",
+            # Point the startup scan at folders that do not exist so it
+            # leaves the synthetic database alone
+            "MOVIES_DIR_NAME": "load-test-no-movies",
+            "SERIES_DIR_NAME": "load-test-no-series",
+        }
+    )
+
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--workers", str(workers),
+            "--log-level", "warning",
+            "--no-access-log",
+        ],
+        cwd=APP_DIR,
+        env=env,
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("API exited during startup")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/internal/manifest.json")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return proc
+        except OSError:
+            pass
+        time.sleep(0.2)
+
+    proc.terminate()
+    raise RuntimeError("API did not become ready within 30s")
+
+
+# ------------------------------------------------------------
+# Traffic
+# ------------------------------------------------------------
+
+def make_request(route, rng, movie_ids, episode_ids, token):
+    """
+    Return (method, path, headers, expected_status) for a route.
+    """
+    # ~10% of stream lookups ask for titles that are not in the library,
+    # like Stremio does for every title a user opens
+    def movie_id():
+        return rng.choice(movie_ids) if movie_ids and rng.random() > 0.1 else "tt0000001"
+
+    def episode_id():
+        return rng.choice(episode_ids) if episode_ids and rng.random() > 0.1 else "tt0000001:1:1"
+
+    if route == "manifest":
+        return "GET", "/internal/manifest.json", {}, 200
+
+    if route == "catalog_movie":
+        return "GET", "/internal/catalog/movie/remote-files.json", {}, 200
+
+    if route == "catalog_series":
+        return "GET", "/internal/catalog/series/remote-files.json", {}, 200
+
+    if route == "stream_movie":
+        return "GET", f"/internal/stream/movie/{movie_id()}.json", {}, 200
+
+    if route == "stream_episode":
+        return "GET", f"/internal/stream/series/{quote(episode_id())}.json", {}, 200
+
+    if route == "stream_external":
+        return (
+            "GET",
+            f"/external/stream/series/{quote(episode_id())}.json?token={quote(token)}",
+            {},
+            200,
+        )
+
+    # forward_auth request as sent by Caddy for a media Range request
+    start = rng.randrange(0, 1024 ** 3)
+    headers = {
+        "Range": f"bytes={start}-{start + 1024 ** 2}",
+        "X-Forwarded-Method": "GET",
+        "X-Forwarded-Uri": f"/movies/Movie%20{rng.randrange(10000):05d}%20(2000).mkv",
+    }
+
+    if route == "auth":
+        headers["Authorization"] = f"Bearer {token}"
+        return "GET", "/auth", headers, 204
+
+    headers["Authorization"] = f"Bearer {BAD_TOKEN}"
+    return "GET", "/auth", headers, 401
+
+
+def open_connection(target, timeout):
+    if target.scheme == "https":
+        return http.client.HTTPSConnection(
+            target.hostname,
+            target.port or 443,
+            timeout=timeout,
+            context=ssl._create_unverified_context(),
+        )
+
+    return http.client.HTTPConnection(target.hostname, target.port or 80, timeout=timeout)
+
+
+def client(target, deadline, routes, weights, movie_ids, episode_ids, token, seed, results):
+    """
+    One simulated client: a keep-alive connection issuing requests
+    back-to-back until the deadline.
+    """
+    rng = random.Random(seed)
+    conn = open_connection(target, timeout=10)
+
+    while time.monotonic() < deadline:
+        route = rng.choices(routes, weights)[0]
+        method, path, headers, expected = make_request(
+            route, rng, movie_ids, episode_ids, token
+        )
+
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status == expected
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+            conn = open_connection(target, timeout=10)
+        elapsed = time.perf_counter() - started
+
+        results.append((route, elapsed, ok))
+
+    conn.close()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def report(results, duration):
+    """
+    Aggregate raw samples into per-route statistics.
+    """
+    by_route = {}
+    for route, elapsed, ok in results:
+        by_route.setdefault(route, []).append((elapsed, ok))
+
+    rows = []
+    for route in sorted(by_route) + ["TOTAL"]:
+        samples = (
+            [(e, ok) for _, e, ok in results] if route == "TOTAL" else by_route[route]
+        )
+        latencies = sorted(e for e, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+
+        rows.append(
+            {
+                "route": route,
+                "requests": len(samples),
+                "rps": len(samples) / duration,
+                "errors": errors,
+                "error_rate": errors / len(samples) if samples else 0.0,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+            }
+        )
+
+    return rows
+
+
+def print_report(rows, args):
+    print()
+    print(
+        f"concurrency={args.concurrency} duration={args.duration}s "
+        f"workers={args.workers if not args.url else 'n/a'}"
+    )
+    print(
+        f"{'route':<16} {'requests':>9} {'req/s':>9} {'errors':>7} {'err%':>6} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    )
+    for r in rows:
+        print(
+            f"{r['route']:<16} {r['requests']:>9} {r['rps']:>9.1f} {r['errors']:>7} "
+            f"{r['error_rate'] * 100:>5.1f}% {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+            f"{r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}"
+        )
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        route, _, weight = part.partition("=")
+        if route.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown route: {route}")
+        mix[route.strip()] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients (default: 32)")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds of load (default: 15)")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds of unrecorded warm-up (default: 2)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local app (default: 1)")
+    parser.add_argument("--movies", type=int, default=2000, help="Synthetic movies (default: 2000)")
+    parser.add_argument("--series", type=int, default=200, help="Synthetic series (default: 200)")
+    parser.add_argument("--seasons", type=int, default=3, help="Seasons per series (default: 3)")
+    parser.add_argument("--episodes", type=int, default=10, help="Episodes per season (default: 10)")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help="Route weights, e.g. auth=80,stream_movie=20 (routes: " + ", ".join(DEFAULT_MIX) + ")",
+    )
+    parser.add_argument("--url", help="Test an already running deployment instead of a local app")
+    parser.add_argument("--token", default=STREAM_TOKEN, help="Stream token (with --url)")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    proc = None
+    tmp = None
+    movie_ids, episode_ids = [], []
+
+    try:
+        if args.url:
+            # IDs of a real library are unknown here, so stream lookups
+            # are all misses; they still exercise the full request path
+            target = urlsplit(args.url)
+        else:
+            tmp = tempfile.TemporaryDirectory(prefix="remote-files-load-")
+            db_path = Path(tmp.name) / "library.db"
+
+            print(f"[INFO] Building synthetic library: {db_path}")
+            movie_ids, episode_ids = build_db(
+                db_path, args.movies, args.series, args.seasons, args.episodes
+            )
+
+            port = free_port()
+            print(f"[INFO] Starting API on 127.0.0.1:{port} with {args.workers} worker(s)")
+            proc = start_app(db_path, port, args.workers)
+            target = urlsplit(f"http://127.0.0.1:{port}")
+
+        routes = list(args.mix)
+        weights = [args.mix[r] for r in routes]
+
+        def run_phase(seconds, results):
+            deadline = time.monotonic() + seconds
+            threads = [
+                threading.Thread(
+                    target=client,
+                    args=(target, deadline, routes, weights, movie_ids, episode_ids,
+                          args.token, seed, results),
+                    daemon=True,
+                )
+                for seed in range(args.concurrency)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        if args.warmup > 0:
+            print(f"[INFO] Warming up for {args.warmup}s")
+            run_phase(args.warmup, [])
+
+        print(f"[INFO] Running {args.concurrency} clients for {args.duration}s")
+        results = []
+        run_phase(args.duration, results)
+
+        rows = report(results, args.duration)
+        print_report(rows, args)
+
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(
+                    {
+                        "concurrency": args.concurrency,
+                        "duration": args.duration,
+                        "workers": args.workers,
+                        "routes": rows,
+                    },
+                    f,
+                    indent=2,
+                )
+
+        # Non-zero exit code if any request failed (useful in CI)
+        return 1 if rows[-1]["errors"] else 0
+
+    finally:
+        if proc:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if tmp:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main())